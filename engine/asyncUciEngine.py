@@ -0,0 +1,370 @@
+# By Chris Parker
+# asyncio version of UCIEngine. The engine runs as an asyncio subprocess and its output is read with awaits, so one
+# event loop can drive many engines (and the GUI or other tasks) at once without a reader thread per pipe and
+# without sleeping to wait for answers.
+
+import argparse
+import asyncio
+from asyncio.subprocess import PIPE
+from os import PathLike
+from time import perf_counter
+
+# Type hinting
+from typing import Any, AsyncIterator, Awaitable, Iterable, List, Union
+
+# Exceptions
+from exceptions import InvalidEngineError
+
+# Parser
+from uciParser import UCIParser
+
+# Logging
+from uciLog import RECEIVED, SENT, SessionLog
+
+
+class AsyncUCIEngine:
+    """Provides awaitable functions for interacting with a universal chess interface (UCI) compatible chess engine.
+
+    Start it with `await AsyncUCIEngine.open(path)` or `async with AsyncUCIEngine(path) as engine:`.
+
+    Raises
+    ------
+    InvalidEngineError
+        If the program given is not UCI compatible
+    """
+    HANDSHAKE_TIMEOUT = 10.0 # Seconds to wait for `uciok`
+    READY_TIMEOUT = 10.0 # Seconds to wait for `readyok`
+    QUIT_TIMEOUT = 1.0 # Seconds to wait for the engine to exit after `quit` before killing it
+    LOG_LINES = 10_000 # Most lines kept in each of inLog and outLog, None for no limit
+    LOG_BYTES = None # Most characters kept in each of inLog and outLog, None for no limit
+
+    def __init__(self, enginePath: Union[str, PathLike], *boolOpts: str, **options: Union[str, int]) -> None:
+        """Construct new `AsyncUCIEngine`. The engine is started by start(), open() or `async with`.
+
+        Parameters
+        ----------
+        enginePath : str | PathLike
+            Path of the chess engine
+        *boolOpts : str
+            Boolean (on or off) options.
+            Ex. `UCI_LimitStrength`
+        **options : str | int
+            Options with a name and value.
+            Ex. `UCI_Elo value 2200`
+        """
+        self.path = enginePath
+        self.boolOpts = boolOpts
+        self.options = options
+        self.inLog = SessionLog(SENT, self.LOG_LINES, self.LOG_BYTES) # Newest commands sent
+        self.outLog = SessionLog(RECEIVED, self.LOG_LINES, self.LOG_BYTES) # Newest lines received
+
+        self.eng: Union[asyncio.subprocess.Process, None] = None
+        self.id = {} # `id` lines of the engine, ex. {"name": "Stockfish 13"}
+        self.optionLines = [] # `option` lines of the engine
+        self.parser: Union[UCIParser, None] = None # Gets every line read, if set
+
+        self._infos: asyncio.Queue = asyncio.Queue() # `info` lines of the running search, then None
+        self._lock = asyncio.Lock() # Only one command reads the engine's output at a time
+
+    @classmethod
+    async def open(cls, enginePath: Union[str, PathLike], *boolOpts: str,
+                   **options: Union[str, int]) -> 'AsyncUCIEngine':
+        """Construct and start an engine (see __init__ and start)."""
+        engine = cls(enginePath, *boolOpts, **options)
+        await engine.start()
+        return engine
+
+    async def start(self) -> None:
+        """Start the engine, do the `uci` handshake, set the options and wait until it is ready.
+
+        Raises
+        ------
+        InvalidEngineError
+            If the program given is not UCI compatible
+        """
+        self.eng = await asyncio.create_subprocess_exec(self.path, stdin=PIPE, stdout=PIPE)
+
+        try:
+            try:
+                await self.uci()
+            except (BrokenPipeError, ConnectionResetError): # Exited before reading `uci`
+                raise InvalidEngineError(self.path)
+
+            for setting in self.boolOpts:
+                await self.send_command(f"setoption name {str(setting)}")
+            for setting in self.options:
+                await self.set_option(setting, self.options[setting])
+
+            if not await self.isready():
+                raise InvalidEngineError(self.path, "Engine did not answer `isready`.")
+        except BaseException: # `async with` doesn't close an engine that failed to start
+            await self.close()
+            raise
+
+
+    # Commands
+
+    async def uci(self, timeout: Union[float, None]=None) -> List[str]:
+        """Send `uci` and wait for `uciok`.
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Most seconds to wait, by default HANDSHAKE_TIMEOUT
+
+        Returns
+        -------
+        List[str]
+            Lines the engine sent, ending with `uciok`
+
+        Raises
+        ------
+        InvalidEngineError
+            If `uciok` didn't arrive in time
+        """
+        async with self._lock:
+            await self.send_command("uci")
+            lines = await self._wait_for("uciok", self.HANDSHAKE_TIMEOUT if timeout == None else timeout)
+
+        if lines == None:
+            raise InvalidEngineError(self.path)
+
+        for line in lines:
+            words = line.split()
+            if words and words[0] == "id" and len(words) > 2:
+                self.id[words[1]] = " ".join(words[2:])
+            elif words and words[0] == "option":
+                self.optionLines.append(line.strip())
+
+        return lines
+
+    async def isready(self, timeout: Union[float, None]=None) -> bool:
+        """Send `isready` and wait for `readyok`.
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Most seconds to wait, by default READY_TIMEOUT
+
+        Returns
+        -------
+        bool
+            True if `readyok` received
+        """
+        async with self._lock:
+            await self.send_command("isready")
+            return await self._wait_for("readyok", self.READY_TIMEOUT if timeout == None else timeout) != None
+
+    async def set_option(self, name: str, value: Any) -> None:
+        """Set option by sending `setoption` command.
+
+        Parameters
+        ----------
+        name : str
+            Name of the option.
+            Ex. `Threads`
+        value : Any
+            Value of the option.
+            Ex. `4`
+        """
+        await self.send_command(f"setoption name {name} value {value}")
+
+    async def new_game(self) -> None:
+        """Starts new game by sending `ucinewgame` and waiting until the engine is ready."""
+        await self.send_command("ucinewgame")
+        await self.isready()
+
+    async def position(self, fen: Union[str, None]=None, moves: Iterable[str]=()) -> None:
+        """Send a position.
+
+        Parameters
+        ----------
+        fen : str | None, optional
+            FEN string of the position, by default the starting position
+        moves : Iterable[str], optional
+            Moves played from the position, by default none
+        """
+        command = f"position fen {fen}" if fen else "position startpos"
+        movesStr = " ".join(str(move) for move in moves)
+        if movesStr:
+            command += f" moves {movesStr}"
+
+        await self.send_command(command)
+
+    def go(self, *args: str, timeout: Union[float, None]=None, **kwargs: int) -> Awaitable[Union[str, None]]:
+        """Send `go` with provided arguments and wait for the best move. Meanwhile the `info` lines can be read with
+        infos(). Await the result or make it a task.
+        NOTE: Not a coroutine function, so infos() gets this search's lines as soon as go() is called, even if the
+        search has to wait for another command to finish.
+
+        Parameters
+        ----------
+        *args : str
+            Valueless arguments.
+            Ex. `infinite`
+        timeout : float | None, optional
+            Most seconds to wait. Waits until the engine answers or exits if None, by default None
+        **kwargs : int
+            Valued arguments.
+            Ex. `depth 10`
+
+        Returns
+        -------
+        Awaitable[str | None]
+            The best move (e.g. `e2e4`) or None if it didn't arrive in time
+        """
+        command = "go"
+        for arg in args:
+            command += f" {str(arg)}"
+        for item in kwargs:
+            command += f" {item} {str(kwargs[item])}"
+
+        self._infos = asyncio.Queue()
+        return self._search(command, timeout, self._infos)
+
+    async def _search(self, command: str, timeout: Union[float, None], infos: asyncio.Queue) -> Union[str, None]:
+        """Run a search started by go(), putting its `info` lines into `infos` and then None."""
+        try:
+            async with self._lock:
+                await self.send_command(command)
+                lines = await self._wait_for("bestmove", timeout, infos)
+        finally:
+            infos.put_nowait(None) # Ends infos() even if the search failed
+
+        if lines == None:
+            return None
+
+        words = lines[-1].split()
+        return words[1] if len(words) > 1 else None
+
+    async def stop(self) -> None:
+        """Stop search by sending `stop` command. The running go() then returns the best move."""
+        await self.send_command("stop")
+
+    async def infos(self) -> AsyncIterator[str]:
+        """Iterate over the `info` lines of the search started by the last go() call until it ends.
+
+        Ex.
+            search = asyncio.create_task(engine.go(depth=10))
+            async for info in engine.infos():
+                print(info)
+            best = await search
+        """
+        queue = self._infos
+        while True:
+            line = await queue.get()
+            if line == None:
+                break
+            yield line
+
+    async def send_command(self, command: str) -> None:
+        """Send a command to the engine.
+
+        Parameters
+        ----------
+        command : str
+            Command to send.
+        """
+        self.inLog.append(command)
+        self.eng.stdin.write(f"{command}\n".encode())
+        await self.eng.stdin.drain()
+
+
+    # Reading from engine stdout
+
+    async def _read_line(self, timeout: Union[float, None]=None) -> Union[str, None]:
+        """Read one line, waiting at most `timeout` seconds (forever if None). Returns None on timeout or at the end
+        of the output."""
+        try:
+            x = await asyncio.wait_for(self.eng.stdout.readline(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+        if not x:
+            return None
+
+        line = x.decode()
+        self.outLog.append(line)
+        if self.parser != None:
+            self.parser.feed(line)
+        return line
+
+    async def _wait_for(self, token: str, timeout: Union[float, None]=None,
+                        infos: Union[asyncio.Queue, None]=None) -> Union[List[str], None]:
+        """Read lines until one starts with `token`, putting `info` lines into `infos` if given. Returns every line
+        read or None if the line didn't arrive in time."""
+        end = perf_counter() + timeout if timeout != None else None
+        lines = []
+        while True:
+            wait = None
+            if end != None:
+                wait = end - perf_counter()
+                if wait <= 0:
+                    return None
+
+            x = await self._read_line(wait)
+            if x == None:
+                return None
+
+            lines.append(x)
+            words = x.split()
+            if not words:
+                continue
+            if words[0] == token:
+                return lines
+            if infos != None and words[0] == "info":
+                infos.put_nowait(x.strip())
+
+
+    # Stoping engine
+
+    async def close(self) -> None:
+        """Send `quit` and wait for the engine to exit, killing it if it doesn't."""
+        if self.eng == None or self.eng.returncode != None:
+            return
+
+        try:
+            await self.send_command("quit")
+            await asyncio.wait_for(self.eng.wait(), self.QUIT_TIMEOUT)
+        except (asyncio.TimeoutError, BrokenPipeError, ConnectionResetError):
+            try:
+                self.eng.kill()
+            except ProcessLookupError: # Already exited
+                pass
+            await self.eng.wait()
+
+    async def __aenter__(self) -> 'AsyncUCIEngine':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+
+
+async def _analyse(path: str, index: int, depth: int) -> None:
+    """Search the starting position with one engine, printing its `info` lines."""
+    async with AsyncUCIEngine(path) as engine:
+        await engine.position()
+        search = asyncio.create_task(engine.go(depth=depth))
+        async for info in engine.infos():
+            print(f"[{index}] {info}")
+        print(f"[{index}] bestmove {await search}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive several UCI engines from one asyncio event loop.")
+    parser.add_argument("engine", help="Path of the engine")
+    parser.add_argument("-j", "--engines", type=int, default=2, help="Number of engines (default: 2)")
+    parser.add_argument("-d", "--depth", type=int, default=10, help="Depth to search (default: 10)")
+    args = parser.parse_args()
+
+    async def run():
+        await asyncio.gather(*(_analyse(args.engine, i, args.depth) for i in range(args.engines)))
+
+    asyncio.run(run())
+
+
+
+if __name__ == "__main__":
+    main()
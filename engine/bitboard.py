@@ -0,0 +1,341 @@
+# By Chris Parker
+# Bitboard primitives. Every board is a plain int where bit `y*8 + x` is the square
+# `Pair(y, x)` (A1 is bit 0, H8 is bit 63).
+
+# Chess Imports
+from chess_enum import Color, Type
+
+# MASKS
+FULL = 0xFFFFFFFFFFFFFFFF
+
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7
+
+RANK_1 = 0xFF
+RANK_2 = RANK_1 << 8
+RANK_4 = RANK_1 << 24
+RANK_5 = RANK_1 << 32
+RANK_7 = RANK_1 << 48
+RANK_8 = RANK_1 << 56
+
+NOT_A = FULL ^ FILE_A
+NOT_H = FULL ^ FILE_H
+NOT_AB = NOT_A & ~FILE_B
+NOT_GH = NOT_H & ~FILE_G
+
+# PIECE INDEXES
+# Index of each piece's bitboard in a list of 12 boards. White pieces come first.
+TYPE_INDEX = {Type.PAWN: 0, Type.KNIGHT: 1, Type.BISHOP: 2, Type.ROOK: 3, Type.QUEEN: 4, Type.KING: 5}
+INDEX_TYPE = (Type.PAWN, Type.KNIGHT, Type.BISHOP, Type.ROOK, Type.QUEEN, Type.KING)
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+BLACK_OFFSET = 6
+
+
+def piece_index(color: Color, type: Type) -> int:
+    """Return the index of a piece's bitboard in a list of 12 boards.
+
+    Parameters
+    ----------
+    color : Color
+        Color of the piece
+    type : Type
+        Type of the piece
+
+    Returns
+    -------
+    int
+        0-5 for white pieces, 6-11 for black pieces
+    """
+    return TYPE_INDEX[type] + (0 if color == Color.WHITE else BLACK_OFFSET)
+
+
+# BIT UTILITIES
+def lsb(bb: int) -> int:
+    """Return the index of the least significant set bit."""
+    return (bb & -bb).bit_length() - 1
+
+
+def msb(bb: int) -> int:
+    """Return the index of the most significant set bit."""
+    return bb.bit_length() - 1
+
+
+def popcount(bb: int) -> int:
+    return bb.bit_count()
+
+
+def squares(bb: int) -> list[int]:
+    """Return the index of every set bit, lowest first."""
+    rtn = []
+    while bb:
+        low = bb & -bb
+        rtn.append(low.bit_length() - 1)
+        bb ^= low
+
+    return rtn
+
+
+# SHIFTS
+def north(bb: int) -> int:
+    return (bb << 8) & FULL
+
+def south(bb: int) -> int:
+    return bb >> 8
+
+def east(bb: int) -> int:
+    return (bb << 1) & NOT_A & FULL
+
+def west(bb: int) -> int:
+    return (bb >> 1) & NOT_H
+
+def north_east(bb: int) -> int:
+    return (bb << 9) & NOT_A & FULL
+
+def north_west(bb: int) -> int:
+    return (bb << 7) & NOT_H & FULL
+
+def south_east(bb: int) -> int:
+    return (bb >> 7) & NOT_A
+
+def south_west(bb: int) -> int:
+    return (bb >> 9) & NOT_H
+
+
+# PRECOMPUTED TABLES
+# Built once at import. Indexed by square (and direction/color where needed)
+
+# Ray directions as (y, x) steps. Rook directions first, then bishop directions
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+OPPOSITE = (1, 0, 3, 2, 7, 6, 5, 4) # Direction pointing the other way
+POSITIVE = (True, False, True, False, True, True, False, False) # Does the square index grow along the ray?
+
+KNIGHT_STEPS = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
+KING_STEPS = ((1, 1), (1, 0), (1, -1), (0, 1), (0, -1), (-1, 1), (-1, 0), (-1, -1))
+
+
+def _targets(sq: int, steps: tuple[tuple[int, int], ...]) -> tuple[int, ...]:
+    y, x = sq >> 3, sq & 7
+    return tuple((y + dy)*8 + x + dx for dy, dx in steps if 0 <= y + dy < 8 and 0 <= x + dx < 8)
+
+
+def _ray(sq: int, d: int) -> tuple[int, ...]:
+    dy, dx = DIRECTIONS[d]
+    y, x = (sq >> 3) + dy, (sq & 7) + dx
+    rtn = []
+    while 0 <= y < 8 and 0 <= x < 8:
+        rtn.append(y*8 + x)
+        y += dy
+        x += dx
+    return tuple(rtn)
+
+
+def _mask(sqs) -> int:
+    rtn = 0
+    for sq in sqs:
+        rtn |= 1 << sq
+    return rtn
+
+
+# Target squares as tuples of square indexes (nearest first for rays)
+KNIGHT_SQUARES = tuple(_targets(sq, KNIGHT_STEPS) for sq in range(64))
+KING_SQUARES = tuple(_targets(sq, KING_STEPS) for sq in range(64))
+PAWN_SQUARES = {Color.WHITE: tuple(_targets(sq, ((1, -1), (1, 1))) for sq in range(64)),
+                Color.BLACK: tuple(_targets(sq, ((-1, -1), (-1, 1))) for sq in range(64))} # Captures only
+RAY_SQUARES = tuple(tuple(_ray(sq, d) for sq in range(64)) for d in range(8)) # [direction][square]
+
+# The same targets as bitboards
+KNIGHT_ATTACKS = tuple(_mask(t) for t in KNIGHT_SQUARES)
+KING_ATTACKS = tuple(_mask(t) for t in KING_SQUARES)
+PAWN_ATTACKS = {color: tuple(_mask(t) for t in table) for color, table in PAWN_SQUARES.items()}
+RAYS = tuple(tuple(_mask(r) for r in rays) for rays in RAY_SQUARES) # [direction][square]
+
+# Squares strictly between two squares, nearest to the first square first (empty if not on one line)
+BETWEEN_SQUARES: tuple[tuple[tuple[int, ...], ...], ...]
+BETWEEN: tuple[tuple[int, ...], ...] # As bitboards
+LINE: tuple[tuple[int, ...], ...] # Whole line through two squares, edge to edge (0 if not on one line)
+DIRECTION_TO: tuple[tuple[int | None, ...], ...] # Direction from one square to another (None if not on one line)
+
+
+def _build_lines() -> None:
+    global BETWEEN_SQUARES, BETWEEN, LINE, DIRECTION_TO
+    between = [[()] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    direction = [[None] * 64 for _ in range(64)]
+
+    for a in range(64):
+        for d in range(8):
+            ray = RAY_SQUARES[d][a]
+            full = RAYS[d][a] | RAYS[OPPOSITE[d]][a] | 1 << a
+            for i, b in enumerate(ray):
+                between[a][b] = ray[:i]
+                line[a][b] = full
+                direction[a][b] = d
+
+    BETWEEN_SQUARES = tuple(tuple(row) for row in between)
+    BETWEEN = tuple(tuple(_mask(sqs) for sqs in row) for row in between)
+    LINE = tuple(tuple(row) for row in line)
+    DIRECTION_TO = tuple(tuple(row) for row in direction)
+
+_build_lines()
+
+
+# ATTACK GENERATION
+# Attacks from one square, read from the tables
+def rook_attacks_from(sq: int, occupied: int) -> int:
+    """Return the squares a rook on `sq` attacks. The first blocker on each ray is included."""
+    attacks = 0
+    for d in ROOK_DIRECTIONS:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            first = (blockers & -blockers).bit_length() - 1 if POSITIVE[d] else blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+
+    return attacks
+
+
+def bishop_attacks_from(sq: int, occupied: int) -> int:
+    """Return the squares a bishop on `sq` attacks. The first blocker on each ray is included."""
+    attacks = 0
+    for d in BISHOP_DIRECTIONS:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            first = (blockers & -blockers).bit_length() - 1 if POSITIVE[d] else blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+
+    return attacks
+
+
+# These work on whole sets of pieces at once
+def pawn_attacks(bb: int, color: Color) -> int:
+    """Return every square attacked by the pawns in `bb`."""
+    if color == Color.WHITE:
+        return ((bb << 9) & NOT_A | (bb << 7) & NOT_H) & FULL
+    else:
+        return (bb >> 7) & NOT_A | (bb >> 9) & NOT_H
+
+
+def knight_attacks(bb: int) -> int:
+    """Return every square attacked by the knights in `bb`."""
+    return (
+        (bb << 17) & NOT_A | (bb << 15) & NOT_H | (bb << 10) & NOT_AB | (bb << 6) & NOT_GH |
+        (bb >> 17) & NOT_H | (bb >> 15) & NOT_A | (bb >> 10) & NOT_GH | (bb >> 6) & NOT_AB
+    ) & FULL
+
+
+def king_attacks(bb: int) -> int:
+    """Return every square attacked by the kings in `bb`."""
+    sides = (bb << 1) & NOT_A | (bb >> 1) & NOT_H
+    row = bb | sides
+
+    return (sides | (row << 8) | (row >> 8)) & FULL
+
+
+def _fill(bb: int, empty: int, shift: int, mask: int) -> int:
+    """Occluded fill in one direction. Stops on (and includes) the first blocker.
+
+    Parameters
+    ----------
+    bb : int
+        Sliding pieces
+    empty : int
+        Empty squares
+    shift : int
+        Amount to shift by. Positive is a left shift, negative is a right shift
+    mask : int
+        Squares that are allowed after the shift (removes file wrap-around)
+
+    Returns
+    -------
+    int
+        Attacked squares in that direction
+    """
+    attacks = 0
+    if shift > 0:
+        bb = (bb << shift) & mask
+        while bb:
+            attacks |= bb
+            bb = ((bb & empty) << shift) & mask
+    else:
+        shift = -shift
+        bb = (bb >> shift) & mask
+        while bb:
+            attacks |= bb
+            bb = ((bb & empty) >> shift) & mask
+
+    return attacks
+
+
+def rook_attacks(bb: int, occupied: int) -> int:
+    """Return every square attacked by the rook-like sliders in `bb`."""
+    empty = ~occupied & FULL
+    return (_fill(bb, empty, 8, FULL) | _fill(bb, empty, -8, FULL) |
+            _fill(bb, empty, 1, NOT_A & FULL) | _fill(bb, empty, -1, NOT_H))
+
+
+def bishop_attacks(bb: int, occupied: int) -> int:
+    """Return every square attacked by the bishop-like sliders in `bb`."""
+    empty = ~occupied & FULL
+    return (_fill(bb, empty, 9, NOT_A & FULL) | _fill(bb, empty, 7, NOT_H & FULL) |
+            _fill(bb, empty, -7, NOT_A) | _fill(bb, empty, -9, NOT_H))
+
+
+def attacks_by(pieces: list[int], color: Color, occupied: int) -> int:
+    """Return every square attacked by one side.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards
+    color : Color
+        Side that is attacking
+    occupied : int
+        Every occupied square
+
+    Returns
+    -------
+    int
+        Attacked squares
+    """
+    o = 0 if color == Color.WHITE else BLACK_OFFSET
+    queens = pieces[o+QUEEN]
+
+    return (pawn_attacks(pieces[o+PAWN], color) | knight_attacks(pieces[o+KNIGHT]) |
+            king_attacks(pieces[o+KING]) | bishop_attacks(pieces[o+BISHOP] | queens, occupied) |
+            rook_attacks(pieces[o+ROOK] | queens, occupied))
+
+
+def attackers_to(pieces: list[int], sq: int, color: Color, occupied: int) -> int:
+    """Return the pieces of one side that attack a square.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards
+    sq : int
+        Square index
+    color : Color
+        Side that is attacking
+    occupied : int
+        Every occupied square
+
+    Returns
+    -------
+    int
+        Bitboard of attacking pieces
+    """
+    o = 0 if color == Color.WHITE else BLACK_OFFSET
+    queens = pieces[o+QUEEN]
+
+    # A piece on `sq` attacks the same squares that would attack it
+    return (PAWN_ATTACKS[-color][sq] & pieces[o+PAWN] | KNIGHT_ATTACKS[sq] & pieces[o+KNIGHT] |
+            KING_ATTACKS[sq] & pieces[o+KING] | bishop_attacks_from(sq, occupied) & (pieces[o+BISHOP] | queens) |
+            rook_attacks_from(sq, occupied) & (pieces[o+ROOK] | queens))
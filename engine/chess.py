@@ -7,11 +7,20 @@ from abc import ABC, abstractmethod
 
 # Chess Imports
 from exceptions import InvalidFENError
-from chess_enum import Color, Column, Type
+from chess_enum import Color, Column, GameState, Type
+from bitboard import (attackers_to, attacks_by, bishop_attacks_from, lsb, piece_index, popcount, rook_attacks_from, squares,
+                      BETWEEN_SQUARES, BISHOP_DIRECTIONS, BLACK_OFFSET, DIRECTION_TO, INDEX_TYPE, KING_ATTACKS,
+                      KING_SQUARES, KNIGHT_ATTACKS, KNIGHT_SQUARES, PAWN_ATTACKS, PAWN_SQUARES, RAY_SQUARES,
+                      ROOK_DIRECTIONS)
 
 # Utility 
+from array import array
 from copy import deepcopy
-from linked_list import DoubleLinkedList as DLL, Node
+from movegen import (encode, has_legal_move as gen_has_legal_move, legal_moves as gen_legal_moves, move_promotion,
+                     move_to_uci, static_exchange as gen_static_exchange, Move, CASTLING, EN_PASSANT, FLAGS, PROMOTION,
+                     PROMOTION_CODES)
+from zobrist import castling_key, position_key, BLACK_TO_MOVE, EN_PASSANT_KEYS, PIECE_KEYS
+from evaluation import evaluate as evaluate_position, material_pst, EG_TABLE, MG_TABLE, PHASE
 
 # Testing/Debug
 from time import perf_counter
@@ -63,7 +72,7 @@ class Pair:
     def __bool__(self) -> bool:
         return (self.x != None and self.y != None)
 
-    def __eq__(self, other: 'Pair' | Any) -> bool:
+    def __eq__(self, other: 'Pair | Any') -> bool:
         if type(other) == Pair:
             return self.x == other.x and self.y == other.y
         else:
@@ -74,12 +83,36 @@ class Pair:
             return self.x
         elif key == "y" or key == "col" or key == 1:
             return self.y
+
+PAIRS = tuple(Pair(sq >> 3, sq & 7) for sq in range(64)) # One shared Pair per square index
+
+def move_pairs(move: Move) -> tuple[Pair, Pair]:
+    """Return the from and to squares of an encoded move (see movegen.encode)."""
+    return PAIRS[move & 63], PAIRS[move >> 6 & 63]
+
+def _pairs(sqs) -> list[Pair]:
+    """Turn square indexes into Pairs."""
+    return [PAIRS[sq] for sq in sqs]
+
+def _ray_ends(start: Pair, directions: tuple[int, ...], max_dist: int) -> list[Pair]:
+    """Every square up to `max_dist` steps from `start` along each direction."""
+    sq = start.y*8 + start.x
+    ends: list[Pair] = list()
+    for d in directions:
+        ends += _pairs(RAY_SQUARES[d][sq][:max_dist])
+
+    return ends
+
+def _slide_path(start: Pair, end: Pair) -> list[Pair]:
+    """The squares a slider passes over from `start`, ending with `end`."""
+    return _pairs(BETWEEN_SQUARES[start.y*8 + start.x][end.y*8 + end.x]) + [end]
         
 class Piece(ABC):
     """An abstract class representing a chess piece."""
     def __init__(self, color: Color, type: Type) -> None:
         self.color = color
         self.type = type
+        self.index = piece_index(color, type) # Bitboard index (see bitboard.piece_index)
         self.has_moved = False
 
     def __eq__(self, __o: 'Piece') -> bool:
@@ -131,31 +164,20 @@ class Pawn(Piece):
             return False
 
     def get_path(self, start: Pair, end: Pair):
-        path: list[Pair] = list() # List of coordinate the piece will move
-
-        if start.x != end.x: # If the pawn is moving diagonally (capture)
-            path = [end]
-        else: # If the pawn is moving straight 
-            path = [Pair(start.y+self.color, start.x), Pair(start.y+2*self.color, start.x)]
-
-        return path
+        if abs(start.y - end.y) == 2: # Double push passes over the square in front
+            return [PAIRS[(start.y+self.color)*8 + start.x], end]
+        else: # Single push or capture
+            return [end]
     
     def get_all_ends(self, start: Pair) -> list[Pair]:
-        ends: list[Pair] = list()
-        
-        ends.append(Pair(start.y+self.color, start.x))
-        ends.append(Pair(start.y+self.color, start.x+1))
-        ends.append(Pair(start.y+self.color, start.x-1))
-        
-        if not self.has_moved:
-            ends.append(Pair(start.y+(2*self.color), start.x))
-            
-        i = 0
-        while i < len(ends):
-            if ends[i].x < 0 or ends[i].y < 0:
-                ends.pop(i)
-            else:
-                i += 1
+        sq = start.y*8 + start.x
+        ends = _pairs(PAWN_SQUARES[self.color][sq]) # Captures
+        
+        ahead = sq + 8*self.color
+        if 0 <= ahead < 64:
+            ends.append(PAIRS[ahead])
+            if not self.has_moved and 0 <= ahead + 8*self.color < 64:
+                ends.append(PAIRS[ahead + 8*self.color])
             
         return ends
 
@@ -177,52 +199,11 @@ class Rook(Piece):
             return False
     
     def get_path(self, start: Pair, end: Pair):
-        path: list[Pair] = list()
-        path_len: int
-        
-        if start.x < end.x:
-            xDir = 1
-        elif start.x > end.x:
-            xDir = -1
-        else:
-            xDir = 0
-
-        if start.y < end.y:
-            yDir = 1
-        elif start.y > end.y:
-            yDir = -1
-        else:
-            yDir = 0
-
-        if xDir:
-            path_len = abs(start.x-end.x)
-        else:
-            path_len = abs(start.y-end.y)
-
-        for i in range(1, path_len+1): # Goes from 1 to length of path
-
-            if xDir: # If x is not constant
-                path.append(Pair(start.y, start.x + i*xDir)) # Y is constant 
-            else:
-                path.append(Pair(start.y + i*yDir, start.x)) # X is constant
-
-        return path
+        return _slide_path(start, end)
     
     @staticmethod
     def get_all_ends(start: Pair, max_dist: int=8) -> list[Pair]:
-        ends: list[Pair] = list()
-        
-        for x in range(-max_dist, max_dist):
-            if x != 0 and start.x + x >= 0:
-                ends.append(Pair(start.y, start.x+x))
-            
-        for y in range(-max_dist, max_dist):
-            if y != 0 and start.y + y >= 0:
-                ends.append(Pair(start.y+y, start.x))
-            
-        # ends.sort(key = lambda l : (l.y, l.x))
-            
-        return ends
+        return _ray_ends(start, ROOK_DIRECTIONS, max_dist)
     
     def clone(self):
         return Rook(self.color)
@@ -248,20 +229,7 @@ class Knight(Piece):
     
     @staticmethod
     def get_all_ends(start: Pair) -> list[Pair]:
-        y = start.y
-        x = start.x
-        
-        ends = [Pair(y+2, x+1), Pair(y+2, x-1), Pair(y-2, x+1), Pair(y-2, x-1),
-                Pair(y+1, x+2), Pair(y+1, x-2), Pair(y-1, x+2), Pair(y-1, x-2)]
-        
-        i = 0
-        while i < len(ends):
-            if ends[i].x < 0 or ends[i].y < 0:
-                ends.pop(i)
-            else:
-                i += 1
-        
-        return ends
+        return _pairs(KNIGHT_SQUARES[start.y*8 + start.x])
         
     def clone(self):
         return Knight(self.color)
@@ -275,36 +243,11 @@ class Bishop(Piece):
         return abs(start.x-end.x) == abs(start.y - end.y) and start != end
 
     def get_path(self, start: Pair, end: Pair):
-        path: list[Pair] = list()
-
-        path_len = abs(start.x-end.x) # Length of the path
-
-        # Finding x and y directions
-        xDir = yDir = 1
-        if start.x > end.x:
-            xDir = -1
-        if start.y > end.y:
-            yDir = -1
-
-        for i in range(1, path_len+1):
-            path.append(Pair(start.y + i*yDir, start.x + i*xDir))
-
-        return path
+        return _slide_path(start, end)
     
     @staticmethod
     def get_all_ends(start: Pair, max_dist: int=8) -> list[Pair]:
-        ends: list[Pair] = list()
-        
-        for y_dir in (-1, 1):
-            for x_dir in (-1, 1):
-                for y in range(max_dist):
-                    for x in range(max_dist):
-                        if start.x + x*x_dir >= 0 and start.y + y*y_dir >= 0:
-                            ends.append(Pair(start.y+y*y_dir, start.x+x*x_dir))
-
-        # ends.sort(key = lambda l : (l.y, l.x))
-        
-        return ends
+        return _ray_ends(start, BISHOP_DIRECTIONS, max_dist)
         
     def clone(self):
         return Bishop(self.color)
@@ -318,28 +261,11 @@ class Queen(Piece):
         return Bishop(self.color).is_valid_path(start, end) or Rook(self.color).is_valid_path(start, end)
 
     def get_path(self, start: Pair, end: Pair):
-
-        xDir = yDir = 0
-        if start.x < end.x:
-            xDir = 1
-        elif start.x > end.x:
-            xDir = -1
-
-        if start.y < end.y:
-            yDir = 1
-        elif start.y > end.y:
-            yDir = -1
-
-        if xDir != 0 and yDir != 0:
-            return Bishop(self.color).get_path(start, end)
-        else:
-            return Rook(self.color).get_path(start, end)
+        return _slide_path(start, end)
         
     @staticmethod
     def get_all_ends(start: Pair, max_dist:int=8) -> list[Pair]:
-        ends: list[Pair] = list()
-        
-        ends = Bishop.get_all_ends(start, max_dist) + Rook.get_all_ends(start, max_dist)
+        ends = _ray_ends(start, BISHOP_DIRECTIONS + ROOK_DIRECTIONS, max_dist)
         
         ends.sort(key = lambda l : (l.y, l.x))
         
@@ -362,20 +288,18 @@ class King(Piece):
     
     @staticmethod
     def get_all_ends(start: Pair) -> list[Pair]:
-        ends: list[Pair] = list()
-        for y_dir in (-1, 0, 1):
-            for x_dir in (-1, 0, 1):
-                new_x = start.x + x_dir
-                new_y = start.y + y_dir
-                
-                if new_x >= 0 and new_y >= 0:
-                    ends.append(Pair(new_y, new_x))
-                    
-        return ends
+        return _pairs(KING_SQUARES[start.y*8 + start.x])
 
     def clone(self):
         return King(self.color)
 
+# Attack directions per slider (see bitboard.DIRECTIONS) and attacked squares per leaper
+SLIDES = {Type.ROOK: ROOK_DIRECTIONS, Type.BISHOP: BISHOP_DIRECTIONS, Type.QUEEN: ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+STEPS = {Type.KNIGHT: KNIGHT_SQUARES, Type.KING: KING_SQUARES}
+
+PROMOTIONS = {Type.QUEEN: Queen, Type.ROOK: Rook, Type.BISHOP: Bishop, Type.KNIGHT: Knight} # Promotion choices
+PIECES = {**PROMOTIONS, Type.PAWN: Pawn, Type.KING: King} # Piece class per type
+
 class Square:
         def __init__(self, coordinates: Pair, piece: Piece | None) -> None:
             self.coords = coordinates
@@ -405,8 +329,14 @@ class ChessBoard:
         self.EMPTY_BOARD = tuple(tuple(Square(Pair(y, x), None) for x in range(8)) for y in range(8)) # Blank board
         self.DEFAULT_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR" # FEN for default placement
         
-        self.attacked_squares_w: list[list[Pair, int]] = list() # Squares attacked by white
-        self.attacked_squares_b: list[list[Pair, int]] = list() # Squares attacked by black
+        # Attack maps, updated as pieces are placed
+        self.attack_count_w: list[int] = [0] * 64 # Number of white pieces attacking each square
+        self.attack_count_b: list[int] = [0] * 64 # Number of black pieces attacking each square
+        self._attacks: list[list[list[int]]] = [[] for _ in range(64)] # Squares attacked from each square
+        self._attackers: list[int] = [0] * 64 # Mask of the squares attacking each square
+        self._sliders = 0 # Mask of the squares holding a bishop, rook or queen
+        self._kings: dict[Color, int | None] = {Color.WHITE: None, Color.BLACK: None} # King squares
+        
         self.board: list[list[Square]] = deepcopy(list(self.EMPTY_BOARD))
         
         if start_FEN:
@@ -450,8 +380,8 @@ class ChessBoard:
 
         path = sSquare.piece.get_path(frm, to)
 
-        if sSquare.piece.type == Type.PAWN and len(path) > 1 and fSquare.piece:
-            return  False, None
+        if sSquare.piece.type == Type.PAWN and valid != 'c' and fSquare.piece:
+            return  False, None # Pawns can't push onto a piece
 
         for i in range(len(path)):
             if i < len(path)-1:
@@ -480,173 +410,174 @@ class ChessBoard:
         Piece | None
             Return the piece captured or None if no piece was captured.
         """
-        cSquare = self.get_square(frm)
-        fSquare = self.get_square(to)
+        piece = self.get_square(frm).piece
+        cap = self.get_square(to).piece
 
-        cap = fSquare.piece
-        fSquare.piece = cSquare.piece
-        fSquare.piece.has_moved = True
-        cSquare.piece = None
+        self.set_square(frm, None)
+        self.set_square(to, piece)
+        piece.has_moved = True
 
         return cap
 
     # MODIFIER METHODS
     def set_square(self, sqr: Pair, piece: Piece) -> None:
-        self.get_square(sqr).piece = piece
+        self.place(sqr.y*8 + sqr.x, piece)
 
-    def reset_board(self) -> None:
-        self.FEN_set_postion(self.DEFAULT_FEN)
+    def place(self, sq: int, piece: Piece | None) -> None:
+        """Put a piece (or nothing) on a square by index (`y*8 + x`).
+        NOTE: Every change to the board goes through here. Subclasses hook it to keep other data in sync.
 
-    def update_attacked_squares(self):
-        """Update attacked_squares_w and attacked_squares_b to accurately show the squares under attack."""
-        # This whole function seems really inefficient. It'll be fine for now but it feels dumb
-
-        def _cull_all():
-            """Format data after receiving coordinates from functions."""
-            def _cull(list: list[Pair]):
-                """Format data for one list."""
-                i = 0
-                while i < len(list):
-                    pair = list[i]
-                    if pair.is_negative() or pair.is_above(len(self.board)-1, len(self.board[0])-1):
-                        del(list[i])
-                    else:
-                        i += 1
-
-                for i in range(len(list)):
-                    list[i] = [list[i], 1]
-
-                i = 0
-                while i < len(list):
-                    if i-1 >= 0 and list[i-1][0] == list[i][0]:
-                        list[i][1] += list[i-1][1]
-                        del(list[i-1])
-                    else:
-                        i += 1
-
-            _cull(self.attacked_squares_w)
-            _cull(self.attacked_squares_b)
-
-        def _byPawn(square: Square) -> list[Pair]:
-            return [
-                Pair(square.coords.y + square.piece.color, square.coords.x-1),
-                Pair(square.coords.y + square.piece.color, square.coords.x+1)
-            ] # Pawns can only attack 2 squares
-        
-        def _byKing(square: Square) -> list[Pair]:
-            return [
-                Pair(square.coords.y-1, square.coords.x-1), Pair(square.coords.y+1, square.coords.x+1), 
-                Pair(square.coords.y-1, square.coords.x+1), Pair(square.coords.y+1, square.coords.x-1), 
-                Pair(square.coords.y, square.coords.x+1),   Pair(square.coords.y, square.coords.x-1),
-                Pair(square.coords.y+1, square.coords.x),   Pair(square.coords.y-1, square.coords.x)
-            ] # Returns all squares around king. Invalid squares are removed later
-
-        def _byBishop(square: Square) -> list[Pair]:
-            rtn = list()
+        Parameters
+        ----------
+        sq : int
+            Square index
+        piece : Piece | None
+            Piece to put on the square
+        """
+        square = self.board[sq >> 3][sq & 7]
+        old = square.piece
+        
+        # Emptying or filling a square opens or blocks the rays of every slider that reaches it
+        blocked = self._attackers[sq] & self._sliders if (old == None) != (piece == None) else 0
+        
+        if old:
+            self._remove_attacks(sq, old.color)
+            self._sliders &= ~(1 << sq)
+            if old.type == Type.KING and self._kings[old.color] == sq:
+                self._kings[old.color] = None
             
-            # Every combination of directions
-            for yDir in (-1, 1):
-                for xDir in (-1, 1):
-                    y = square.coords.y + yDir
-                    x = square.coords.x + xDir
-
-                    while y < len(self.board) and y >= 0 and x < len(self.board[y]) and x >= 0:
-                        rtn.append(Pair(y, x))
-
-                        if self.board[y][x].piece != None:
-                            break # Stops when there is a peace in the path
-
-                        y += yDir
-                        x += xDir
-
-            return rtn
-
-        def _byRook(square: Square) -> list[Pair]:
-
-            def _findStop(list: list[Pair]) -> list[Pair]:
-                r = []
-                for pair in list:
-                    r.append(pair)
-                    if self.board[pair.y][pair.x].piece != None:
-                        break # Stop when another piece is in the path
-
-                return r
-
-            y = square.coords.y
-            x = square.coords.x
-
-            # Maxima
-            maxY = len(self.board)-1
-            maxX = len(self.board[0])-1
-
-            # Paths to edges of board
-            maxYPath = square.piece.get_path(square.coords, Pair(maxY, x))
-            minYPath = square.piece.get_path(square.coords, Pair(0, x))
-
-            maxXPath = square.piece.get_path(square.coords, Pair(y, maxX))
-            minXPath = square.piece.get_path(square.coords, Pair(y, 0))
-
-            # Return all 4 paths rook covers
-            return _findStop(maxYPath) + _findStop(minYPath) + _findStop(maxXPath) + _findStop(minXPath)
+        square.piece = piece
+        
+        while blocked:
+            low = blocked & -blocked
+            blocked ^= low
+            self._update_ray(low.bit_length() - 1, sq)
+        
+        if piece:
+            if piece.type in SLIDES:
+                self._sliders |= 1 << sq
+            if piece.type == Type.KING:
+                self._kings[piece.color] = sq
+            self._add_attacks(sq, piece)
 
-        def _byQueen(square: Square) -> list[Pair]:
-            # Queens have the movement of a bishop and rook combined 
-            return _byBishop(square) + _byRook(square) 
+    def reset_board(self) -> None:
+        self.FEN_set_postion(self.DEFAULT_FEN)
 
-        def _byKnight(square: Square) -> list[Pair]:
-            p = square.coords
+    def update_attacked_squares(self):
+        """Rebuild the attack maps from scratch.
+        NOTE: Not needed after a move. The maps are kept up to date as pieces are placed.
+        """
+        self.attack_count_w = [0] * 64
+        self.attack_count_b = [0] * 64
+        self._attacks = [[] for _ in range(64)]
+        self._attackers = [0] * 64
+        
+        for sq in range(64):
+            piece = self.board[sq >> 3][sq & 7].piece
+            if piece:
+                self._add_attacks(sq, piece)
+                
+    def _add_attacks(self, sq: int, piece: Piece) -> None:
+        """Add the attacks of a piece on a square to the attack maps."""
+        counts = self.attack_count_w if piece.color == Color.WHITE else self.attack_count_b
+        attackers = self._attackers
+        bit = 1 << sq
+        
+        if piece.type in SLIDES:
+            rays = [[] for _ in range(8)]
+            for d in SLIDES[piece.type]:
+                rays[d] = self._trace(sq, d)
+        elif piece.type == Type.PAWN:
+            rays = [PAWN_SQUARES[piece.color][sq]]
+        else:
+            rays = [STEPS[piece.type][sq]]
             
-            # Returns all squares around knight. Invalid squares are removed later
-            return Knight.get_all_ends(p)
-        
-        # Clears old lists
-        self.attacked_squares_w.clear()
-        self.attacked_squares_b.clear()
-
-        # Goes through every rank and file
-        for rank in self.board: 
-            for square in rank:
-                # Ensuring there is a piece on the square
-                if square.piece != None:
-                    if square.piece.color == Color.WHITE:
-                        # Using eval to avoid dummy thicc if statement blocks. Will evaluate to something like:
-                        # `_by<Piece>(square)` where "<Piece>" is the name of the piece.
-                        #
-                        # WARNING: This can be dangerous! It should be fine in this case but this may need to be 
-                        # reevaluated in a later program
-                        self.attacked_squares_w += eval("_by"+(square.piece.type.name.capitalize())+"(square)")
-                    else:
-                        self.attacked_squares_b += eval("_by"+(square.piece.type.name.capitalize())+"(square)")
+        for ray in rays:
+            for target in ray:
+                counts[target] += 1
+                attackers[target] |= bit
+                
+        self._attacks[sq] = rays
+        
+    def _remove_attacks(self, sq: int, color: Color) -> None:
+        """Remove the attacks of the piece on a square from the attack maps."""
+        counts = self.attack_count_w if color == Color.WHITE else self.attack_count_b
+        attackers = self._attackers
+        bit = ~(1 << sq)
+        
+        for ray in self._attacks[sq]:
+            for target in ray:
+                counts[target] -= 1
+                attackers[target] &= bit
+                
+        self._attacks[sq] = []
         
-        # # Sort the lists with the y's and then the x's
-        # self.attacked_squares_w.sort(key = lambda l : (l.y, l.x))
-        # self.attacked_squares_b.sort(key = lambda l : (l.y, l.x))
-
-        _cull_all() # Format the data    
+    def _update_ray(self, sq: int, through: int) -> None:
+        """Retrace the one ray of the slider on `sq` that passes through square `through`."""
+        piece = self.board[sq >> 3][sq & 7].piece
+        counts = self.attack_count_w if piece.color == Color.WHITE else self.attack_count_b
+        attackers = self._attackers
+        bit = 1 << sq
+        
+        d = DIRECTION_TO[sq][through]
+        
+        rays = self._attacks[sq]
+        for target in rays[d]:
+            counts[target] -= 1
+            attackers[target] &= ~bit
+            
+        rays[d] = self._trace(sq, d)
+        for target in rays[d]:
+            counts[target] += 1
+            attackers[target] |= bit
+        
+    def _trace(self, sq: int, d: int) -> tuple[int, ...]:
+        """Follow a ray from a square until it leaves the board or hits a piece (which is included)."""
+        ray = RAY_SQUARES[d][sq]
+        board = self.board
+        
+        for i, target in enumerate(ray):
+            if board[target >> 3][target & 7].piece != None:
+                return ray[:i+1] # Stops when there is a piece in the path
+            
+        return ray
     
     # ACCESSOR METHODS
     def get_square(self, squarePos: Pair) -> Square:
         return self.board[squarePos.y][squarePos.x]
 
+    def piece_at(self, sq: int) -> Piece | None:
+        """Get the piece on a square by index (`y*8 + x`)."""
+        return self.board[sq >> 3][sq & 7].piece
+    
+    def bitboards(self) -> list[int]:
+        """Return the 12 piece bitboards of the position (see bitboard.piece_index)."""
+        boards = [0] * 12
+        for sq in range(64):
+            piece = self.board[sq >> 3][sq & 7].piece
+            if piece:
+                boards[piece.index] |= 1 << sq
+                
+        return boards
+
+    @property
+    def attacked_squares_w(self) -> list[list[Pair, int]]:
+        """Squares attacked by white and the number of attackers."""
+        return [[Pair(sq >> 3, sq & 7), n] for sq, n in enumerate(self.attack_count_w) if n]
+    
+    @property
+    def attacked_squares_b(self) -> list[list[Pair, int]]:
+        """Squares attacked by black and the number of attackers."""
+        return [[Pair(sq >> 3, sq & 7), n] for sq, n in enumerate(self.attack_count_b) if n]
+
     def get_king_position(self, color: Color) -> Pair:
-        for rank in range(len(self.board)):
-            for file in range(len(self.board[rank])):
-                square = self.get_square(Pair(rank, file))
-                if square.piece and square.piece.type == Type.KING and square.piece.color == color:
-                    return Pair(rank, file)
+        sq = self._kings[color]
+        if sq != None:
+            return Pair(sq >> 3, sq & 7)
         
     def in_attacked(self, coord: Pair, side: Color) -> bool:
-        atk = None
-        if side == Color.WHITE:
-            atk = self.attacked_squares_b
-        else:
-            atk = self.attacked_squares_w
-            
-        for item in atk:
-            if item[0] == coord:
-                return True
-            
-        return False
+        counts = self.attack_count_b if side == Color.WHITE else self.attack_count_w
+        return counts[coord.y*8 + coord.x] > 0
         
     # FEN METHODS
     def FEN_piece_placement(self) -> str:
@@ -801,36 +732,653 @@ class ChessBoard:
 
         return rtn
 
-class GameStates(DLL):
-    MAX = 1000
+class BitBoard(ChessBoard):
+    """A ChessBoard backed by 12 piece bitboards and occupancy masks (see bitboard.py).
+    
+    The Square grid is still kept so pieces keep their identity (and `has_moved`), but occupancy, attacks,
+    king lookups and FEN placement all come from the bitboards. The per-square attack counts of ChessBoard are
+    not kept; use the `attacked_w` and `attacked_b` masks instead.
+    """
+    # CONSTRUCTOR
+    def __init__(self, start_FEN: str=None) -> None:
+        self.pieces: list[int] = [0] * 12 # One board per piece (see bitboard.piece_index)
+        self.occupied_w = 0 # Squares with a white piece
+        self.occupied_b = 0 # Squares with a black piece
+        self.occupied = 0 # Squares with any piece
+        
+        # Attack masks, calculated when first needed after a change
+        self._attacked_w: int | None = None
+        self._attacked_b: int | None = None
+        
+        super().__init__(start_FEN)
+        
+    # MOVEMENT METHODS
+    def can_move(self, frm: Pair, to: Pair, pseudoCap: Pair=None) -> tuple[bool, Literal['c'] | None]:
+        """Check if a piece can move using the attack and occupancy bitboards.
+
+        Parameters
+        ----------
+        frm : Pair
+            Starting square.
+        to : Pair
+            Ending square.
+        pseudoCap : Pair
+            Square that can be "captured" but is empty (e.g., en passant square),
+
+        Returns
+        -------
+        tuple[bool, Literal['c'] | None]
+            Return True if the piece can move or False if it cannot. Returns 'c' if the move would
+            result in a capture.
+        """
+        piece = self.board[frm.y][frm.x].piece
+        if piece == None:
+            return False, None
+        
+        start = frm.y*8 + frm.x
+        bit = 1 << (to.y*8 + to.x)
+        if piece.color == Color.WHITE:
+            own, enemy = self.occupied_w, self.occupied_b
+        else:
+            own, enemy = self.occupied_b, self.occupied_w
+            
+        if own & bit:
+            return False, None
+        
+        if piece.type == Type.PAWN:
+            if pseudoCap:
+                enemy |= 1 << (pseudoCap.y*8 + pseudoCap.x)
+            if PAWN_ATTACKS[piece.color][start] & enemy & bit:
+                return True, 'c'
+            
+            return (True, None) if self.pawn_pushes(start) & bit else (False, None)
+        
+        if self.attacks_from(start) & bit:
+            return True, ('c' if enemy & bit else None)
+        
+        return False, None
+    
+    # MODIFIER METHODS
+    def place(self, sq: int, piece: Piece | None) -> None:
+        square = self.board[sq >> 3][sq & 7]
+        bit = 1 << sq
+        
+        old = square.piece
+        if old:
+            self.pieces[old.index] ^= bit
+            
+        if piece:
+            self.pieces[piece.index] |= bit
+            
+            if piece.color == Color.WHITE:
+                self.occupied_w |= bit
+                self.occupied_b &= ~bit
+            else:
+                self.occupied_b |= bit
+                self.occupied_w &= ~bit
+            self.occupied |= bit
+        else:
+            self.occupied_w &= ~bit
+            self.occupied_b &= ~bit
+            self.occupied &= ~bit
+        
+        square.piece = piece
+        self._attacked_w = self._attacked_b = None
+        
+    def update_attacked_squares(self):
+        """Mark the attack masks as out of date. They are recalculated the next time they are needed."""
+        self._attacked_w = self._attacked_b = None
+        
+    # ACCESSOR METHODS
+    @property
+    def attacked_w(self) -> int:
+        """Bitboard of the squares attacked by white."""
+        if self._attacked_w == None:
+            self._attacked_w = attacks_by(self.pieces, Color.WHITE, self.occupied)
+        return self._attacked_w
+    
+    @property
+    def attacked_b(self) -> int:
+        """Bitboard of the squares attacked by black."""
+        if self._attacked_b == None:
+            self._attacked_b = attacks_by(self.pieces, Color.BLACK, self.occupied)
+        return self._attacked_b
+    
+    @property
+    def attacked_squares_w(self) -> list[list[Pair, int]]:
+        """Squares attacked by white and the number of attackers."""
+        return [[Pair(sq >> 3, sq & 7), popcount(attackers_to(self.pieces, sq, Color.WHITE, self.occupied))] 
+                for sq in squares(self.attacked_w)]
+    
+    @property
+    def attacked_squares_b(self) -> list[list[Pair, int]]:
+        """Squares attacked by black and the number of attackers."""
+        return [[Pair(sq >> 3, sq & 7), popcount(attackers_to(self.pieces, sq, Color.BLACK, self.occupied))] 
+                for sq in squares(self.attacked_b)]
+    
+    def attacks_from(self, sq: int) -> int:
+        """Return the squares attacked by the piece on a square.
+
+        Parameters
+        ----------
+        sq : int
+            Square index (`y*8 + x`)
+
+        Returns
+        -------
+        int
+            Bitboard of attacked squares (empty if there is no piece)
+        """
+        piece = self.board[sq >> 3][sq & 7].piece
+        
+        if piece == None:
+            return 0
+        elif piece.type == Type.PAWN:
+            return PAWN_ATTACKS[piece.color][sq]
+        elif piece.type == Type.KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        elif piece.type == Type.BISHOP:
+            return bishop_attacks_from(sq, self.occupied)
+        elif piece.type == Type.ROOK:
+            return rook_attacks_from(sq, self.occupied)
+        elif piece.type == Type.QUEEN:
+            return bishop_attacks_from(sq, self.occupied) | rook_attacks_from(sq, self.occupied)
+        else:
+            return KING_ATTACKS[sq]
+        
+    def bitboards(self) -> list[int]:
+        """Return the 12 piece bitboards of the position (see bitboard.piece_index).
+        NOTE: This is the live list. Don't modify it
+        """
+        return self.pieces
+        
+    def pawn_pushes(self, sq: int) -> int:
+        """Return the squares the pawn on a square can move straight to.
+
+        Parameters
+        ----------
+        sq : int
+            Square index (`y*8 + x`)
+
+        Returns
+        -------
+        int
+            Bitboard of push squares
+        """
+        piece = self.board[sq >> 3][sq & 7].piece
+        empty = ~self.occupied
+        
+        if piece.color == Color.WHITE:
+            single = (1 << sq << 8) & empty
+            double = (single << 8) & empty if single and not piece.has_moved else 0
+        else:
+            single = (1 << sq >> 8) & empty
+            double = (single >> 8) & empty if single and not piece.has_moved else 0
+            
+        return (single | double) & 0xFFFFFFFFFFFFFFFF
     
-    def __init__(self, start_state):
-        super().__init__(start_state)
-        self.start = start_state
+    def get_king_position(self, color: Color) -> Pair:
+        king = self.pieces[piece_index(color, Type.KING)]
+        if king:
+            sq = lsb(king)
+            return Pair(sq >> 3, sq & 7)
+        
+    def in_attacked(self, coord: Pair, side: Color) -> bool:
+        return bool(attackers_to(self.pieces, coord.y*8 + coord.x, -side, self.occupied))
     
-    def add_state(self, state: 'Chess'):
-        if self.len + 1 < self.MAX:
-            self.add_end(state)
+    # FEN METHODS
+    def FEN_piece_placement(self) -> str:
+        """Return the piece placement section of a FEN string, built from the bitboards.
+
+        Returns
+        -------
+        str
+            Piece placement FEN string 
+            NOTE: This is not a complete FEN string, just the piece placement
+        """
+        letters = [""] * 64
+        for i, bb in enumerate(self.pieces):
+            l = INDEX_TYPE[i % 6].value
+            if i >= BLACK_OFFSET:
+                l = l.lower() # Black pieces are represented with lowercase
+            
+            for sq in squares(bb):
+                letters[sq] = l
+                
+        rows = list()
+        for rank in range(7, -1, -1):
+            row = ""
+            digit = 0
+            for l in letters[rank*8:rank*8+8]:
+                if l:
+                    if digit:
+                        row += str(digit)
+                        digit = 0
+                    row += l
+                else:
+                    digit += 1
+            if digit:
+                row += str(digit)
+            rows.append(row)
+            
+        return "/".join(rows)
+    
+
+class GameStates:
+    """Tree of every line played in a game. Each node is one ply, stored as an encoded move (see
+    movegen.encode), a packed undo word (see MoveRecord.pack) and the Zobrist key of the position it reaches.
+    Variations share every move before the point where they split. A FEN keyframe is kept every
+    KEYFRAME_INTERVAL plies, with the pieces captured before it, and any position is rebuilt by replaying moves
+    from the nearest keyframe above it.
+    The cursor (`current`) sits on a line (`line`, the nodes from the root to the end of the line last visited),
+    and can seek to any ply of that line in O(1).
+    NOTE: Node ids are indexes into the arrays below. They never change, and the root is always 0
+    """
+    KEYFRAME_INTERVAL = 32
+    ROOT = 0
+    
+    def __init__(self, start_FEN: str, start_key: int, board_type: type[ChessBoard]=ChessBoard):
+        """Start a new tree.
+
+        Parameters
+        ----------
+        start_FEN : str
+            FEN string of the first position
+        start_key : int
+            Zobrist key of the first position
+        board_type : type[ChessBoard], optional
+            Board representation of rebuilt positions, by default ChessBoard
+        """
+        self.start = start_FEN
+        self.board_type = board_type
+        
+        # One entry per node
+        self.parent = array('l', [-1])
+        self.moves = array('H', [0]) # Move that reaches the node
+        self.undo = array('L', [0]) # Packed undo word of that move
+        self.keys = array('Q', [start_key]) # Zobrist key of the node's position
+        self.plies = array('L', [0]) # Distance from the root
+        self.first_child = array('l', [-1]) # Main continuation (-1 for none)
+        self.next_sibling = array('l', [-1]) # Next variation from the same parent
+        self.same_key = array('l', [-1]) # Next node with the same key (older)
+        
+        self._by_key: dict[int, int] = {start_key: self.ROOT} # Zobrist key -> newest node with that key
+        self.keyframes: dict[int, str] = {self.ROOT: start_FEN} # Node -> FEN
+        self.keyframe_caps: dict[int, tuple[int, ...]] = {self.ROOT: ()} # Node -> piece indexes captured, in order
+        self.current = self.ROOT
+        self.line: list[int] = [self.ROOT] # Node at each ply of the current line
+    
+    @property
+    def ply(self) -> int:
+        """Number of plies from the start to the current node."""
+        return self.plies[self.current]
+    
+    def add_state(self, game: 'Chess', record: 'MoveRecord') -> int:
+        """Add a move that has just been made from the current node and move to it.
+        If the move was already played from here, its node is reused.
+
+        Parameters
+        ----------
+        game : Chess
+            Game after the move
+        record : MoveRecord
+            Record returned by Chess.make_move()
+
+        Returns
+        -------
+        int
+            Id of the node
+        """
+        parent = self.current
+        move = record.encode()
+        
+        node = self.child(parent, move)
+        if node != -1:
+            self.new_branch(node)
+            return node
+        
+        node = len(self.parent)
+        key = game.zobrist
+        self.parent.append(parent)
+        self.moves.append(move)
+        self.undo.append(record.pack())
+        self.keys.append(key)
+        self.plies.append(self.plies[parent] + 1)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.same_key.append(self._by_key.get(key, -1))
+        self._by_key[key] = node
+        
+        # New variations go after the existing ones so the main line stays first
+        last = self.first_child[parent]
+        if last == -1:
+            self.first_child[parent] = node
+        else:
+            while self.next_sibling[last] != -1:
+                last = self.next_sibling[last]
+            self.next_sibling[last] = node
         
-    def remove_state(self):
-        self.remove_last()
+        if self.plies[node] % self.KEYFRAME_INTERVAL == 0:
+            self.keyframes[node] = game.get_FEN()
+            self.keyframe_caps[node] = self.captured(node)
+            
+        self.new_branch(node)
+        return node
         
-    def new_branch(self, state: 'Chess'=None):
-        if self.current.next:
-            self.current.next.previous = None # Delete the pointer of the next node
-        if state:
-            self.current.next = Node(state, None, self.current) # Set the next pointer to the new branch
-            self.tail = self.current.next
+    def remove_state(self) -> tuple[Move, int, int] | None:
+        """Step back from the current node to its parent. The node stays in the tree.
+
+        Returns
+        -------
+        tuple[Move, int, int] | None
+            The move, undo word and Zobrist key before the move (None at the root)
+        """
+        node = self.current
+        if node == self.ROOT:
+            return None
+        
+        self.current = self.parent[node]
+        return self.moves[node], self.undo[node], self.keys[self.current]
+        
+    def new_branch(self, node: int):
+        """Make `node` the current node, so the next move played starts a variation from there.
+        If the node isn't on the current line, the line becomes the node's line followed by its main continuation.
+        NOTE: The game itself is not changed. See Chess.go_to()
+        """
+        if not 0 <= node < len(self.parent):
+            raise IndexError(node)
+        self.current = node
+        
+        line = self.line
+        ply = self.plies[node]
+        if ply < len(line) and line[ply] == node:
+            return
+        
+        if ply <= len(line) and line[ply - 1] == self.parent[node]: # Usually a move played from the line
+            del line[ply:]
+            line.append(node)
         else:
-            self.tail = self.current
-        self._count_len()
+            self.line = line = self.path(node)
+            
+        child = self.first_child[node]
+        while child != -1:
+            line.append(child)
+            child = self.first_child[child]
+            
+    # CURSOR
+    # NOTE: These only move the cursor. Use Chess.go_to() or Chess.seek() to move a game with its history
+    def next(self) -> int:
+        """Move one ply forward along the current line and return the current node"""
+        if self.plies[self.current] + 1 < len(self.line):
+            self.current = self.line[self.plies[self.current] + 1]
+        return self.current
+    
+    def previous(self) -> int:
+        """Move one ply back along the current line and return the current node"""
+        if self.current != self.ROOT:
+            self.current = self.parent[self.current]
+        return self.current
+    
+    def move_to_index(self, ply: int) -> int:
+        """Move to a ply of the current line (clamped to the line) and return the current node"""
+        self.current = self.line[min(max(ply, 0), len(self.line) - 1)]
+        return self.current
+    
+    def __getitem__(self, ply: int) -> int:
+        """Return the node at a ply of the current line"""
+        return self.line[ply]
+        
+    def child(self, node: int, move: Move) -> int:
+        """Return the child of a node reached by a move (-1 if it hasn't been played)."""
+        child = self.first_child[node]
+        while child != -1 and self.moves[child] != move:
+            child = self.next_sibling[child]
+            
+        return child
+    
+    def children(self, node: int) -> list[int]:
+        """Return the children of a node, main line first."""
+        rtn: list[int] = list()
+        child = self.first_child[node]
+        while child != -1:
+            rtn.append(child)
+            child = self.next_sibling[child]
+            
+        return rtn
+    
+    def path(self, node: int) -> list[int]:
+        """Return the nodes from the root to `node` (both included)."""
+        rtn = [node]
+        while node != self.ROOT:
+            node = self.parent[node]
+            rtn.append(node)
+            
+        rtn.reverse()
+        return rtn
+    
+    def find(self, position: int | str) -> list[int]:
+        """Find every node reaching a position.
+
+        Parameters
+        ----------
+        position : int | str
+            Zobrist key or FEN string
+
+        Returns
+        -------
+        list[int]
+            Node ids, newest first
+        """
+        if isinstance(position, str):
+            game = Chess.bare(self.board_type)
+            game.set_FEN(position)
+            position = game.zobrist
+            
+        rtn: list[int] = list()
+        node = self._by_key.get(position, -1)
+        while node != -1:
+            rtn.append(node)
+            node = self.same_key[node]
+            
+        return rtn
+    
+    def transpositions(self, node: int) -> list[int]:
+        """Return the other nodes (in any line) reaching the same position as `node`."""
+        return [other for other in self.find(self.keys[node]) if other != node]
+    
+    def captured(self, node: int) -> tuple[int, ...]:
+        """Return the pieces captured from the root to a node, as piece indexes in the order they were taken.
+        Only the moves after the nearest keyframe are walked."""
+        codes: list[int] = list()
+        while node not in self.keyframe_caps:
+            captured = MoveRecord.unpack(self.undo[node])[0]
+            if captured != None:
+                codes.append(captured)
+            node = self.parent[node]
+            
+        codes.reverse()
+        return self.keyframe_caps[node] + tuple(codes)
+        
+    def get_state(self, node: int | None=None) -> 'Chess':
+        """Rebuild the position of a node.
+
+        Parameters
+        ----------
+        node : int | None, optional
+            Node id, by default the current node
+
+        Returns
+        -------
+        Chess
+            New game (without history) in that position
+        """
+        if node == None:
+            node = self.current
+        if not 0 <= node < len(self.parent):
+            raise IndexError(node)
+        
+        moves: list[Move] = list() # Moves from the nearest keyframe, last first
+        frame = node
+        while frame not in self.keyframes:
+            moves.append(self.moves[frame])
+            frame = self.parent[frame]
+        
+        game = Chess(False, self.board_type)
+        game.set_FEN(self.keyframes[frame])
+        for move in reversed(moves):
+            game.make(move)
+        
+        for captured in self.captured(node): # Captured piece lists
+            piece = PIECES[INDEX_TYPE[captured % BLACK_OFFSET]]
+            if captured < BLACK_OFFSET:
+                game.white_cap.append(piece(Color.WHITE))
+            else:
+                game.black_cap.append(piece(Color.BLACK))
+        
+        return game
+    
+    def nbytes(self) -> int:
+        """Approximate memory used by the node arrays."""
+        arrays = (self.parent, self.moves, self.undo, self.keys, self.plies, self.first_child, self.next_sibling,
+                  self.same_key)
+        return sum(a.itemsize * len(a) for a in arrays)
+    
+    def __len__(self) -> int:
+        return len(self.parent) # Number of nodes, including the root
+        
+
+class MoveRecord:
+    """Everything needed to take back a move made with Chess.make_move()."""
+    def __init__(self, game: 'Chess', frm: int, to: int, piece: Piece) -> None:
+        self.frm = frm # Start square index
+        self.to = to # End square index (rook square when castling)
+        self.piece = piece # Piece that moved
+        self.has_moved = piece.has_moved # `has_moved` before the move
+        
+        self.captured: Piece | None = None
+        self.cap_sq = to # Square of the captured piece (only differs for en passant)
+        self.promoted: Piece | None = None # Piece a pawn was promoted to
+        self.rook: Piece | None = None # Castling rook
+        self.rook_moved = False # Castling rook's `has_moved` before the move
+        
+        # Game state before the move
+        self.castling = game.castle_options()
+        self.en_pass = game.en_pass
+        self.en_pass_capture = game.en_pass_capture
+        self.half_move = game.half_move
+        self.full_move = game.full_move
+        self.zobrist = game._zobrist
+        
+    def encode(self) -> Move:
+        """Return the move as a 16 bit integer (see movegen.encode)."""
+        if self.rook:
+            return encode(self.frm, self.to, flags=CASTLING)
+        elif self.promoted:
+            return encode(self.frm, self.to, self.promoted.type)
+        elif self.cap_sq != self.to:
+            return encode(self.frm, self.to, flags=EN_PASSANT)
+        return encode(self.frm, self.to)
+    
+    def pack(self) -> int:
+        """Pack the game state before the move into 32 bits.
+        Bits 0-3 captured piece index + 1 (0 for none), bit 4 `has_moved`, bits 5-8 castling options (KQkq),
+        bits 9-15 en passant square (64 for none), bits 16-30 halfmove clock, bit 31 captured piece's `has_moved`.
+        """
+        captured = self.captured.index + 1 if self.captured else 0
+        captured_moved = bool(self.captured and self.captured.has_moved)
+        castling = sum(1 << i for i, option in enumerate("KQkq") if option in self.castling)
+        en_pass = self.en_pass.y*8 + self.en_pass.x if self.en_pass else 64
+        
+        return (captured | self.has_moved << 4 | castling << 5 | en_pass << 9 | min(self.half_move, 0x7FFF) << 16 |
+                captured_moved << 31)
+    
+    @staticmethod
+    def unpack(undo: int) -> tuple[int | None, bool, str, int | None, int, bool]:
+        """Unpack a word made by MoveRecord.pack().
+
+        Returns
+        -------
+        tuple[int | None, bool, str, int | None, int, bool]
+            Captured piece index, `has_moved`, castling options, en passant square, halfmove clock and the captured
+            piece's `has_moved`
+        """
+        captured = (undo & 15) - 1
+        castling = "".join(option for i, option in enumerate("KQkq") if undo >> 5 & (1 << i)) or "-"
+        en_pass = undo >> 9 & 127
+        
+        return (captured if captured >= 0 else None, bool(undo & 16), castling, en_pass if en_pass < 64 else None, 
+                undo >> 16 & 0x7FFF, bool(undo >> 31 & 1))
+    
+    @classmethod
+    def from_history(cls, game: 'Chess', move: Move, undo: int, zobrist: int) -> 'MoveRecord':
+        """Rebuild the record of the last move made in a game from its history entry.
+
+        Parameters
+        ----------
+        game : Chess
+            Game right after the move
+        move : Move
+            Encoded move
+        undo : int
+            Packed undo word (see MoveRecord.pack)
+        zobrist : int
+            Zobrist key before the move
+
+        Returns
+        -------
+        MoveRecord
+            Record for Chess.unmake_move()
+        """
+        record = cls.__new__(cls)
+        board = game.board
+        color = Color.BLACK if game.white_turn else Color.WHITE # Side that made the move
+        frm, to, flags = move & 63, move >> 6 & 63, move & FLAGS
+        captured, has_moved, castling, en_pass, half_move, captured_moved = cls.unpack(undo)
+        
+        record.frm, record.to = frm, to
+        record.has_moved = has_moved
+        record.promoted = record.rook = None
+        record.rook_moved = False # Castling rooks have never moved
+        
+        if flags == CASTLING:
+            record.piece = board.piece_at(frm + (2 if to > frm else -2))
+            record.rook = board.piece_at(frm + (1 if to > frm else -1))
+        elif flags == PROMOTION:
+            record.promoted = board.piece_at(to)
+            record.piece = Pawn(color)
+        else:
+            record.piece = board.piece_at(to)
+            
+        record.cap_sq = to - 8*color if flags == EN_PASSANT else to
+        record.captured = None
+        if captured != None:
+            piece = record.captured = PIECES[INDEX_TYPE[captured % BLACK_OFFSET]](-color)
+            piece.has_moved = captured_moved
+        
+        record.castling = castling
+        record.en_pass = PAIRS[en_pass] if en_pass != None else None
+        record.en_pass_capture = None
+        record.half_move = half_move
+        record.full_move = game.full_move - (1 if color == Color.BLACK else 0)
+        record.zobrist = zobrist
+        
+        return record
         
 
 class Chess:
     """Play a game of chess."""
 
-    def __init__(self, save_moves=True) -> None:
-        self.board = ChessBoard()
+    def __init__(self, save_moves=True, board_type: type[ChessBoard]=ChessBoard) -> None:
+        """Construct a new game in the default position.
+
+        Parameters
+        ----------
+        save_moves : bool, optional
+            Keep a history of game states, by default True
+        board_type : type[ChessBoard], optional
+            Board representation to use. `ChessBoard` or `BitBoard`, by default ChessBoard
+        """
+        self.board = board_type()
         self.white_cap: list[Piece] = list() # Captured white pieces
         self.black_cap: list[Piece] = list() # Captured black pieces
         self.en_pass: Pair = None # En passant square
@@ -841,18 +1389,22 @@ class Chess:
         self.all_legal_w: list[str] = list()
         self.all_legal_b: list[str] = list()
         
-        self.game_states = None
-        if save_moves:
-            self.game_states = GameStates(Chess(False))
-            
         self.en_pass_capture: Pair = Pair(None, None)
         
+        self._zobrist = self.compute_zobrist() # Position key, updated by every move
+        self._reset_eval()
+        
+        self.game_states: GameStates | None = None
+        if save_moves:
+            self.game_states = GameStates(self.get_FEN(), self._zobrist, board_type)
+        
     @classmethod
-    def bare(cls):
+    def bare(cls, board_type: type[ChessBoard]=ChessBoard):
         game = cls.__new__(cls)
         
-        game.board = ChessBoard()
+        game.board = board_type()
         game.en_pass = None
+        game.en_pass_capture = None
         game.game_states = None
         
         return game
@@ -889,15 +1441,7 @@ class Chess:
         bool
             True if in checkmate (i.e. the king is in a square attacked by other side and there are no legal moves)
         """
-        
-        if self.in_check(side):
-            
-            if side == Color.WHITE and len(self.all_legal_w) == 0:
-                return True
-            elif side == Color.BLACK and len(self.all_legal_b) == 0:
-                return True
-        else:
-            return False
+        return self.in_check(side) and not self.has_legal_move(side)
         
     def in_stalemate(self) -> bool:
         """Find if the game has ended in a stalemate
@@ -907,13 +1451,116 @@ class Chess:
         bool
             True if the game is in stalemate
         """
+        turn = Color.WHITE if self.white_turn else Color.BLACK
+        return not self.in_check(turn) and not self.has_legal_move(turn)
+    
+    def has_legal_move(self, side: Color | None=None) -> bool:
+        """Find if a side has any legal move. Much faster than generating them all (see movegen.has_legal_move).
+
+        Parameters
+        ----------
+        side : Color | None, optional
+            Color to check, by default the side to move
+
+        Returns
+        -------
+        bool
+            True if the side can move
+        """
+        turn = Color.WHITE if self.white_turn else Color.BLACK
+        if side == None:
+            side = turn
         
-        if self.white_turn and len(self.all_legal_w) == 0:
-            return True
-        elif not self.white_turn and len(self.all_legal_b) == 0:
-            return True
+        en_pass = None
+        if self.en_pass and side == turn: # Only the side to move can capture en passant
+            en_pass = self.en_pass.y*8 + self.en_pass.x
+            
+        return gen_has_legal_move(self.board.bitboards(), side, en_pass)
+    
+    def game_state(self) -> GameState:
+        """Find if the game is over and who won.
+
+        Returns
+        -------
+        GameState
+            RUNNING, WHITE_WIN, BLACK_WIN or DRAW (stalemate or the fifty move rule)
+        """
+        turn = Color.WHITE if self.white_turn else Color.BLACK
+        if not self.has_legal_move(turn):
+            if not self.in_check(turn):
+                return GameState.DRAW
+            return GameState.BLACK_WIN if turn == Color.WHITE else GameState.WHITE_WIN
         
-        return False
+        if self.half_move >= 100:
+            return GameState.DRAW
+        
+        return GameState.RUNNING
+    
+    def generate_legal(self, side: Color | None=None, moves: array | None=None, captures: bool=False) -> array:
+        """Generate every legal move for one side without making any of them.
+
+        Parameters
+        ----------
+        side : Color | None, optional
+            Color to generate moves for, by default the side to move
+        moves : array | None, optional
+            Buffer to fill and return (see movegen.move_buffer), by default a new one
+        captures : bool, optional
+            Only generate captures and promotions, by default False
+
+        Returns
+        -------
+        array
+            Encoded moves (see movegen.encode). Castling moves go to the rook's square
+        """
+        turn = Color.WHITE if self.white_turn else Color.BLACK
+        if side == None:
+            side = turn
+        
+        en_pass = None
+        if self.en_pass and side == turn: # Only the side to move can capture en passant
+            en_pass = self.en_pass.y*8 + self.en_pass.x
+            
+        return gen_legal_moves(self.board.bitboards(), side, en_pass, self.castle_options(), moves, captures)
+    
+    def static_exchange(self, move: Move) -> int:
+        """Find how much material a move wins once every capture on its square that pays off has been made,
+        without making any moves (see movegen.static_exchange).
+
+        Parameters
+        ----------
+        move : Move
+            Encoded move (see movegen.encode)
+
+        Returns
+        -------
+        int
+            Material won in centipawns, negative if the move loses material
+        """
+        return gen_static_exchange(self.board.bitboards(), move)
+    
+    def hanging_pieces(self, side: Color) -> list[Pair]:
+        """Find the pieces of one side that the other side can win material by capturing.
+
+        Parameters
+        ----------
+        side : Color
+            Color of the pieces
+
+        Returns
+        -------
+        list[Pair]
+            Positions of the hanging pieces
+        """
+        pieces = self.board.bitboards()
+        hanging: set[int] = set()
+        for move in self.generate_legal(-side, captures=True):
+            to = move >> 6 & 63
+            if to not in hanging and move & FLAGS != EN_PASSANT and self.board.piece_at(to) and \
+                    gen_static_exchange(pieces, move) > 0:
+                hanging.add(to)
+        
+        return [PAIRS[sq] for sq in sorted(hanging)]
     
     def legal_moves(self, pair: Pair) -> list[Pair]:
         """Find every legal move for the given piece.
@@ -932,129 +1579,13 @@ class Chess:
         legal: list[Pair] = list()
         
         if piece:
-            if piece.type == Type.ROOK:
-                legal = self.__rook_legal(pair)
-            elif piece.type == Type.BISHOP:
-                legal = self.__bishop_legal(pair)
-            elif piece.type == Type.QUEEN:
-                legal = self.__queen_legal(pair)
-            else:
-                for end in piece.get_all_ends(pair):
-                    if self.board.in_board(end):
-                        # TODO: Make this more efficient
-                        nxt, can = self.next_move(pair, end)
-                        if can and not nxt.in_check(piece.color):
-                            legal.append(end)
-
-                if piece.type == Type.KING:
-                    for corner in (Pair(0, 0), Pair(0,7), Pair(7, 0), Pair(7, 7)):
-                        # if self.get_piece(corner) and self.can_castle(pair, corner):
-                        #     legal.append(corner)
-                        nxt1, can1 = self.next_move(pair, corner)
-                        if can1 and not nxt1.in_check(piece.color):
-                            legal.append(corner)
-                            
-                    
-        # legal.sort(key = lambda l: (l.y, l.x))
-        
-        return legal
-    
-    def __rook_legal(self, pair: Pair):
-        piece = self.get_piece(pair)
-        legal: list[Pair] = list()
-        
-        left_safe = False
-        right_safe = False
-        up_safe = False
-        down_safe = False
-        
-        ends = piece.get_all_ends(pair)
-        remove = list()
-        for end in ends:
-            if self.board.in_board(end):
-                left = end.x == pair.x - 1
-                right = end.x == pair.x + 1
-                up = end.x == pair.y + 1
-                down = end.y == pair.y - 1
-                if left or right or up or down:
-                    nxt, can = self.next_move(pair, end)
-                    if can and not nxt.in_check(piece.color):
-                        legal.append(end)
-                        remove.append(end)
-
-                        # Don't change value if it's True
-                        left_safe = left or left_safe
-                        right_safe = right or right_safe
-                        up_safe = up or up_safe
-                        down_safe = down or down_safe
-            else:
-                remove.append(end)
-                    
-        for end in remove:
-            ends.remove(end)
-                    
-        for end in ends:
-            if self.board.in_board(end):
-                left = end.x < pair.x
-                right = end.x > pair.x
-                up = end.x > pair.y
-                down = end.y < pair.y
-                if left and left_safe or right and right_safe or up and up_safe or down and down_safe:
-                    if self.board.can_move(pair, end, self.en_pass)[0]:
-                        legal.append(end)
-                        
-        return legal
-    
-    def __bishop_legal(self, pair: Pair):
-        piece = self.get_piece(pair)
-        legal: list[Pair] = list()
+            start = pair.y*8 + pair.x
+            for move in self.generate_legal(piece.color):
+                if move & 63 == start and self._first_promotion(move): # One end square per promotion
+                    legal.append(PAIRS[move >> 6 & 63])
         
-        ul_safe = False # Up - left
-        ur_safe = False # Up - right
-        dl_safe = False # Down - left
-        dr_safe = False # Down - right
-        
-        ends = piece.get_all_ends(pair)
-        remove = list()
-        for end in ends:
-            if self.board.in_board(end):
-                ul = end.y == pair.y + 1 and end.x == pair.x - 1
-                ur = end.y == pair.y + 1 and end.x == pair.x + 1
-                dl = end.y == pair.y - 1 and end.x == pair.x - 1
-                dr = end.y == pair.y - 1 and end.x == pair.x + 1
-
-                if ul or ur or dl or dr:
-                    nxt, can = self.next_move(pair, end)
-                    if can and not nxt.in_check(piece.color):
-                        legal.append(end)
-                        remove.append(end)
-
-                        # Don't change value if it's True
-                        ul_safe = ul or ul_safe
-                        ur_safe = ur or ur_safe
-                        dl_safe = dl or dl_safe
-                        dr_safe = dr or dr_safe
-            else:
-                remove.append(end)
-                    
-        for end in remove:
-            ends.remove(end)
-                    
-        for end in ends:
-            if self.board.in_board(end):
-                ul = end.y > pair.y and end.x < pair.x - 1
-                ur = end.y > pair.y and end.x > pair.x + 1
-                dl = end.y < pair.y and end.x < pair.x - 1
-                dr = end.y < pair.y and end.x > pair.x + 1
-                if ul and ul_safe or ur and ur_safe or dl and dl_safe or dr and dr_safe:
-                    if self.board.can_move(pair, end, self.en_pass)[0]:
-                        legal.append(end)
-                        
         return legal
     
-    def __queen_legal(self, pair: Pair):
-        return self.__rook_legal(pair) + self.__bishop_legal(pair)
-    
     def all_legal_moves(self, side: Color) -> list[tuple[Pair, list[Pair]]]:
         """Find the legal moves for every piece on the board of a given color.
 
@@ -1068,18 +1599,38 @@ class Chess:
         list[tuple[Pair, list[Pair]]]
             A list of (Piece, Move(s)) tuples
         """
-        legal: list[tuple[Pair, Pair]] = list() # List of from-to
-        
-        for row in range(8):
-            for col in range(8):
-                p = Pair(row, col)
-                if self.get_piece(p) and self.get_piece(p).color == side:
-                    move = self.legal_moves(p)
-                    if move:
-                        legal.append((p, move))
+        ends: dict[int, list[Pair]] = dict() # From square -> end squares
+        
+        for move in self.generate_legal(side):
+            if self._first_promotion(move): # One end square per promotion
+                ends.setdefault(move & 63, list()).append(PAIRS[move >> 6 & 63])
                     
-        # return sorted(legal, key = lambda l: (l[0].y, l[0].x))
-        return legal
+        return [(PAIRS[frm], ends[frm]) for frm in sorted(ends)]
+    
+    @staticmethod
+    def _first_promotion(move: Move) -> bool:
+        """False for the under-promotions of a move, so each end square is only listed once."""
+        return move & FLAGS != PROMOTION or move >> 12 & 3 == PROMOTION_CODES[Type.QUEEN]
+    
+    def parse_uci(self, text: str) -> Move | None:
+        """Find the legal move written in UCI notation (e.g., `e2e4`, `e7e8q` or `e1g1`).
+
+        Parameters
+        ----------
+        text : str
+            Move string
+
+        Returns
+        -------
+        Move | None
+            Encoded move, or None if it isn't legal here
+        """
+        text = text.strip().lower()
+        for move in self.generate_legal():
+            if move_to_uci(move) == text:
+                return move
+            
+        return None
     
     def update_all_legal(self) -> None:
         """Update legal move lists
@@ -1087,10 +1638,10 @@ class Chess:
         self.all_legal_w = self.all_legal_moves(Color.WHITE)
         self.all_legal_b = self.all_legal_moves(Color.BLACK)
     
-    def move(self, frm: Pair, to: Pair) -> bool:
+    def move(self, frm: Pair, to: Pair, promotion: Type=Type.QUEEN) -> bool:
         """Move piece from a square to another if that move is valid. 
         NOTE: Automatically captures pieces.
-        NOTE: Does not check for check or checkmate
+        NOTE: Moves that leave the own king in check are rejected. Checkmate and stalemate are not detected here
 
         Parameters
         ----------
@@ -1098,96 +1649,325 @@ class Chess:
             Start position
         to : Pair
             End position
+        promotion : Type, optional
+            Piece a pawn becomes when it reaches the last rank, by default Type.QUEEN
 
         Returns
         -------
         bool
             True if movement was successful, False otherwise
         """
-        rtn = False
-        nxt, can = self.next_move(frm, to)
+        record = self.make_move(frm, to, promotion)
         
-        if can and not nxt.in_check(Color.WHITE if self.white_turn else Color.BLACK):
-            rtn, cap = self.__move(frm, to)
-            
-            if cap:
-                if cap.color == Color.WHITE:
-                    self.white_cap.append(cap)
-                else:
-                    self.black_cap.append(cap)
+        if not record:
+            return False
         
-        return rtn
+        if self.in_check(record.piece.color): # Can't leave the king in check
+            self.unmake_move(record)
+            return False
+        
+        cap = record.captured
+        if cap:
+            if cap.color == Color.WHITE:
+                self.white_cap.append(cap)
+            else:
+                self.black_cap.append(cap)
+                
+        if self.game_states != None:
+            self.game_states.add_state(self, record)
+        
+        return True
     
-    def __move(self, frm: Pair, to: Pair) -> tuple[bool, Piece | None]:
-        """Move piece from a square to another if that move is valid. 
-        NOTE: Internal function! Use Chess.move() instead
+    def take_back(self) -> bool:
+        """Take back the last move made with Chess.move(). It stays in the game tree (see Chess.go_to).
+
+        Returns
+        -------
+        bool
+            True if a move was taken back, False if there is no history
+        """
+        if self.game_states == None:
+            return False
+        
+        entry = self.game_states.remove_state()
+        if not entry:
+            return False
+        
+        record = MoveRecord.from_history(self, *entry)
+        self.unmake_move(record)
+        
+        cap = record.captured
+        if cap:
+            caps = self.white_cap if cap.color == Color.WHITE else self.black_cap
+            for i in range(len(caps) - 1, -1, -1):
+                if caps[i] == cap:
+                    caps.pop(i)
+                    break
+        
+        return True
+    
+    def go_to(self, node: int) -> None:
+        """Change the game to the position of any node in the game tree (see GameStates).
+        The position is rebuilt from the nearest keyframe, so this costs the same however far away the node is.
+
+        Parameters
+        ----------
+        node : int
+            Node id
+        """
+        states = self.game_states
+        position = states.get_state(node)
+        
+        self.game_states = None # Keep set_FEN from starting a new tree
+        self.set_FEN(position.get_FEN())
+        self.game_states = states
+        states.new_branch(node)
+        
+        self.white_cap = position.white_cap
+        self.black_cap = position.black_cap
+        self.en_pass_capture = None
+        
+    def seek(self, ply: int) -> None:
+        """Change the game to a ply of the current line (see GameStates.line)."""
+        self.go_to(self.game_states.line[min(max(ply, 0), len(self.game_states.line) - 1)])
+    
+    def make(self, move: Move) -> 'MoveRecord | None':
+        """Make an encoded move (see movegen.encode) in place. See Chess.make_move()"""
+        return self.make_move(PAIRS[move & 63], PAIRS[move >> 6 & 63], move_promotion(move) or Type.QUEEN)
+    
+    def make_move(self, frm: Pair, to: Pair, promotion: Type=Type.QUEEN) -> 'MoveRecord | None':
+        """Make a move in place if it is pseudo-legal and return what is needed to take it back.
+        NOTE: Does not check if the move leaves the king in check. See Chess.is_legal()
 
         Parameters
         ----------
         frm : Pair
             Start position
         to : Pair
-            End position
+            End position (the rook's square when castling)
+        promotion : Type, optional
+            Piece a pawn becomes when it reaches the last rank, by default Type.QUEEN
 
         Returns
         -------
-        bool
-            True if movement was successful, False otherwise
+        MoveRecord | None
+            Undo record for Chess.unmake_move(), or None if the move can't be made
         """
-        start = self.board.get_square(frm)
-        pwn = start.piece.type == Type.PAWN
-        cap = None
-        
-        
-        if (self.board.can_move(frm, to, self.en_pass)[0] 
-            and ((start.piece.color == Color.WHITE) == self.white_turn)
-            ):
-            cap = self.board.move(frm, to)
+        piece = self.get_piece(frm)
+        if not piece or (piece.color == Color.WHITE) != self.white_turn:
+            return None
+        
+        board = self.board
+        start = frm.y*8 + frm.x
+        end = to.y*8 + to.x
+        record = MoveRecord(self, start, end, piece)
+        
+        if board.can_move(frm, to, self.en_pass)[0]:
+            pwn = piece.type == Type.PAWN
+            cap = board.piece_at(end)
+            cap_sq = end
             
             # En passant
-            self.en_pass_capture = None
-            if self.en_pass and to == self.en_pass:
-                cap_pos = Pair(to.y + (-1 if self.white_turn else 1), to.x)
-                                
-                if self.get_piece(cap_pos).color != start.piece.color:
-                    cap = self.get_piece(cap_pos)
-                    self.en_pass_capture = cap_pos
-                    self.board.set_square(cap_pos, None)
+            if pwn and self.en_pass and to == self.en_pass:
+                cap_sq = end - 8*piece.color
+                cap = board.piece_at(cap_sq)
+                board.place(cap_sq, None)
                 
+            board.place(start, None)
+            placed = piece
+            if pwn and (to.y == 7 or to.y == 0): # Promotion
+                placed = record.promoted = PROMOTIONS[promotion](piece.color)
+                placed.has_moved = True
+            board.place(end, placed)
+            piece.has_moved = True
+            
+            record.captured = cap
+            record.cap_sq = cap_sq
+            self.en_pass_capture = Pair(cap_sq >> 3, cap_sq & 7) if cap_sq != end else None
+            
+            key = self._zobrist ^ PIECE_KEYS[piece.index][start]
+            key ^= PIECE_KEYS[placed.index][end]
+            if cap:
+                key ^= PIECE_KEYS[cap.index][cap_sq]
+            
             self.en_pass = None # En passant chance ends every turn
             if pwn and abs(frm.y - to.y) == 2:
-                sign = -((frm.y - to.y) // abs(frm.y - to.y))
-                self.en_pass = Pair(frm.y + sign, frm.x)
-            
+                self.en_pass = Pair((frm.y + to.y) // 2, frm.x)
+                key ^= EN_PASSANT_KEYS[frm.x]
+        
         # Check for castling conditions
-        elif (start.piece and self.get_piece(to)):
-                if self.can_castle(frm, to): # Castling worked
-                    self.castle(frm, to)
-                else:
-                    return False, None
+        elif self.get_piece(to) and self.can_castle(frm, to):
+            rook = board.piece_at(end)
+            record.rook_moved = rook.has_moved
+            record.rook = rook
+            
+            self.castle(frm, to)
+            self.en_pass = None
+            self.en_pass_capture = None
+            
+            king_to = start + (2 if start < end else -2)
+            rook_to = start + (1 if start < end else -1)
+            king_keys = PIECE_KEYS[piece_index(piece.color, Type.KING)]
+            rook_keys = PIECE_KEYS[piece_index(piece.color, Type.ROOK)]
+            key = self._zobrist ^ king_keys[start] ^ king_keys[king_to] ^ rook_keys[end] ^ rook_keys[rook_to]
         else: # Nothing works
-            return False, None
+            return None
+        
+        if record.en_pass:
+            key ^= EN_PASSANT_KEYS[record.en_pass.x]
+        castling = self.castle_options()
+        if castling != record.castling:
+            key ^= castling_key(record.castling) ^ castling_key(castling)
+        self._zobrist = key ^ BLACK_TO_MOVE
         
         # Increment move counters after successful move
         if not self.white_turn:
             self.full_move += 1
             
-        if not cap and not pwn:
+        if not record.captured and piece.type != Type.PAWN:
             self.half_move += 1
         else:
             self.half_move = 0
             
         self.white_turn = not self.white_turn
+        self._update_eval(record, 1)
+        
+        return record
+    
+    def unmake_move(self, record: 'MoveRecord') -> None:
+        """Take back a move made with Chess.make_move(). Moves must be taken back in reverse order.
+
+        Parameters
+        ----------
+        record : MoveRecord
+            Record returned by Chess.make_move()
+        """
+        board = self.board
+        piece = record.piece
+        
+        if record.rook: # Castling
+            start, end = record.frm, record.to
+            king_to = start + (2 if start < end else -2)
+            rook_to = start + (1 if start < end else -1)
+            
+            board.place(king_to, None)
+            board.place(rook_to, None)
+            board.place(end, record.rook)
+            record.rook.has_moved = record.rook_moved
+        else:
+            board.place(record.to, None)
+            if record.captured:
+                board.place(record.cap_sq, record.captured)
+        
+        board.place(record.frm, piece)
+        piece.has_moved = record.has_moved
+        
+        self.en_pass = record.en_pass
+        self.en_pass_capture = record.en_pass_capture
+        self.half_move = record.half_move
+        self.full_move = record.full_move
+        self._zobrist = record.zobrist
+        self.white_turn = not self.white_turn
+        self._update_eval(record, -1)
+        
+    def _update_eval(self, record: 'MoveRecord', sign: int) -> None:
+        """Update the incremental evaluation terms for a move made (sign 1) or taken back (sign -1)."""
+        piece = record.piece
+        start, end = record.frm, record.to
+        
+        if record.rook: # Castling
+            king, rook = piece.index, record.rook.index
+            king_to = start + (2 if start < end else -2)
+            rook_to = start + (1 if start < end else -1)
+            mg = MG_TABLE[king][king_to] - MG_TABLE[king][start] + MG_TABLE[rook][rook_to] - MG_TABLE[rook][end]
+            eg = EG_TABLE[king][king_to] - EG_TABLE[king][start] + EG_TABLE[rook][rook_to] - EG_TABLE[rook][end]
+            self._mg += sign * mg
+            self._eg += sign * eg
+            return
+        
+        frm = piece.index
+        to = record.promoted.index if record.promoted else frm
+        mg = MG_TABLE[to][end] - MG_TABLE[frm][start]
+        eg = EG_TABLE[to][end] - EG_TABLE[frm][start]
+        phase = PHASE[to] - PHASE[frm]
+        
+        pawn_key = self._pawn_key
+        if piece.type == Type.PAWN:
+            pawn_key ^= PIECE_KEYS[frm][start]
+            if not record.promoted:
+                pawn_key ^= PIECE_KEYS[frm][end]
+        
+        captured = record.captured
+        if captured:
+            index = captured.index
+            mg -= MG_TABLE[index][record.cap_sq]
+            eg -= EG_TABLE[index][record.cap_sq]
+            phase -= PHASE[index]
+            if captured.type == Type.PAWN:
+                pawn_key ^= PIECE_KEYS[index][record.cap_sq]
+        
+        self._mg += sign * mg
+        self._eg += sign * eg
+        self._phase += sign * phase
+        self._pawn_key = pawn_key
+        
+    def _reset_eval(self) -> None:
+        """Calculate the incremental evaluation terms from scratch (see evaluation.material_pst)."""
+        self._mg, self._eg, self._phase, self._pawn_key = material_pst(self.board.bitboards())
+        
+    def evaluate(self) -> int:
+        """Evaluate the position (see evaluation.evaluate).
+
+        Returns
+        -------
+        int
+            Score in centipawns from the side to move's point of view
+        """
+        return evaluate_position(self.board.bitboards(), self.white_turn, self._mg, self._eg, self._phase,
+                                 self._pawn_key)
         
-        self.board.update_attacked_squares()
-        if self.game_states:
-            self.game_states.add_state(self.generic_copy())
+    def is_legal(self, frm: Pair, to: Pair) -> bool:
+        """Find if a move can be made without leaving the king in check.
+
+        Parameters
+        ----------
+        frm : Pair
+            Start position
+        to : Pair
+            End position
+
+        Returns
+        -------
+        bool
+            True if the move is legal
+        """
+        record = self.make_move(frm, to)
+        if not record:
+            return False
+        
+        legal = not self.in_check(record.piece.color)
+        self.unmake_move(record)
         
-        return True, cap
+        return legal
     
     def next_move(self, frm: Pair, to: Pair) -> tuple['Chess', bool]:
+        """Make a move on a copy of the game.
+        NOTE: This copies the whole game. Use Chess.make_move() and Chess.unmake_move() when searching
+
+        Parameters
+        ----------
+        frm : Pair
+            Start position
+        to : Pair
+            End position
+
+        Returns
+        -------
+        tuple[Chess, bool]
+            The copy and whether or not the move was made
+        """
         new_chess = self.bare_copy()
-        rtn, _ = new_chess.__move(frm, to)
+        rtn = new_chess.make_move(frm, to) != None
         
         return new_chess, rtn
     
@@ -1260,21 +2040,22 @@ class Chess:
             String in the form `KQkq` or `-`
         """
         option_string = "" 
+        piece_at = self.board.piece_at
         
-        A1 = self.get_piece(Pair(0,0))
-        H1 = self.get_piece(Pair(0,7))
-        A8 = self.get_piece(Pair(7,0))
-        H8 = self.get_piece(Pair(7,7))
-        w_king = self.get_piece(Pair(0,4))
-        b_king = self.get_piece(Pair(7,4))
+        A1 = piece_at(0)
+        H1 = piece_at(7)
+        A8 = piece_at(56)
+        H8 = piece_at(63)
+        w_king = piece_at(4)
+        b_king = piece_at(60)
         
-        if w_king and not w_king.has_moved:
-            if A1 and not A1.has_moved:
-                option_string += "Q"
+        if w_king and not w_king.has_moved and w_king.type == Type.KING:
             if H1 and not H1.has_moved:
                 option_string += "K"
+            if A1 and not A1.has_moved:
+                option_string += "Q"
                 
-        if b_king and not b_king.has_moved:
+        if b_king and not b_king.has_moved and b_king.type == Type.KING:
             if H8 and not H8.has_moved:
                 option_string += "k"
             if A8 and not A8.has_moved:
@@ -1326,12 +2107,6 @@ class Chess:
         """
         # Function variables 
         castle_err = "Castle options do not match position."
-        A1 = self.get_piece(Pair(0,0))
-        H1 = self.get_piece(Pair(0,7))
-        A8 = self.get_piece(Pair(7,0))
-        H8 = self.get_piece(Pair(7,7))
-        w_king = self.get_piece(Pair(0,4))
-        b_king = self.get_piece(Pair(7,4))
         
         # Split the string into sections
         sects = FEN.split()
@@ -1344,6 +2119,14 @@ class Chess:
         # NOTE: No need to raise exception here, FEN_set_postion function will do it
         self.board.FEN_set_postion(sects[0])
         
+        # Castling pieces in the new position
+        A1 = self.get_piece(Pair(0,0))
+        H1 = self.get_piece(Pair(0,7))
+        A8 = self.get_piece(Pair(7,0))
+        H8 = self.get_piece(Pair(7,7))
+        w_king = self.get_piece(Pair(0,4))
+        b_king = self.get_piece(Pair(7,4))
+        
         # Set the current turn
         # NOTE: No exception here. This is a simple error we can deal with
         self.white_turn = True if sects[1].lower() == "w" else False
@@ -1406,8 +2189,32 @@ class Chess:
         
         self.full_move = int(sects[5]) 
         
+        self._zobrist = self.compute_zobrist()
+        self._reset_eval()
+        
+        if getattr(self, "game_states", None) != None: # A new position starts a new history
+            self.game_states = GameStates(self.get_FEN(), self._zobrist, type(self.board))
+        
+    @property
+    def zobrist(self) -> int:
+        """64 bit Zobrist key of the position. Covers pieces, side to move, castling and the en passant file."""
+        return self._zobrist
+    
+    def compute_zobrist(self) -> int:
+        """Calculate the Zobrist key of the position from scratch.
+
+        Returns
+        -------
+        int
+            64 bit key
+        """
+        en_pass = self.en_pass.y*8 + self.en_pass.x if self.en_pass else None
+        
+        return position_key(self.board.bitboards(), Color.WHITE if self.white_turn else Color.BLACK,
+                            self.castle_options(), en_pass)
+        
     def bare_copy(self) -> 'Chess':
-        new_chess = self.bare()
+        new_chess = self.bare(type(self.board))
         new_chess.set_FEN(self.get_FEN())
         new_chess.white_turn = self.white_turn
         # print(new_chess.board == self.board)
@@ -1415,7 +2222,7 @@ class Chess:
         return new_chess
         
     def generic_copy(self) -> 'Chess':
-        new_chess = Chess(False)
+        new_chess = Chess(False, type(self.board))
         new_chess.set_FEN(self.get_FEN())
         new_chess.white_turn = self.white_turn
         new_chess.white_cap = self.white_cap.copy()
@@ -1424,7 +2231,7 @@ class Chess:
         return new_chess
         
     def copy(self) -> 'Chess':
-        new_chess = Chess(True)
+        new_chess = Chess(True, type(self.board))
         new_chess.set_FEN(self.get_FEN())
         new_chess.white_turn = self.white_turn
         new_chess.white_cap = self.white_cap.copy()
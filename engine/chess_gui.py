@@ -3,8 +3,8 @@
 from time import perf_counter, sleep
 import threading
 
-from chess import Pair, Piece, ChessBoard, Chess
-from chess_enum import Type
+from chess import Pair, Piece, ChessBoard, BitBoard, Chess
+from chess_enum import Color, Type
 from uciEngine import Stockfish
 
 import pygame
@@ -29,6 +29,7 @@ SQR_WHITE = 0xf0d9b5
 SQR_BLACK = 0xb58863
 
 START_STATE = "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"
+BOARD_TYPE = BitBoard # Board representation (ChessBoard or BitBoard)
 
 """HELPER FUNCTIONS"""
 def average_rgb(c1: tuple[int, int, int], c2: tuple[int, int, int]) -> tuple[int, int, int]: 
@@ -168,7 +169,7 @@ class GameLoop:
         self.board = GBoard()
         self.BOARD_POS = (int(SCREEN_WIDTH * .05), int(SCREEN_HEIGHT * .05))
 
-        self.game = Chess(False)
+        self.game = Chess(False, BOARD_TYPE)
         self.raw_board = self.game.board.board
 
         # Pieces 
@@ -189,6 +190,18 @@ class GameLoop:
         
         self.possible_moves = pygame.sprite.LayeredUpdates(self.possible_move_list)
         
+        # Hanging piece hints (pieces of the side to move that can be captured for a material gain). Toggle with H
+        self.hanging_list: list[CircleMarker] = list()
+        for row in range(8):
+            for col in range(8):
+                mark = CircleMarker((self.board.square_len / 2) * 0.9, (225, 0, 0, 70))
+                mark.rect.center = self.board_to_main(self.board.get_center((col, row)))
+                self.hanging_list.append(mark)
+        
+        self.hanging = pygame.sprite.LayeredUpdates(self.hanging_list)
+        self.show_hanging = True
+        self.update_hanging_markers()
+        
         # Piece dragging
         self.dragged_piece: GPiece = GPiece(None, 0)
         self.dragged_last = (0, 0)
@@ -222,6 +235,8 @@ class GameLoop:
                     if event.key == K_x:
                         print(self.game.white_cap)
                         print(self.game.black_cap)
+                    elif event.key == K_h:
+                        self.show_hanging = not self.show_hanging
                         
                 # CLICK AND DRAG #
                 elif event.type == pygame.MOUSEBUTTONDOWN:
@@ -255,6 +270,10 @@ class GameLoop:
             self.screen.blit(self.board.surf, self.BOARD_POS)
             
             # Draw all sprites
+            if self.show_hanging:
+                for mark in self.hanging:
+                    if mark.visible:
+                        self.screen.blit(mark.surf, mark.rect)
             for piece in self.pieces:
                 self.screen.blit(piece.surf, piece.rect)
             for move in self.possible_moves:
@@ -289,6 +308,14 @@ class GameLoop:
         for mark in self.possible_moves:
             mark.visible = False
             
+    def update_hanging_markers(self):
+        for mark in self.hanging:
+            mark.visible = False
+            
+        side = Color.WHITE if self.game.white_turn else Color.BLACK
+        for pair in self.game.hanging_pieces(side):
+            self.hanging.get_sprites_at(self.board_to_main(self.board.get_center(pair_to_std(pair))))[0].visible = True
+            
     def draw_pieces(self):
         # Draw the initial pieces
         self.white_list.clear()
@@ -337,6 +364,7 @@ class GameLoop:
             if self.game.get_piece(to) == None:
                 self.draw_pieces()
                 
+            self.update_hanging_markers()
         else:
             self.reset_dragged()
             
@@ -384,6 +412,8 @@ class GameLoop:
             # Error or castling
             if self.game.get_piece(to) == None:
                 self.draw_pieces()
+                
+            self.update_hanging_markers()
         else:
             print(move)
         
@@ -406,7 +436,6 @@ class GameLoop:
         while True:
             if self.update:
                 copy = self.game.bare_copy()
-                copy.update_all_legal()
                 if copy.in_checkmate(1):
                     self.checkmate = 1
                 if copy.in_checkmate(-1):
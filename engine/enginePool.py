@@ -0,0 +1,307 @@
+# By Chris Parker
+# Pool of UCI engine processes for analysing many positions at once (game review, opening prep, puzzle checks).
+# Every engine gets the same options and a worker thread that takes jobs from one shared queue, so a job goes
+# to whichever engine is idle first. The engines search in their own processes, so the threads only wait on pipes.
+
+import argparse
+import threading
+from concurrent.futures import Future
+from os import PathLike
+from queue import Queue
+from time import perf_counter
+
+# Type hinting
+from typing import Any, Hashable, Iterable, List, Union
+
+# Engines
+from uciEngine import UCIEngine
+
+
+class AnalysisResult:
+    """Outcome of one analysis job."""
+    def __init__(self, fen: str, bestMove: Union[str, None], ponder: Union[str, None], lines: List[str],
+                 engine: int, seconds: float) -> None:
+        self.fen = fen
+        self.bestMove = bestMove # None if the engine didn't answer
+        self.ponder = ponder
+        self.lines = lines # Lines the engine sent during the search, see UCIEngine.wait_for()
+        self.engine = engine # Index of the engine that searched it
+        self.seconds = seconds
+
+    @property
+    def info(self) -> Union[str, None]:
+        """The last `info` line with a score, which has the final score and PV."""
+        for line in reversed(self.lines):
+            if line.startswith("info") and " score " in line:
+                return line.strip()
+        return None
+
+    def __str__(self) -> str:
+        return f"{self.fen}: bestmove {self.bestMove} ({self.seconds:.2f}s, engine {self.engine})"
+
+
+class _Job:
+    """Position to analyse and the future to put its result in."""
+    def __init__(self, fen: str, moves: Iterable[str], limits: dict, game: Union[Hashable, None],
+                 timeout: Union[float, None]) -> None:
+        self.fen = fen
+        self.moves = list(moves)
+        self.limits = limits
+        self.game = game
+        self.timeout = timeout
+        self.future: Future = Future()
+
+
+class EnginePool:
+    """Run analysis jobs on several engine processes. Close it (or use `with`) to stop the engines."""
+    def __init__(self, enginePath: Union[str, PathLike], size: int=2, *boolOpts: str,
+                 engineType: type=UCIEngine, **options: Union[str, int]) -> None:
+        """Start the engines.
+
+        Parameters
+        ----------
+        enginePath : str | PathLike
+            Path of the chess engine
+        size : int, optional
+            Number of engine processes, by default 2
+        *boolOpts : str
+            Boolean (on or off) options given to every engine.
+            Ex. `UCI_LimitStrength`
+        engineType : type, optional
+            UCIEngine class to start, by default UCIEngine
+        **options : str | int
+            Options given to every engine.
+            NOTE: `Threads` defaults to 1 so the engines don't compete for cores. `Hash` is per engine.
+
+        Raises
+        ------
+        InvalidEngineError
+            If the program given is not UCI compatible
+        """
+        options.setdefault("Threads", 1)
+        self.size = max(1, size)
+        self._path = enginePath
+        self._boolOpts = boolOpts
+        self._options = options
+        self._engineType = engineType
+
+        self.engines: List[UCIEngine] = []
+        try:
+            for _ in range(self.size):
+                self.engines.append(engineType(enginePath, *boolOpts, **options))
+        except Exception:
+            self._close_engines()
+            raise
+
+        # Statistics
+        self.started = perf_counter()
+        self.jobs = [0] * self.size # Jobs finished by each engine
+        self.busy = [0.0] * self.size # Seconds each engine spent on jobs
+        self.newGames = 0 # `ucinewgame` commands sent
+        self.restarts = 0 # Engines replaced after a failed job
+        self.alive = self.size # Workers still taking jobs
+
+        self._queue: Queue = Queue()
+        self._games: List[Union[Hashable, None]] = [None] * self.size # Game of each engine's last job
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._work, args=(i,), daemon=True) for i in range(self.size)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fen: str, moves: Iterable[str]=(), game: Union[Hashable, None]=None,
+               timeout: Union[float, None]=None, **limits: int) -> Future:
+        """Queue a position for analysis.
+
+        Parameters
+        ----------
+        fen : str
+            FEN string of the position, or `startpos`
+        moves : Iterable[str], optional
+            Moves played from the position, by default none
+        game : Hashable | None, optional
+            Jobs of the same game keep the hash table when they run on the same engine one after another.
+            Any other job starts with `ucinewgame`. By default None (always a new game)
+        timeout : float | None, optional
+            Seconds before the search is stopped, by default None
+        **limits : int
+            Arguments of `go`.
+            Ex. `depth=20`, `movetime=1000`
+
+        Returns
+        -------
+        Future
+            Resolves to an AnalysisResult, or the exception the engine raised
+        """
+        if not limits:
+            raise ValueError("A search limit is needed, ex. depth=20")
+        job = _Job(fen, moves, limits, game, timeout)
+        with self._lock: # The last worker leaving service drains the queue under the lock
+            if self.alive == 0:
+                raise RuntimeError("No engine in the pool could be restarted.")
+            self._queue.put(job)
+        return job.future
+
+    def analyse(self, fens: Iterable[str], **limits: int) -> List[AnalysisResult]:
+        """Analyse positions as unrelated jobs and wait for all of them. Results are in the order of `fens`."""
+        futures = [self.submit(fen, **limits) for fen in fens]
+        return [future.result() for future in futures]
+
+    def stats(self) -> dict[str, Any]:
+        """Return jobs finished, jobs waiting, `ucinewgame` count and utilization (busy time / time open of every
+        engine)."""
+        elapsed = perf_counter() - self.started
+        with self._lock:
+            busy = list(self.busy)
+            jobs = list(self.jobs)
+
+        return {"jobs": sum(jobs), "pending": self._queue.qsize(), "newgames": self.newGames,
+                "restarts": self.restarts, "alive": self.alive,
+                "utilization": sum(busy) / (elapsed * self.size) if elapsed > 0 else 0.0,
+                "engines": [{"jobs": jobs[i], "busy": busy[i]} for i in range(self.size)]}
+
+    def _work(self, index: int) -> None:
+        """Worker thread of an engine. Runs jobs until it gets None, or its engine fails and can't be restarted."""
+        while True:
+            job = self._queue.get()
+            if job == None:
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            start = perf_counter()
+            failed = False
+            try:
+                result = self._run(index, self.engines[index], job)
+            except Exception as e:
+                job.future.set_exception(e)
+                failed = True
+            else:
+                job.future.set_result(result)
+
+            with self._lock:
+                self.busy[index] += perf_counter() - start
+                self.jobs[index] += 1
+
+            if failed and not self._restart(index):
+                break
+
+        # Out of service. If it was the last worker, nothing will run the queued jobs
+        orphans = []
+        with self._lock:
+            self.alive -= 1
+            if self.alive == 0: # submit() can't queue more once this is seen
+                while not self._queue.empty():
+                    orphans.append(self._queue.get())
+
+        for job in orphans:
+            if job != None and job.future.set_running_or_notify_cancel():
+                job.future.set_exception(RuntimeError("No engine in the pool could be restarted."))
+
+    def _restart(self, index: int) -> bool:
+        """Replace an engine after a failed job, as it may have died or be stuck in a search.
+
+        Returns
+        -------
+        bool
+            False if a new engine couldn't be started
+        """
+        self._games[index] = None
+        self._stop_engine(self.engines[index])
+        try:
+            self.engines[index] = self._engineType(self._path, *self._boolOpts, **self._options)
+        except Exception:
+            return False
+
+        with self._lock:
+            self.restarts += 1
+        return True
+
+    def _run(self, index: int, engine: UCIEngine, job: _Job) -> AnalysisResult:
+        """Search a job's position with an engine."""
+        start = perf_counter()
+
+        # Hash hygiene: results from another game mustn't leak into this one
+        if job.game == None or job.game != self._games[index]:
+            engine.send_command("ucinewgame")
+            with self._lock:
+                self.newGames += 1
+        self._games[index] = job.game
+
+        if not engine.is_ready():
+            raise TimeoutError(f"Engine {index} did not answer `isready`.")
+
+        command = "position startpos" if job.fen == "startpos" else f"position fen {job.fen}"
+        if job.moves:
+            command += " moves " + engine.move_seq_to_string(job.moves)
+        engine.send_command(command)
+
+        engine.go(**job.limits)
+        lines = engine.wait_for("bestmove", job.timeout)
+        if lines == None: # Out of time, take the move it has
+            engine.stop()
+            lines = engine.wait_for("bestmove", engine.READY_TIMEOUT)
+            if lines == None:
+                raise TimeoutError(f"Engine {index} did not stop.")
+
+        words = lines[-1].split()
+        bestMove = words[1] if len(words) > 1 and words[1] != "(none)" else None
+        ponder = words[3] if len(words) > 3 and words[2] == "ponder" else None
+
+        return AnalysisResult(job.fen, bestMove, ponder, lines, index, perf_counter() - start)
+
+    @staticmethod
+    def _stop_engine(engine: UCIEngine) -> None:
+        """Close an engine, killing its process if it can't be closed and is still running."""
+        try:
+            engine.close()
+        except (BrokenPipeError, OSError, ValueError): # Pipe closed or process gone
+            try:
+                if engine.eng.poll() == None:
+                    engine.eng.kill()
+            except OSError:
+                pass
+
+    def _close_engines(self) -> None:
+        for engine in self.engines:
+            self._stop_engine(engine)
+        self.engines = []
+
+    def close(self) -> None:
+        """Finish the queued jobs and stop the engines."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+        self._close_engines()
+
+    def __enter__(self) -> 'EnginePool':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse positions with a pool of UCI engines.")
+    parser.add_argument("engine", help="Path of the engine")
+    parser.add_argument("fens", nargs="*", help="FEN strings to analyse (default: the start position)")
+    parser.add_argument("-j", "--engines", type=int, default=2, help="Number of engines (default: 2)")
+    parser.add_argument("-d", "--depth", type=int, default=12, help="Depth to search (default: 12)")
+    parser.add_argument("--hash", type=int, default=16, help="Hash size of each engine in MB (default: 16)")
+    args = parser.parse_args()
+
+    with EnginePool(args.engine, args.engines, Hash=args.hash) as pool:
+        for result in pool.analyse(args.fens or ["startpos"], depth=args.depth):
+            print(result)
+            print(" ", result.info)
+
+        stats = pool.stats()
+        print(f"{stats['jobs']} jobs, utilization {stats['utilization']:.0%}")
+
+
+
+if __name__ == "__main__":
+    main()
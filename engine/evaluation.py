@@ -0,0 +1,376 @@
+# By Chris Parker
+# Static evaluation. Every term has a middlegame and an endgame value, and the two are blended by the game phase
+# (how much non-pawn material is left), so e.g. the king hides early and walks to the center late.
+#
+# Material and piece-square values only change with the pieces a move touches, so Chess keeps their sums up to
+# date in make_move()/unmake_move() (see MG_TABLE and EG_TABLE). Pawn structure only changes with pawn moves, so
+# it is cached by a key of the pawns alone. Mobility and king safety are worked out from the bitboards each time.
+#
+# Reference
+# ---------
+# https://www.chessprogramming.org/Tapered_Eval
+# https://www.chessprogramming.org/PeSTO%27s_Evaluation_Function (material and piece-square values)
+# https://www.chessprogramming.org/Pawn_Hash_Table
+
+# Chess Imports
+from chess_enum import Color
+from bitboard import (bishop_attacks_from, popcount, rook_attacks_from, squares, BLACK_OFFSET, FILE_A, FULL, KING_ATTACKS,
+                      KNIGHT_ATTACKS, PAWN_ATTACKS, BISHOP, KING, KNIGHT, PAWN, QUEEN, ROOK)
+from zobrist import PIECE_KEYS
+
+# MATERIAL AND PIECE-SQUARE TABLES
+# Pawn, knight, bishop, rook, queen, king
+MG_VALUES = (82, 337, 365, 477, 1025, 0)
+EG_VALUES = (94, 281, 297, 512, 936, 0)
+
+# Written from white's side with A8 first, the way a board is printed
+MG_PST = (
+    (   0,   0,   0,   0,   0,   0,   0,   0,
+       98, 134,  61,  95,  68, 126,  34, -11,
+       -6,   7,  26,  31,  65,  56,  25, -20,
+      -14,  13,   6,  21,  23,  12,  17, -23,
+      -27,  -2,  -5,  12,  17,   6,  10, -25,
+      -26,  -4,  -4, -10,   3,   3,  33, -12,
+      -35,  -1, -20, -23, -15,  24,  38, -22,
+        0,   0,   0,   0,   0,   0,   0,   0),
+    (-167, -89, -34, -49,  61, -97, -15,-107,
+      -73, -41,  72,  36,  23,  62,   7, -17,
+      -47,  60,  37,  65,  84, 129,  73,  44,
+       -9,  17,  19,  53,  37,  69,  18,  22,
+      -13,   4,  16,  13,  28,  19,  21,  -8,
+      -23,  -9,  12,  10,  19,  17,  25, -16,
+      -29, -53, -12,  -3,  -1,  18, -14, -19,
+     -105, -21, -58, -33, -17, -28, -19, -23),
+    ( -29,   4, -82, -37, -25, -42,   7,  -8,
+      -26,  16, -18, -13,  30,  59,  18, -47,
+      -16,  37,  43,  40,  35,  50,  37,  -2,
+       -4,   5,  19,  50,  37,  37,   7,  -2,
+       -6,  13,  13,  26,  34,  12,  10,   4,
+        0,  15,  15,  15,  14,  27,  18,  10,
+        4,  15,  16,   0,   7,  21,  33,   1,
+      -33,  -3, -14, -21, -13, -12, -39, -21),
+    (  32,  42,  32,  51,  63,   9,  31,  43,
+       27,  32,  58,  62,  80,  67,  26,  44,
+       -5,  19,  26,  36,  17,  45,  61,  16,
+      -24, -11,   7,  26,  24,  35,  -8, -20,
+      -36, -26, -12,  -1,   9,  -7,   6, -23,
+      -45, -25, -16, -17,   3,   0,  -5, -33,
+      -44, -16, -20,  -9,  -1,  11,  -6, -71,
+      -19, -13,   1,  17,  16,   7, -37, -26),
+    ( -28,   0,  29,  12,  59,  44,  43,  45,
+      -24, -39,  -5,   1, -16,  57,  28,  54,
+      -13, -17,   7,   8,  29,  56,  47,  57,
+      -27, -27, -16, -16,  -1,  17,  -2,   1,
+       -9, -26,  -9, -10,  -2,  -4,   3,  -3,
+      -14,   2, -11,  -2,  -5,   2,  14,   5,
+      -35,  -8,  11,   2,   8,  15,  -3,   1,
+       -1, -18,  -9,  10, -15, -25, -31, -50),
+    ( -65,  23,  16, -15, -56, -34,   2,  13,
+       29,  -1, -20,  -7,  -8,  -4, -38, -29,
+       -9,  24,   2, -16, -20,   6,  22, -22,
+      -17, -20, -12, -27, -30, -25, -14, -36,
+      -49,  -1, -27, -39, -46, -44, -33, -51,
+      -14, -14, -22, -46, -44, -30, -15, -27,
+        1,   7,  -8, -64, -43, -16,   9,   8,
+      -15,  36,  12, -54,   8, -28,  24,  14),
+)
+
+EG_PST = (
+    (   0,   0,   0,   0,   0,   0,   0,   0,
+      178, 173, 158, 134, 147, 132, 165, 187,
+       94, 100,  85,  67,  56,  53,  82,  84,
+       32,  24,  13,   5,  -2,   4,  17,  17,
+       13,   9,  -3,  -7,  -7,  -8,   3,  -1,
+        4,   7,  -6,   1,   0,  -5,  -1,  -8,
+       13,   8,   8,  10,  13,   0,   2,  -7,
+        0,   0,   0,   0,   0,   0,   0,   0),
+    ( -58, -38, -13, -28, -31, -27, -63, -99,
+      -25,  -8, -25,  -2,  -9, -25, -24, -52,
+      -24, -20,  10,   9,  -1,  -9, -19, -41,
+      -17,   3,  22,  22,  22,  11,   8, -18,
+      -18,  -6,  16,  25,  16,  17,   4, -18,
+      -23,  -3,  -1,  15,  10,  -3, -20, -22,
+      -42, -20, -10,  -5,  -2, -20, -23, -44,
+      -29, -51, -23, -15, -22, -18, -50, -64),
+    ( -14, -21, -11,  -8,  -7,  -9, -17, -24,
+       -8,  -4,   7, -12,  -3, -13,  -4, -14,
+        2,  -8,   0,  -1,  -2,   6,   0,   4,
+       -3,   9,  12,   9,  14,  10,   3,   2,
+       -6,   3,  13,  19,   7,  10,  -3,  -9,
+      -12,  -3,   8,  10,  13,   3,  -7, -15,
+      -14, -18,  -7,  -1,   4,  -9, -15, -27,
+      -23,  -9, -23,  -5,  -9, -16,  -5, -17),
+    (  13,  10,  18,  15,  12,  12,   8,   5,
+       11,  13,  13,  11,  -3,   3,   8,   3,
+        7,   7,   7,   5,   4,  -3,  -5,  -3,
+        4,   3,  13,   1,   2,   1,  -1,   2,
+        3,   5,   8,   4,  -5,  -6,  -8, -11,
+       -4,   0,  -5,  -1,  -7, -12,  -8, -16,
+       -6,  -6,   0,   2,  -9,  -9, -11,  -3,
+       -9,   2,   3,  -1,  -5, -13,   4, -20),
+    (  -9,  22,  22,  27,  27,  19,  10,  20,
+      -17,  20,  32,  41,  58,  25,  30,   0,
+      -20,   6,   9,  49,  47,  35,  19,   9,
+        3,  22,  24,  45,  57,  40,  57,  36,
+      -18,  28,  19,  47,  31,  34,  39,  23,
+      -16, -27,  15,   6,   9,  17,  10,   5,
+      -22, -23, -30, -16, -16, -23, -36, -32,
+      -33, -28, -22, -43,  -5, -32, -20, -41),
+    ( -74, -35, -18, -18, -11,  15,   4, -17,
+      -12,  17,  14,  17,  17,  38,  23,  11,
+       10,  17,  23,  15,  20,  45,  44,  13,
+       -8,  22,  24,  27,  26,  33,  26,   3,
+      -18,  -4,  21,  24,  27,  23,   9, -11,
+      -19,  -3,  11,  21,  23,  16,   7,  -9,
+      -27, -11,   4,  13,  14,   4,  -5, -17,
+      -53, -34, -21, -11, -28, -14, -24, -43),
+)
+
+
+def _side_tables(values: tuple[int, ...], pst: tuple[tuple[int, ...], ...]) -> tuple[tuple[int, ...], ...]:
+    """Material plus piece-square value by piece index and square index, positive for white and negative for black."""
+    white = tuple(tuple(values[i] + pst[i][sq ^ 56] for sq in range(64)) for i in range(6))
+    black = tuple(tuple(-values[i] - pst[i][sq] for sq in range(64)) for i in range(6)) # Mirrored ranks
+    return white + black
+
+MG_TABLE = _side_tables(MG_VALUES, MG_PST) # [piece index][square]
+EG_TABLE = _side_tables(EG_VALUES, EG_PST)
+
+# GAME PHASE
+# How much each piece counts towards the middlegame. All the starting pieces add up to MAX_PHASE
+PHASE = (0, 1, 1, 2, 4, 0) * 2 # By piece index
+MAX_PHASE = 24
+
+# PAWN STRUCTURE
+DOUBLED = (-10, -20) # Middlegame and endgame, per extra pawn on a file
+ISOLATED = (-5, -15)
+PASSED_MG = (0, 5, 10, 15, 25, 40, 60, 0) # By rank from the pawn's side
+PASSED_EG = (0, 10, 20, 35, 60, 100, 150, 0)
+
+FILES = tuple(FILE_A << x for x in range(8))
+ADJACENT_FILES = tuple((FILES[x - 1] if x > 0 else 0) | (FILES[x + 1] if x < 7 else 0) for x in range(8))
+
+
+def _passed_mask(sq: int, color: Color) -> int:
+    """Squares in front of a pawn, on its file and the files next to it."""
+    y, x = sq >> 3, sq & 7
+    files = FILES[x] | ADJACENT_FILES[x]
+    if color == Color.WHITE:
+        return files & (FULL << (y + 1) * 8) & FULL
+    return files & ((1 << y * 8) - 1)
+
+PASSED_MASKS = {color: tuple(_passed_mask(sq, color) for sq in range(64)) for color in Color}
+
+# MOBILITY
+# Per square a piece attacks that isn't its own or defended by an enemy pawn. Pawn, knight, bishop, rook, queen
+MOBILITY_MG = (0, 4, 5, 2, 1)
+MOBILITY_EG = (0, 4, 5, 4, 2)
+
+# KING SAFETY (middlegame only)
+SHIELD_BONUS = 10 # Per pawn in front of the king
+ATTACK_UNITS = (0, 2, 2, 3, 5) # Per piece attacking the squares around the enemy king
+MAX_DANGER = 500
+
+
+def _shield_mask(sq: int, color: Color) -> int:
+    """The two ranks in front of a king, on its file and the files next to it."""
+    y, x = sq >> 3, sq & 7
+    files = FILES[x] | ADJACENT_FILES[x]
+    ranks = 0
+    for r in (y + color, y + 2*color):
+        if 0 <= r < 8:
+            ranks |= 0xFF << r * 8
+    return files & ranks
+
+SHIELD_MASKS = {color: tuple(_shield_mask(sq, color) for sq in range(64)) for color in Color}
+KING_ZONES = tuple(KING_ATTACKS[sq] | 1 << sq for sq in range(64))
+
+
+def material_pst(pieces: list[int]) -> tuple[int, int, int, int]:
+    """Calculate the incrementally updated parts of the evaluation from scratch.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards (see bitboard.piece_index)
+
+    Returns
+    -------
+    tuple[int, int, int, int]
+        Middlegame and endgame material plus piece-square sums (white's point of view), game phase and pawn key
+    """
+    mg = eg = phase = pawn_key = 0
+    for index, bb in enumerate(pieces):
+        for sq in squares(bb):
+            mg += MG_TABLE[index][sq]
+            eg += EG_TABLE[index][sq]
+            phase += PHASE[index]
+            if index % BLACK_OFFSET == PAWN:
+                pawn_key ^= PIECE_KEYS[index][sq]
+
+    return mg, eg, phase, pawn_key
+
+
+class PawnCache:
+    """Fixed size cache of pawn structure scores keyed by a pawn-only Zobrist key."""
+    def __init__(self, size: int=1 << 14) -> None:
+        """Construct a new, empty cache.
+
+        Parameters
+        ----------
+        size : int, optional
+            Number of entries, a power of two, by default 1 << 14
+        """
+        self._entries: list[tuple[int, int, int] | None] = [None] * size # (key, middlegame, endgame)
+        self._mask = size - 1
+
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, key: int, white_pawns: int, black_pawns: int) -> tuple[int, int]:
+        """Return the middlegame and endgame pawn structure scores, working them out if they aren't cached."""
+        i = key & self._mask
+        entry = self._entries[i]
+        if entry != None and entry[0] == key:
+            self.hits += 1
+            return entry[1], entry[2]
+
+        self.misses += 1
+        mg, eg = pawn_structure(white_pawns, black_pawns)
+        self._entries[i] = (key, mg, eg)
+        return mg, eg
+
+    def clear(self) -> None:
+        """Remove every entry and reset the statistics."""
+        self._entries = [None] * len(self._entries)
+        self.hits = self.misses = 0
+
+PAWN_CACHE = PawnCache()
+
+
+def pawn_structure(white_pawns: int, black_pawns: int) -> tuple[int, int]:
+    """Score doubled, isolated and passed pawns.
+
+    Parameters
+    ----------
+    white_pawns : int
+        White pawn bitboard
+    black_pawns : int
+        Black pawn bitboard
+
+    Returns
+    -------
+    tuple[int, int]
+        Middlegame and endgame scores from white's point of view
+    """
+    mg = eg = 0
+    for color, own, enemy in ((Color.WHITE, white_pawns, black_pawns), (Color.BLACK, black_pawns, white_pawns)):
+        side_mg = side_eg = 0
+        passed = PASSED_MASKS[color]
+        for x in range(8):
+            count = popcount(own & FILES[x])
+            if count > 1:
+                side_mg += DOUBLED[0] * (count - 1)
+                side_eg += DOUBLED[1] * (count - 1)
+
+        for sq in squares(own):
+            if not own & ADJACENT_FILES[sq & 7]:
+                side_mg += ISOLATED[0]
+                side_eg += ISOLATED[1]
+            if not enemy & passed[sq]:
+                rank = sq >> 3 if color == Color.WHITE else 7 - (sq >> 3)
+                side_mg += PASSED_MG[rank]
+                side_eg += PASSED_EG[rank]
+
+        mg += color * side_mg
+        eg += color * side_eg
+
+    return mg, eg
+
+
+def _mobility_king(pieces: list[int]) -> tuple[int, int]:
+    """Score mobility and king safety. Returns the middlegame and endgame scores from white's point of view."""
+    white = pieces[0] | pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5]
+    black = pieces[6] | pieces[7] | pieces[8] | pieces[9] | pieces[10] | pieces[11]
+    occupied = white | black
+
+    mg = eg = 0
+    for color, offset, own, enemy_offset in ((Color.WHITE, 0, white, BLACK_OFFSET), (Color.BLACK, BLACK_OFFSET, black, 0)):
+        enemy_pawns = pieces[enemy_offset + PAWN]
+        pawn_attacks = PAWN_ATTACKS[-color]
+        covered = 0 # Squares defended by enemy pawns
+        for sq in squares(enemy_pawns):
+            covered |= pawn_attacks[sq]
+        free = ~(own | covered)
+
+        enemy_king = pieces[enemy_offset + KING]
+        zone = KING_ZONES[(enemy_king & -enemy_king).bit_length() - 1] if enemy_king else 0
+        units = attackers = 0
+
+        side_mg = side_eg = 0
+        for index in (KNIGHT, BISHOP, ROOK, QUEEN):
+            for sq in squares(pieces[offset + index]):
+                if index == KNIGHT:
+                    attacks = KNIGHT_ATTACKS[sq]
+                elif index == BISHOP:
+                    attacks = bishop_attacks_from(sq, occupied)
+                elif index == ROOK:
+                    attacks = rook_attacks_from(sq, occupied)
+                else:
+                    attacks = bishop_attacks_from(sq, occupied) | rook_attacks_from(sq, occupied)
+
+                count = popcount(attacks & free)
+                side_mg += MOBILITY_MG[index] * count
+                side_eg += MOBILITY_EG[index] * count
+                if attacks & zone:
+                    units += ATTACK_UNITS[index]
+                    attackers += 1
+
+        # Pawns in front of the own king, and pressure on the enemy king
+        king = pieces[offset + KING]
+        if king:
+            side_mg += SHIELD_BONUS * popcount(pieces[offset + PAWN] & SHIELD_MASKS[color][(king & -king).bit_length() - 1])
+        if attackers >= 2:
+            side_mg += min(units * units * 2, MAX_DANGER)
+
+        mg += color * side_mg
+        eg += color * side_eg
+
+    return mg, eg
+
+
+def evaluate(pieces: list[int], white_turn: bool, mg: int, eg: int, phase: int, pawn_key: int,
+             cache: PawnCache=PAWN_CACHE) -> int:
+    """Evaluate a position.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards (see bitboard.piece_index)
+    white_turn : bool
+        Is it white's turn
+    mg : int
+        Middlegame material plus piece-square sum (see material_pst)
+    eg : int
+        Endgame material plus piece-square sum
+    phase : int
+        Game phase (see PHASE)
+    pawn_key : int
+        Zobrist key of the pawns alone
+    cache : PawnCache, optional
+        Pawn structure cache, by default PAWN_CACHE
+
+    Returns
+    -------
+    int
+        Score in centipawns from the side to move's point of view
+    """
+    pawn_mg, pawn_eg = cache.probe(pawn_key, pieces[PAWN], pieces[BLACK_OFFSET + PAWN])
+    extra_mg, extra_eg = _mobility_king(pieces)
+    mg += pawn_mg + extra_mg
+    eg += pawn_eg + extra_eg
+
+    phase = min(phase, MAX_PHASE) # Early promotions can push it over
+    score = int((mg * phase + eg * (MAX_PHASE - phase)) / MAX_PHASE) # Rounded toward zero so colors are symmetric
+
+    return score if white_turn else -score
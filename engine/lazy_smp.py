@@ -0,0 +1,271 @@
+# By Chris Parker
+# Parallel search with Lazy SMP. Python can only run one searcher per process, so helper processes search the
+# same root position as the main searcher, and they all share one transposition table in shared memory. Helpers
+# start at staggered depths so their results fill the table ahead of the main search, which then cuts off or
+# orders its moves with them. The best move comes from whichever process finished the deepest iteration.
+#
+# Reference
+# ---------
+# https://www.chessprogramming.org/Lazy_SMP
+
+import argparse
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from queue import Empty
+from time import perf_counter
+from typing import Callable
+
+# Chess Imports
+from chess import Chess
+from movegen import move_to_uci, Move, NULL_MOVE
+from search import BENCH_FENS, BOARD_TYPES, SearchInfo, SearchLimits, Searcher
+from transposition import table_bytes, TranspositionTable
+
+
+class _HelperSearcher(Searcher):
+    """Searcher that stops when the main process says so and publishes its node count."""
+    CHECK_EVERY = 256 # Stop quickly once the main search is done
+
+    def __init__(self, game: Chess, tt: TranspositionTable, index: int, stop, nodes) -> None:
+        super().__init__(game, self._record, tt)
+        self.index = index
+        self.stop_event = stop
+        self.shared_nodes = nodes
+        self.finished: tuple[int, Move, int] = (0, NULL_MOVE, 0) # Deepest finished iteration, its move and score
+
+    def _record(self, info: SearchInfo) -> None:
+        self.finished = (info.depth, info.pv[0] if info.pv else NULL_MOVE, info.score)
+
+    def _check_limits(self) -> None:
+        self.shared_nodes[self.index] = self.nodes
+        if self.stop_event.is_set():
+            self.stopped = True
+        else:
+            super()._check_limits()
+
+
+class _MainSearcher(Searcher):
+    """Searcher whose node limit counts the nodes of the helpers too."""
+    def __init__(self, game: Chess, tt: TranspositionTable, nodes) -> None:
+        super().__init__(game, None, tt)
+        self.helper_nodes = nodes
+
+    def total_nodes(self) -> int:
+        return self.nodes + sum(self.helper_nodes)
+
+    def _check_limits(self) -> None:
+        if self.limits.nodes != None and self.total_nodes() >= self.limits.nodes:
+            self.stopped = True
+        else:
+            super()._check_limits()
+
+
+def _helper_main(index: int, shm_name: str, mb: float, board: str, jobs, results, stop, nodes) -> None:
+    """Run a helper process. Searches every job from `jobs` until it gets None."""
+    shm = shared_memory.SharedMemory(shm_name)
+    tt = TranspositionTable(mb, shm.buf)
+    game = Chess(False, BOARD_TYPES[board])
+    searcher = _HelperSearcher(game, tt, index, stop, nodes)
+
+    while True:
+        job = jobs.get()
+        if job == None:
+            break
+
+        search_id, fen, history, limits, start_depth, age = job
+        game.set_FEN(fen)
+        tt.age = age # Same as the main process, so entries of this search aren't stored as old ones
+        searcher.history = history
+        searcher.finished = (0, NULL_MOVE, 0)
+        searcher.search(limits, start_depth)
+
+        nodes[index] = searcher.nodes
+        results.put((search_id, index, searcher.finished))
+
+    tt.release()
+    shm.close()
+
+
+class LazySMP:
+    """Search with helper processes sharing a transposition table. Close it (or use `with`) to end the helpers."""
+    STOP_TIMEOUT = 5.0 # Seconds to wait for the helpers' results after the main search ends
+    POLL_INTERVAL = 0.1 # Seconds between checks that the helpers are still running
+    def __init__(self, threads: int | None=None, mb: float=16, board: str="bitboard") -> None:
+        """Start the helper processes.
+
+        Parameters
+        ----------
+        threads : int | None, optional
+            Number of searching processes, the main one included. By default one per CPU
+        mb : float, optional
+            Shared transposition table size in MB, by default 16
+        board : str, optional
+            Board representation, "bitboard" or "mailbox", by default "bitboard"
+        """
+        self.threads = max(1, threads or mp.cpu_count())
+        self.mb = mb
+        self.board = board
+
+        self._shm = shared_memory.SharedMemory(create=True, size=table_bytes(mb))
+        self.tt = TranspositionTable(mb, self._shm.buf)
+        self.tt.clear() # New shared memory isn't guaranteed to be zeroed on every platform
+
+        helpers = self.threads - 1
+        self._stop = mp.Event()
+        self._nodes = mp.Array('q', helpers, lock=False) # Nodes searched by each helper
+        self._results = mp.Queue()
+        self._jobs = [mp.Queue() for _ in range(helpers)]
+        self._processes = [mp.Process(target=_helper_main, daemon=True,
+                                      args=(i, self._shm.name, mb, board, self._jobs[i], self._results,
+                                            self._stop, self._nodes))
+                           for i in range(helpers)]
+        for process in self._processes:
+            process.start()
+
+        self.nodes = 0 # Nodes searched by every process in the last search
+        self._search_id = 0 # Tells the results of a helper that answered late from those of the current search
+
+    def search(self, game: Chess, limits: SearchLimits,
+               report: Callable[[SearchInfo], None] | None=None) -> tuple[Move, int]:
+        """Search a position in every process until the main search reaches a limit.
+
+        Parameters
+        ----------
+        game : Chess
+            Game to search. It is back in the same position afterwards
+        limits : SearchLimits
+            When to stop. A node limit counts the nodes of every process
+        report : Callable[[SearchInfo], None] | None, optional
+            Called after every iteration of the main search, with the nodes of every process, by default None
+
+        Returns
+        -------
+        tuple[Move, int]
+            Best move and its score
+        """
+        helper_nodes = self._nodes
+        for i in range(len(helper_nodes)):
+            helper_nodes[i] = 0
+
+        states = game.game_states
+        history = [states.keys[node] for node in states.path(states.current)] if states != None else [game.zobrist]
+        fen = game.get_FEN()
+        helper_limits = SearchLimits(limits.depth, None, limits.movetime) # Node limits are checked by the main search
+        self._search_id += 1
+        searching = set()
+        for i, jobs in enumerate(self._jobs):
+            if self._processes[i].is_alive():
+                jobs.put((self._search_id, fen, history, helper_limits, 1 + (i + 1) % 2, # Half start a ply deeper
+                          self.tt.age))
+                searching.add(i)
+
+        main = _MainSearcher(game, self.tt, helper_nodes)
+        finished = [(0, NULL_MOVE, 0)]
+
+        def main_report(info: SearchInfo) -> None:
+            finished[0] = (info.depth, info.pv[0] if info.pv else NULL_MOVE, info.score)
+            if report:
+                info.nodes = main.total_nodes()
+                report(info)
+
+        main.report = main_report
+        move, score = main.search(limits)
+
+        # Stop the helpers and take a deeper result if one of them finished one
+        self._stop.set()
+        best_depth = finished[0][0]
+        end = perf_counter() + self.STOP_TIMEOUT
+        while searching and perf_counter() < end:
+            try:
+                search_id, index, (depth, helper_move, helper_score) = self._results.get(timeout=self.POLL_INTERVAL)
+            except Empty: # A helper that died won't answer, the main result is used without it
+                searching = {i for i in searching if self._processes[i].is_alive()}
+                continue
+
+            if search_id != self._search_id:
+                continue
+            searching.discard(index)
+            if depth > best_depth and helper_move != NULL_MOVE:
+                best_depth, move, score = depth, helper_move, helper_score
+        self._stop.clear()
+
+        self.nodes = main.total_nodes()
+        return move, score
+
+    def clear(self) -> None:
+        """Empty the shared transposition table (e.g., for a new game). The helpers get the reset age with their next
+        search."""
+        self.tt.clear()
+
+    def close(self) -> None:
+        """End the helper processes and free the shared memory."""
+        for jobs in self._jobs:
+            jobs.put(None)
+        for process in self._processes:
+            process.join()
+        self._processes = list()
+        self._jobs = list()
+
+        self.tt.release()
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> 'LazySMP':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def bench(threads: list[int], depth: int, mb: float, board: str) -> None:
+    """Print the time to reach `depth` on BENCH_FENS for each number of threads."""
+    base = None
+    for count in threads:
+        with LazySMP(count, mb, board) as smp:
+            start = perf_counter()
+            nodes = 0
+            for fen in BENCH_FENS:
+                smp.clear()
+                game = Chess(False, BOARD_TYPES[board])
+                game.set_FEN(fen)
+                smp.search(game, SearchLimits(depth))
+                nodes += smp.nodes
+            seconds = perf_counter() - start
+
+        base = base or seconds
+        print(f"threads {count}: {seconds:.2f}s to depth {depth}, speedup {base / seconds:.2f}, "
+              f"nps {int(nodes / seconds)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search a position with Lazy SMP helper processes.")
+    parser.add_argument("--fen", help="FEN string of the position (default: start position)")
+    parser.add_argument("-d", "--depth", type=int, help="Deepest iteration in plies")
+    parser.add_argument("-n", "--nodes", type=int, help="Most nodes to search, counting every process")
+    parser.add_argument("-t", "--movetime", type=float, help="Most seconds to search")
+    parser.add_argument("-j", "--threads", type=int, help="Number of searching processes (default: CPU count)")
+    parser.add_argument("--hash", type=float, default=16, help="Shared transposition table size in MB (default: 16)")
+    parser.add_argument("--board", choices=BOARD_TYPES, default="bitboard", help="Board representation")
+    parser.add_argument("--bench", type=int, nargs="+", metavar="THREADS",
+                        help="Time the benchmark positions to --depth (default 4) with each number of threads")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench, args.depth or 4, args.hash, args.board)
+        return
+
+    game = Chess(False, BOARD_TYPES[args.board])
+    if args.fen:
+        game.set_FEN(args.fen)
+
+    depth = args.depth
+    if depth == None and args.nodes == None and args.movetime == None:
+        depth = 5
+
+    with LazySMP(args.threads, args.hash, args.board) as smp:
+        move, _ = smp.search(game, SearchLimits(depth, args.nodes, args.movetime), print)
+    print("bestmove", move_to_uci(move) if move != NULL_MOVE else "(none)")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,9 +20,14 @@ class Node:
         return f"{self.data} | {next_data}, {prev_data}"
 
 class DoubleLinkedList:
+    """Doubly linked list with a cursor (`current`).
+    NOTE: Every node is also kept in an index list, so seeking to any index is O(1), as are next(), previous(),
+    add_end() and pop(). Adding or removing anywhere else shifts the index list, which is O(n)
+    """
     def __init__(self, *data):
         """Create a new DoubleLinkedList"""
         self._index = 0 # Current location in list
+        self._nodes: list[Node] = list() # Node at each index
 
         self.head = None # Start
         self.tail = None # End
@@ -30,17 +35,11 @@ class DoubleLinkedList:
 
         self.current: Node = None # Working node
 
-        if data:
-            self.add_start(data[0])
-            self.len += 1
-            if len(data) > 1:
-                for datum in data[1:]:
-                    #print(datum)
-                    self.add_end(datum)
-                    self.len += 1
+        for datum in data:
+            self.add_end(datum)
 
     def add_start(self, data):
-        """Add an item to the start of the list
+        """Add an item to the start of the list. O(n), see the class NOTE
 
         Parameters
         ----------
@@ -53,13 +52,14 @@ class DoubleLinkedList:
             node.next = self.head
             self.head.previous = node
             self.head = node
+            self._index += 1 # The current node moved up one
         else:
             self.head = node
             self.current = node
             if self.tail == None:
                 self.tail = node
 
-        self._index += 1
+        self._nodes.insert(0, node)
         self.len += 1
 
 
@@ -84,6 +84,7 @@ class DoubleLinkedList:
 
             self.tail = node
 
+        self._nodes.append(node)
         self.len += 1
             
     def next(self) -> Node:
@@ -121,16 +122,26 @@ class DoubleLinkedList:
             Popped node
         """
         rtn = self.tail
+        if rtn == None:
+            return False
 
-        self.tail = self.tail.previous
-        self.tail.next = None
+        self.tail = rtn.previous
+        if self.tail:
+            self.tail.next = None
+        else:
+            self.head = None
 
+        self._nodes.pop()
         self.len -= 1
 
-        return rtn or False
+        if self.current is rtn: # Cursor falls back to the new tail
+            self.current = self.tail
+            self._index = max(self._index - 1, 0)
+
+        return rtn
 
     def add_node(self, data, index: int) -> bool:
-        """Add a node at an arbitrary index
+        """Add a node at an arbitrary index. O(n), see the class NOTE
         NOTE: Do not use this for the first or last item!
 
         Parameters
@@ -144,17 +155,16 @@ class DoubleLinkedList:
             self.add_start(data)
             return True
         
-        start = self._index
         new_node = Node(data) # Step 1
 
-        self.move_to_index(index-1) # Step 2
-
-        new_node.previous = self.current # Step 3
+        new_node.previous = self._nodes[index-1] # Steps 2 & 3
         new_node.next = new_node.previous.next # Step 4
-        self.current.next = new_node # Step 5
+        new_node.previous.next = new_node # Step 5
         new_node.next.previous = new_node # Step 6
 
-        self.move_to_index(start) # Returning to the original position
+        self._nodes.insert(index, new_node)
+        if index <= self._index: # The current node moved up one
+            self._index += 1
 
         self.len += 1
         
@@ -168,19 +178,19 @@ class DoubleLinkedList:
         index : int
             Index to move to
         """
-        diff = index - self._index
-
-        if diff > 0:
-            for i in range(diff):
-                #print("f")
-                self.next()
-        elif diff < 0:
-            for i in range(-diff):
-                #print("b")
-                self.previous()
+        if not self._nodes:
+            return
+        
+        index = min(max(index, 0), self.len - 1) # Stops at the ends like next() and previous()
+        self.current = self._nodes[index]
+        self._index = index
+        
+    def __getitem__(self, index: int) -> Node:
+        """Return the node at an index without moving the cursor"""
+        return self._nodes[index]
 
     def remove_first(self) -> Node:
-        """Remove 1st item in list and return it.
+        """Remove 1st item in list and return it. O(n), see the class NOTE
 
         Returns
         -------
@@ -189,10 +199,19 @@ class DoubleLinkedList:
         """
         rtn = self.head
         self.head = self.head.next
-        self.head.previous = None
+        if self.head:
+            self.head.previous = None
+        else:
+            self.tail = None
         
+        self._nodes.pop(0)
         self.len -= 1
         
+        if self.current is rtn:
+            self.current = self.head
+        else:
+            self._index -= 1
+        
         return rtn
     
     def remove_last(self) -> Node:
@@ -206,20 +225,38 @@ class DoubleLinkedList:
         return self.pop()
 
     def remove_node(self, node: Node):
-        """Remove given node.
+        """Remove given node. O(n), it is looked up in the index list (remove_index() skips that)
 
         Parameters
         ----------
         node : Node
             Node to remove
         """
+        if node is self.head:
+            self.remove_first()
+            return
+        if node is self.tail:
+            self.pop()
+            return
+        
+        self._unlink(node, self._nodes.index(node))
+    
+    def _unlink(self, node: Node, index: int):
+        """Remove a node that is neither the head nor the tail, given its index"""
         node.previous.next = node.next
         node.next.previous = node.previous
         
         node.next, node.previous = None, None
+        
+        del self._nodes[index]
+        self.len -= 1
+        if self.current is node: # Cursor moves to the node that took its place
+            self.current = self._nodes[index]
+        elif index < self._index:
+            self._index -= 1
     
     def remove_index(self, index: int) -> Node:
-        """Remove node at given index and return it.
+        """Remove node at given index and return it. O(n), see the class NOTE
 
         Parameters
         ----------
@@ -231,51 +268,34 @@ class DoubleLinkedList:
         Node
             Node removed
         """
-        prev_index = self._index
-        if prev_index > index:
-            prev_index -= 1
-        
-        self.move_to_index(index)
-        
-        self.remove_node(self.current)
+        node = self._nodes[index]
+        if node is self.head or node is self.tail:
+            self.remove_node(node)
+        else:
+            self._unlink(node, index % self.len)
         
-        self.move_to_index(prev_index)
+        return node
     
     def reset_index(self):
         self._index = 0
     
     def _count_len(self):
-        self.current = self.head
-        new_len = 1
-        while self.current.next:
-            new_len += 1
-            self.current = self.current.next
-            
-        self.len = new_len
+        self.len = len(self._nodes)
             
 
     def __len__(self) -> int:
         return self.len
 
     def __str__(self) -> str:
-        rtn = ""
-
-        start = self._index
-        self.move_to_index(0)
-        while self.current.next:
-            rtn += str(self.current)
-            self.next()
-            rtn += "; "
-        rtn += str(self.tail)
-
-        self.move_to_index(start)
-
-        return rtn
+        return "; ".join(str(node) for node in self._nodes)
         
 ## Fun functions
 def reverse_dll(l : DoubleLinkedList):
     temp_node : Node
     c_node = l.head
+    l.head, l.tail = l.tail, l.head
+    l._nodes.reverse()
+    l._index = max(l.len - 1 - l._index, 0)
 
     while c_node != None:
         temp_node = c_node.next
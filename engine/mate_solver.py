@@ -0,0 +1,311 @@
+# By Chris Parker
+# Mate solver using depth-first proof-number search (df-pn). Every position gets a proof number (how many
+# positions still have to be proven to show the attacker mates) and a disproof number (how many have to be
+# disproven to show he can't). The search always expands the most proving position, so forcing lines are
+# followed first and quiet sidelines only when they are needed, which is much cheaper than a full-width search.
+#
+# "Mate in n" is searched with n = 1, 2, ... so the shortest mate is found. Numbers are kept in a hash table keyed
+# by the position and the plies left, so positions reached by transposition and earlier iterations aren't redone.
+#
+# NOTE: Being pure Python it expands only about 1,000-5,000 positions a second. Forcing mates (checks, few defender
+# replies) up to mate in 5 are found in well under a second, but a wide mate in 5, or showing that there is none
+# (ex. "no mate in 5" for KQ vs K needs about 20,000-70,000 positions), takes seconds to minutes. The node budget
+# bounds the time, and the result is "unknown" when it runs out.
+#
+# Reference
+# ---------
+# https://www.chessprogramming.org/Proof-Number_Search
+# https://www.chessprogramming.org/Dynamic_Proof-Number_Search (df-pn)
+
+import argparse
+from array import array
+from time import perf_counter
+
+# Chess Imports
+from chess import BitBoard, Chess
+from chess_enum import Color
+from movegen import move_to_uci, Move
+
+INFINITE = 10**9 # Proof or disproof number of a solved position
+EPSILON = 0.25 # Child thresholds get this much slack, so the search doesn't keep switching between siblings
+
+
+class MateResult:
+    """Outcome of a mate search."""
+    def __init__(self, mate: bool | None, line: list[Move], moves: int, nodes: int, seconds: float) -> None:
+        self.mate = mate # True if mate was proven, False if disproven, None if the node budget ran out
+        self.line = line # Mating line, the defender playing the longest resistance found
+        self.moves = moves # Moves to mate if found, else the most moves searched
+        self.nodes = nodes
+        self.seconds = seconds
+
+    def __str__(self) -> str:
+        if self.mate:
+            return f"mate in {self.moves}: {' '.join(move_to_uci(move) for move in self.line)}"
+        if self.mate == False:
+            return f"no mate in {self.moves}"
+        return f"unknown, no mate in {self.moves} or fewer proven in {self.nodes} nodes"
+
+
+class MateSolver:
+    """Find forced mates for the side to move in a game's position. The game is back in the same position afterwards."""
+    def __init__(self, game: Chess, max_nodes: int=1_000_000, max_entries: int=2_000_000) -> None:
+        """Construct a new MateSolver.
+
+        Parameters
+        ----------
+        game : Chess
+            Game to solve. Its board should be a BitBoard for speed
+        max_nodes : int, optional
+            Most positions to expand per solve() call, by default 1_000_000
+        max_entries : int, optional
+            Hash table size. Unsolved entries are dropped when it fills up, by default 2_000_000
+        """
+        self.game = game
+        self.max_nodes = max_nodes
+        self.max_entries = max_entries
+
+        self.nodes = 0
+        self.stopped = False
+
+        self._table: dict[tuple[int, int], tuple[int, int]] = dict() # (key, plies left) -> (proof, disproof)
+        self._children: dict[int, list[tuple[Move, int]]] = dict() # Key -> (move, key after it)
+        self._moves: dict[int, array] = dict() # Key -> legal moves generated for the initial numbers, until expanded
+        self._collect_at = max_entries # Table size of the next collection
+        self._path: set[int] = set() # Keys of the positions being searched, repeating one is a draw
+
+    def solve(self, moves: int) -> MateResult:
+        """Search for a mate in `moves` or fewer moves.
+
+        Parameters
+        ----------
+        moves : int
+            Most moves of the attacking side
+
+        Returns
+        -------
+        MateResult
+            Whether a mate was found (and its line), disproven or not solved within the node budget
+        """
+        game = self.game
+        self.nodes = 0
+        self.stopped = False
+        start = perf_counter()
+        key = game.zobrist
+
+        for n in range(1, moves + 1):
+            plies = 2*n - 1
+            self._path = {key}
+            proof, disproof = self._table.get((key, plies), (1, 1))
+            if proof and disproof:
+                self._mid(key, plies, True, INFINITE, INFINITE)
+                proof, disproof = self._table[(key, plies)]
+
+            if proof == 0:
+                return MateResult(True, self._line(key, plies), n, self.nodes, perf_counter() - start)
+            if self.stopped:
+                return MateResult(None, list(), n - 1, self.nodes, perf_counter() - start)
+
+        return MateResult(False, list(), moves, self.nodes, perf_counter() - start)
+
+    def clear(self) -> None:
+        """Empty the hash table."""
+        self._table.clear()
+        self._children.clear()
+        self._moves.clear()
+        self._collect_at = self.max_entries
+
+    def _initial(self, plies: int, attacker: bool) -> tuple[int, int]:
+        """Proof and disproof numbers of a position reached in the search, before it is expanded."""
+        if attacker:
+            return 1, 1 # An attacker without moves is disproven when it is expanded
+
+        game = self.game
+        turn = Color.WHITE if game.white_turn else Color.BLACK
+        if plies == 0: # Out of moves, only mate counts
+            return (0, INFINITE) if game.in_check(turn) and not game.has_legal_move() else (INFINITE, 0)
+
+        moves = game.generate_legal()
+        if not moves:
+            return (0, INFINITE) if game.in_check(turn) else (INFINITE, 0) # Mate or stalemate
+
+        if len(self._moves) < self.max_entries // 8: # Saves generating them again if the position is expanded
+            self._moves[game.zobrist] = moves
+        return len(moves), 1 # Every reply has to be refuted, so fewer replies are easier
+
+    def _numbers(self, move: Move, child: int, plies: int, attacker: bool) -> tuple[int, int]:
+        """Proof and disproof numbers of the position after `move`, giving it its initial numbers if it has none
+        (it is new or was collected)."""
+        numbers = self._table.get((child, plies))
+        if numbers == None:
+            record = self.game.make(move)
+            numbers = self._table[(child, plies)] = self._initial(plies, attacker)
+            self.game.unmake_move(record)
+
+        return numbers
+
+    def _expand(self, key: int, plies: int, attacker: bool) -> list[tuple[Move, int]]:
+        """Return the moves of a position and the keys after them, giving every child its initial numbers."""
+        game = self.game
+        table = self._table
+        children = self._children.get(key)
+
+        if children == None:
+            moves = self._moves.pop(key, None)
+            if moves == None:
+                moves = game.generate_legal()
+
+            children = list()
+            for move in moves:
+                record = game.make(move)
+                child = game.zobrist
+                if (child, plies - 1) not in table:
+                    table[(child, plies - 1)] = self._initial(plies - 1, not attacker)
+                game.unmake_move(record)
+                children.append((move, child))
+            self._children[key] = children
+        else:
+            for move, child in children:
+                self._numbers(move, child, plies - 1, not attacker)
+
+        return children
+
+    def _mid(self, key: int, plies: int, attacker: bool, max_proof: int, max_disproof: int) -> None:
+        """Expand a position until its proof number reaches `max_proof` or its disproof number `max_disproof`."""
+        game = self.game
+        path = self._path
+
+        self.nodes += 1
+        if self.nodes >= self.max_nodes:
+            self.stopped = True
+        if len(self._table) >= self._collect_at:
+            self._collect()
+
+        children = self._expand(key, plies, attacker)
+        while True:
+            # The attacker needs one child proven and all disproven to fail, the defender the other way round
+            proof, disproof = (INFINITE, 0) if attacker else (0, INFINITE)
+            best = second = None
+            best_value = second_value = INFINITE + 1
+            for i, (move, child) in enumerate(children):
+                if child in path:
+                    child_proof, child_disproof = INFINITE, 0
+                else: # Entries may have been collected while searching a sibling
+                    child_proof, child_disproof = self._numbers(move, child, plies - 1, not attacker)
+                if attacker:
+                    proof = min(proof, child_proof)
+                    disproof = min(disproof + child_disproof, INFINITE)
+                    value = child_proof
+                else:
+                    proof = min(proof + child_proof, INFINITE)
+                    disproof = min(disproof, child_disproof)
+                    value = child_disproof
+
+                if value < best_value:
+                    second, second_value = best, best_value
+                    best, best_value = i, value
+                elif value < second_value:
+                    second, second_value = i, value
+
+            if proof >= max_proof or disproof >= max_disproof or self.stopped:
+                break
+
+            move, child = children[best]
+            child_proof, child_disproof = self._numbers(move, child, plies - 1, not attacker)
+            slack = min(INFINITE, int(second_value * (1 + EPSILON)) + 1)
+            if attacker:
+                child_max_proof = min(max_proof, slack)
+                child_max_disproof = min(INFINITE, max_disproof - disproof + child_disproof)
+            else:
+                child_max_disproof = min(max_disproof, slack)
+                child_max_proof = min(INFINITE, max_proof - proof + child_proof)
+
+            record = game.make(move)
+            path.add(child)
+            self._mid(child, plies - 1, not attacker, child_max_proof, child_max_disproof)
+            path.discard(child)
+            game.unmake_move(record)
+
+        self._table[(key, plies)] = (proof, disproof)
+
+    def _collect(self) -> None:
+        """Make room in the hash table by dropping every unsolved entry. The table is pruned in place, as the
+        positions being searched still hold it. If solved entries alone fill more than half of it, it may grow."""
+        table = self._table
+        for entry in [entry for entry, numbers in table.items() if 0 not in numbers]:
+            del table[entry]
+
+        proven = {key for (key, _), numbers in table.items() if numbers[0] == 0} # Their moves are needed for _line
+        for key in [key for key in self._children if key not in proven]:
+            del self._children[key]
+        self._moves.clear()
+
+        self._collect_at = max(self.max_entries, 2 * len(table))
+
+    def _proven_in(self, key: int, plies: int) -> int:
+        """Fewest plies left a position was proven with (plies + 1 if it wasn't)."""
+        for left in range(plies + 1):
+            numbers = self._table.get((key, left))
+            if numbers != None and numbers[0] == 0:
+                return left
+        return plies + 1
+
+    def _line(self, key: int, plies: int) -> list[Move]:
+        """Follow a proven position to mate. The attacker picks the fastest mate, the defender the slowest."""
+        game = self.game
+        records = list()
+        line: list[Move] = list()
+        attacker = True
+
+        while plies > 0:
+            children = self._children.get(key)
+            if children == None: # Collected, or never expanded
+                children = list()
+                for move in game.generate_legal():
+                    record = game.make(move)
+                    children.append((move, game.zobrist))
+                    game.unmake_move(record)
+
+            scored = [(self._proven_in(child, plies - 1), move, child) for move, child in children]
+            scored = [entry for entry in scored if entry[0] < plies]
+            if not scored:
+                break
+            _, move, key = min(scored) if attacker else max(scored)
+
+            records.append(game.make(move))
+            line.append(move)
+            plies -= 1
+            attacker = not attacker
+            if not attacker and not game.has_legal_move():
+                break
+
+        for record in reversed(records):
+            game.unmake_move(record)
+
+        return line
+
+
+def solve_mate(game: Chess, moves: int, max_nodes: int=1_000_000) -> MateResult:
+    """Search a position for a mate in `moves` or fewer moves (see MateSolver.solve)."""
+    return MateSolver(game, max_nodes).solve(moves)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find a forced mate with proof-number search. Forcing mates are "
+                                     "found quickly, but a wide mate in 5 or proving there is none can take minutes "
+                                     "(about 1,000-5,000 nodes a second); lower --nodes to bound the time.")
+    parser.add_argument("--fen", required=True, help="FEN string of the position, the side to move attacks")
+    parser.add_argument("-m", "--moves", type=int, default=5, help="Most moves to mate in (default: 5)")
+    parser.add_argument("-n", "--nodes", type=int, default=1_000_000, help="Node budget, a few minutes at the default (default: 1,000,000)")
+    args = parser.parse_args()
+
+    game = Chess(False, BitBoard)
+    game.set_FEN(args.fen)
+
+    result = solve_mate(game, args.moves, args.nodes)
+    print(result)
+    print(f"{result.nodes} nodes in {result.seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
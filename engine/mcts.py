@@ -0,0 +1,349 @@
+# By Chris Parker
+# Monte Carlo tree search with PUCT selection. Each round walks down the tree once per batch slot, adding a
+# virtual loss to every node it passes through, so the next walk in the same round picks a different leaf.
+# Then the whole batch of leaves is turned into one NumPy array and scored by a single evaluator call. That
+# keeps the Python work per leaf small and lets a learned evaluator replace LinearEvaluator without changes.
+#
+# Reference
+# ---------
+# https://www.chessprogramming.org/Monte-Carlo_Tree_Search
+# https://www.chessprogramming.org/Christopher_D._Rosin (PUCT)
+# Chaslot, Winands and van den Herik, Parallel Monte-Carlo Tree Search (virtual loss)
+
+import argparse
+import math
+from time import perf_counter
+from typing import Callable
+
+import numpy as np
+
+# Chess Imports
+from chess import BitBoard, Chess
+from chess_enum import Color
+from evaluation import EG_TABLE, MAX_PHASE, MG_TABLE, PHASE
+from movegen import move_to_uci, Move, CASTLING, EN_PASSANT, FLAGS, NULL_MOVE, PROMOTION
+from search import SearchLimits, TYPE_VALUES
+
+C_PUCT = 1.5 # Exploration weight
+VIRTUAL_LOSS = 1 # Losses added to a node while a leaf below it waits for its evaluation
+VALUE_SCALE = 400 # Centipawns at which a value reaches tanh(1)
+
+
+def features(boards: list[list[int]]) -> np.ndarray:
+    """Turn positions into a (positions, 768) array of 0/1 features, one per piece index and square.
+
+    Parameters
+    ----------
+    boards : list[list[int]]
+        The 12 piece bitboards of each position (see bitboard.piece_index)
+
+    Returns
+    -------
+    np.ndarray
+        uint8 array, feature `index*64 + square` is set if that piece is on that square
+    """
+    bitboards = np.array(boards, dtype="<u8") # Little endian, so byte k holds squares 8k to 8k+7
+    return np.unpackbits(bitboards.view(np.uint8), axis=1, bitorder="little")
+
+
+class LinearEvaluator:
+    """Score a batch of positions with the tapered material and piece-square tables of evaluation.py."""
+    def __init__(self) -> None:
+        self.mg = np.array(MG_TABLE, dtype=np.float32).reshape(768)
+        self.eg = np.array(EG_TABLE, dtype=np.float32).reshape(768)
+        self.phase = np.repeat(np.array(PHASE, dtype=np.float32), 64)
+
+    def evaluate(self, features: np.ndarray, white_turn: np.ndarray) -> np.ndarray:
+        """Score positions.
+
+        Parameters
+        ----------
+        features : np.ndarray
+            (positions, 768) features (see features())
+        white_turn : np.ndarray
+            (positions,) bool, is it white's turn
+
+        Returns
+        -------
+        np.ndarray
+            (positions,) values from -1 (lost) to 1 (won) for the side to move
+        """
+        x = features.astype(np.float32)
+        phase = np.minimum(x @ self.phase, MAX_PHASE)
+        score = ((x @ self.mg) * phase + (x @ self.eg) * (MAX_PHASE - phase)) / MAX_PHASE
+
+        return np.tanh(np.where(white_turn, score, -score) / VALUE_SCALE)
+
+
+class Node:
+    """Position in the search tree, reached by `move` from its parent."""
+    __slots__ = ("move", "prior", "visits", "value", "children", "terminal")
+
+    def __init__(self, move: Move, prior: float) -> None:
+        self.move = move
+        self.prior = prior # Policy probability of `move`
+        self.visits = 0
+        self.value = 0.0 # Sum of values for the side that made `move`
+        self.children: list['Node'] | None = None # None until expanded
+        self.terminal: float | None = None # Value for the side to move if the game is over here
+
+    def q(self) -> float:
+        return self.value / self.visits if self.visits else 0.0
+
+
+class MCTSInfo:
+    """Progress of a tree search."""
+    def __init__(self, visits: int, leaves: int, seconds: float, q: float, pv: list[Move]) -> None:
+        self.visits = visits # Visits of the root
+        self.leaves = leaves # Positions evaluated
+        self.seconds = seconds
+        self.q = q # Average value of the best move, for the side to move
+        self.pv = pv # Most visited line
+
+    @property
+    def leaves_per_second(self) -> int:
+        return int(self.leaves / self.seconds) if self.seconds > 0 else 0
+
+    @property
+    def score(self) -> int:
+        """The best move's value in centipawns."""
+        q = max(-0.999, min(0.999, self.q))
+        return int(VALUE_SCALE * math.atanh(q))
+
+    def __str__(self) -> str:
+        """UCI `info` line."""
+        return (f"info depth {len(self.pv)} score cp {self.score} nodes {self.visits} nps {self.leaves_per_second} "
+                f"time {int(self.seconds * 1000)} pv {' '.join(move_to_uci(move) for move in self.pv)}")
+
+
+class MCTS:
+    """Search a game's position with batched Monte Carlo tree search. The game is back in the same position
+    afterwards."""
+    REPORT_EVERY = 1.0 # Seconds between reports
+
+    def __init__(self, game: Chess, evaluator=None, batch_size: int=64,
+                 report: Callable[[MCTSInfo], None] | None=None) -> None:
+        """Construct a new MCTS.
+
+        Parameters
+        ----------
+        game : Chess
+            Game to search. Its board should be a BitBoard for speed
+        evaluator : Any, optional
+            Object with an evaluate(features, white_turn) method like LinearEvaluator's, by default a
+            LinearEvaluator
+        batch_size : int, optional
+            Leaves collected before each evaluator call, by default 64
+        report : Callable[[MCTSInfo], None] | None, optional
+            Called about every REPORT_EVERY seconds and when the search ends, by default None
+        """
+        self.game = game
+        self.evaluator = evaluator if evaluator != None else LinearEvaluator()
+        self.batch_size = batch_size
+        self.report = report
+
+        self.root = Node(NULL_MOVE, 1.0)
+        self.leaves = 0 # Positions evaluated
+        self.stopped = False
+        self._keys: list[int] = list() # Zobrist keys of the game and the current line
+
+    def stop(self) -> None:
+        """Stop the search after the current batch (e.g., from another thread)."""
+        self.stopped = True
+
+    def search(self, limits: SearchLimits) -> tuple[Move, MCTSInfo]:
+        """Search until a limit is reached. `limits.depth` is not used, `limits.nodes` counts root visits.
+
+        Parameters
+        ----------
+        limits : SearchLimits
+            When to stop. With no limits 10,000 visits are made
+
+        Returns
+        -------
+        tuple[Move, MCTSInfo]
+            Most visited move (NULL_MOVE if there are no legal moves) and the final search info
+        """
+        game = self.game
+        self.root = Node(NULL_MOVE, 1.0)
+        self.leaves = 0
+        self.stopped = False
+        start = last_report = perf_counter()
+
+        states = game.game_states
+        if states != None: # Positions already played count for repetitions
+            self._keys = [states.keys[node] for node in states.path(states.current)]
+        else:
+            self._keys = [game.zobrist]
+
+        max_visits = limits.nodes
+        if max_visits == None and limits.movetime == None:
+            max_visits = 10_000
+
+        while not self.stopped:
+            self._run_batch()
+            if self.root.terminal != None:
+                break
+
+            now = perf_counter()
+            if max_visits != None and self.root.visits >= max_visits:
+                break
+            if limits.movetime != None and now - start >= limits.movetime:
+                break
+            if self.report and now - last_report >= self.REPORT_EVERY:
+                self.report(self.info(now - start))
+                last_report = now
+
+        info = self.info(perf_counter() - start)
+        if self.report:
+            self.report(info)
+
+        return (info.pv[0] if info.pv else NULL_MOVE), info
+
+    def info(self, seconds: float) -> MCTSInfo:
+        """Return the progress of the search."""
+        pv: list[Move] = list()
+        node = self.root
+        q = 0.0
+        while node.children:
+            node = max(node.children, key=lambda child: child.visits)
+            if not node.visits:
+                break
+            if not pv:
+                q = node.q()
+            pv.append(node.move)
+
+        return MCTSInfo(self.root.visits, self.leaves, seconds, q, pv)
+
+    def _select(self, node: Node) -> Node:
+        """Pick the child with the best PUCT score."""
+        explore = C_PUCT * math.sqrt(node.visits)
+        best, best_score = None, -math.inf
+        for child in node.children:
+            score = child.q() + explore * child.prior / (1 + child.visits)
+            if score > best_score:
+                best, best_score = child, score
+
+        return best
+
+    def _run_batch(self) -> None:
+        """Collect up to batch_size leaves, evaluate them together, then expand them and back their values up."""
+        game = self.game
+        keys = self._keys
+        pending: list[tuple[list[Node], list[Move], list[float]]] = list() # Path, moves and priors of each leaf
+        boards: list[list[int]] = list()
+        turns: list[bool] = list()
+        waiting: set[int] = set() # Leaves already in this batch
+
+        for _ in range(self.batch_size):
+            path = [self.root]
+            records = list()
+            node = self.root
+            while node.children:
+                node = self._select(node)
+                node.visits += VIRTUAL_LOSS
+                node.value -= VIRTUAL_LOSS
+                path.append(node)
+                records.append(game.make(node.move))
+                keys.append(game.zobrist)
+
+            value = None
+            collision = False
+            if node.terminal != None:
+                value = node.terminal
+            elif len(path) > 1 and self._is_draw():
+                value = 0.0
+            elif id(node) in waiting: # The best line leads to a leaf already in the batch
+                collision = True
+            else:
+                moves = game.generate_legal()
+                if not moves:
+                    turn = Color.WHITE if game.white_turn else Color.BLACK
+                    value = node.terminal = -1.0 if game.in_check(turn) else 0.0
+                else:
+                    waiting.add(id(node))
+                    pending.append((path, list(moves), self._priors(moves)))
+                    boards.append(list(game.board.bitboards())) # Copy, a BitBoard returns its live list
+                    turns.append(game.white_turn)
+
+            if value != None or collision:
+                self._backup(path, value)
+
+            for record in reversed(records):
+                keys.pop()
+                game.unmake_move(record)
+
+            if collision: # Evaluate what there is
+                break
+
+        if not pending:
+            return
+
+        values = self.evaluator.evaluate(features(boards), np.array(turns))
+        self.leaves += len(pending)
+        for (path, moves, priors), value in zip(pending, values.tolist()):
+            path[-1].children = [Node(move, prior) for move, prior in zip(moves, priors)]
+            self._backup(path, value)
+
+    def _backup(self, path: list[Node], value: float | None) -> None:
+        """Remove the virtual losses of a path and add `value` (for the side to move at the leaf). A value of None
+        only removes the virtual losses."""
+        for i in range(len(path) - 1, -1, -1):
+            node = path[i]
+            if i: # The root has no virtual loss
+                node.visits -= VIRTUAL_LOSS
+                node.value += VIRTUAL_LOSS
+            if value != None:
+                value = -value # Nodes store values for the side that moved into them
+                node.visits += 1
+                node.value += value
+
+    def _is_draw(self) -> bool:
+        """Fifty move rule or a position repeated since the last capture or pawn move."""
+        half_move = self.game.half_move
+        if half_move >= 100:
+            return True
+
+        keys = self._keys
+        return keys[-1] in keys[-half_move-1:-1]
+
+    def _priors(self, moves) -> list[float]:
+        """Policy over moves: captures and promotions are favoured by the material they win."""
+        board = self.game.board
+        weights: list[float] = list()
+        for move in moves:
+            flags = move & FLAGS
+            weight = 1.0
+            if flags == PROMOTION:
+                weight += 4.0 if move >> 12 & 3 == 3 else 0.5 # Queen
+            if flags == EN_PASSANT:
+                weight += 1.0
+            elif flags != CASTLING:
+                victim = board.piece_at(move >> 6 & 63)
+                if victim:
+                    weight += TYPE_VALUES[victim.type] / 100
+            weights.append(weight)
+
+        total = sum(weights)
+        return [weight / total for weight in weights]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search a position with batched Monte Carlo tree search.")
+    parser.add_argument("--fen", help="FEN string of the position (default: start position)")
+    parser.add_argument("-n", "--nodes", type=int, help="Most root visits (default: 10,000 if no time is given)")
+    parser.add_argument("-t", "--movetime", type=float, help="Most seconds to search")
+    parser.add_argument("-b", "--batch", type=int, default=64, help="Leaves per evaluation batch (default: 64)")
+    args = parser.parse_args()
+
+    game = Chess(False, BitBoard)
+    if args.fen:
+        game.set_FEN(args.fen)
+
+    move, info = MCTS(game, batch_size=args.batch, report=print).search(SearchLimits(None, args.nodes, args.movetime))
+    print(f"info string {info.leaves} leaves evaluated, {info.leaves_per_second} leaves/s")
+    print("bestmove", move_to_uci(move) if move != NULL_MOVE else "(none)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+# By Chris Parker
+# Legal move generation on bitboards (see bitboard.py).
+# Checkers, pinned pieces and the check evasion mask are found once per position, so every move that is
+# produced is already legal. Only king moves, en passant and castling need extra checks.
+# Moves are 16 bit integers (see encode) written into reusable array.array buffers.
+# static_exchange() settles the captures on one square without making any moves.
+
+from array import array
+
+# Chess Imports
+from chess_enum import Color, Type
+from bitboard import (attackers_to, attacks_by, bishop_attacks_from, lsb, rook_attacks_from, BETWEEN,
+                      BLACK_OFFSET, FULL, KING_ATTACKS, KNIGHT_ATTACKS, LINE, PAWN_ATTACKS, PAWN, KNIGHT, BISHOP,
+                      ROOK, QUEEN, KING, RANK_1, RANK_2, RANK_7, RANK_8)
+
+# MOVE ENCODING
+# from square (bits 0-5), to square (bits 6-11), promotion piece (bits 12-13), flags (bits 14-15)
+Move = int
+
+NORMAL = 0
+PROMOTION = 1 << 14
+EN_PASSANT = 2 << 14
+CASTLING = 3 << 14 # The to square is the rook's square
+FLAGS = 3 << 14
+NULL_MOVE = 0 # a1a1, never a legal move
+
+CODE_PROMOTIONS = (Type.KNIGHT, Type.BISHOP, Type.ROOK, Type.QUEEN)
+PROMOTION_CODES = {promotion: code for code, promotion in enumerate(CODE_PROMOTIONS)}
+PROMOTION_LETTERS = {Type.QUEEN: "q", Type.ROOK: "r", Type.BISHOP: "b", Type.KNIGHT: "n"}
+FILES = "abcdefgh"
+
+PROMOTION_TYPES = (Type.QUEEN, Type.ROOK, Type.BISHOP, Type.KNIGHT) # Order promotions are generated in
+_PROMOTION_BITS = tuple(PROMOTION_CODES[promotion] << 12 | PROMOTION for promotion in PROMOTION_TYPES)
+
+SEE_VALUES = (100, 320, 330, 500, 900, 20000) # Pawn, knight, bishop, rook, queen, king (bitboard order)
+
+
+def encode(frm: int, to: int, promotion: Type | None=None, flags: int=NORMAL) -> Move:
+    """Pack a move into 16 bits.
+
+    Parameters
+    ----------
+    frm : int
+        From square index
+    to : int
+        To square index (the rook's square when castling)
+    promotion : Type | None, optional
+        Piece a pawn becomes. Sets the PROMOTION flag, by default None
+    flags : int, optional
+        NORMAL, EN_PASSANT or CASTLING, by default NORMAL
+
+    Returns
+    -------
+    Move
+        Encoded move
+    """
+    if promotion != None:
+        return frm | to << 6 | PROMOTION_CODES[promotion] << 12 | PROMOTION
+    return frm | to << 6 | flags
+
+
+def move_from(move: Move) -> int:
+    return move & 63
+
+
+def move_to(move: Move) -> int:
+    return move >> 6 & 63
+
+
+def move_flags(move: Move) -> int:
+    return move & FLAGS
+
+
+def move_promotion(move: Move) -> Type | None:
+    return CODE_PROMOTIONS[move >> 12 & 3] if move & FLAGS == PROMOTION else None
+
+
+def square_name(sq: int) -> str:
+    """Return the algebraic name of a square index (e.g., `e4`)."""
+    return FILES[sq & 7] + str((sq >> 3) + 1)
+
+
+def move_to_uci(move: Move) -> str:
+    """Convert a move to UCI notation (e.g., `e2e4`, `e7e8q` or `e1g1` for castling)."""
+    frm = move & 63
+    to = move >> 6 & 63
+    flags = move & FLAGS
+
+    if flags == CASTLING:
+        to = frm + (2 if to > frm else -2) # The king's real destination
+    elif flags == PROMOTION:
+        return square_name(frm) + square_name(to) + PROMOTION_LETTERS[CODE_PROMOTIONS[move >> 12 & 3]]
+
+    return square_name(frm) + square_name(to)
+
+
+def move_buffer() -> array:
+    """Return an empty move list to pass to legal_moves() again and again."""
+    return array('H')
+
+
+def pins(pieces: list[int], color: Color, occupied: int) -> dict[int, int]:
+    """Find the pieces pinned to their king.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards
+    color : Color
+        Side whose pieces may be pinned
+    occupied : int
+        Every occupied square
+
+    Returns
+    -------
+    dict[int, int]
+        Pinned square -> squares that piece may still move to (the line through king and pinner)
+    """
+    us = 0 if color == Color.WHITE else BLACK_OFFSET
+    them = BLACK_OFFSET - us
+    king = lsb(pieces[us+KING])
+
+    own = 0
+    for bb in pieces[us:us+6]:
+        own |= bb
+    enemy = occupied & ~own
+
+    # Enemy sliders that would see the king if only enemy pieces were on the board
+    snipers = (rook_attacks_from(king, enemy) & (pieces[them+ROOK] | pieces[them+QUEEN]) |
+               bishop_attacks_from(king, enemy) & (pieces[them+BISHOP] | pieces[them+QUEEN]))
+
+    pinned = dict()
+    while snipers:
+        low = snipers & -snipers
+        snipers ^= low
+        sniper = low.bit_length() - 1
+
+        blockers = BETWEEN[king][sniper] & occupied
+        if blockers and not blockers & (blockers - 1) and blockers & own: # Exactly one of our pieces
+            pinned[lsb(blockers)] = LINE[king][sniper]
+
+    return pinned
+
+
+def _en_passant_safe(pieces: list[int], color: Color, king: int, after: int, captured: int) -> bool:
+    """Check the king directly after an en passant capture, since both pawns leave their squares.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards (before the capture)
+    color : Color
+        Side capturing
+    king : int
+        King square of the side capturing
+    after : int
+        Occupied squares after the capture
+    captured : int
+        Bitboard of the captured pawn
+
+    Returns
+    -------
+    bool
+        True if the king is not attacked after the capture
+    """
+    them = 0 if color == Color.BLACK else BLACK_OFFSET
+    return not (rook_attacks_from(king, after) & (pieces[them+ROOK] | pieces[them+QUEEN]) or
+                bishop_attacks_from(king, after) & (pieces[them+BISHOP] | pieces[them+QUEEN]) or
+                KNIGHT_ATTACKS[king] & pieces[them+KNIGHT] or
+                PAWN_ATTACKS[color][king] & pieces[them+PAWN] & ~captured)
+
+
+def legal_moves(pieces: list[int], color: Color, en_pass: int | None=None, castling: str="-",
+                moves: array | None=None, captures: bool=False) -> array:
+    """Generate every legal move for one side.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards
+    color : Color
+        Side to generate moves for
+    en_pass : int | None, optional
+        En passant square index, by default None
+    castling : str, optional
+        Castling options in the form `KQkq` or `-`, by default "-"
+    moves : array | None, optional
+        Buffer to fill (see move_buffer). Anything already in it is cleared, by default a new buffer
+    captures : bool, optional
+        Only generate captures and promotions (for quiescence search), by default False
+
+    Returns
+    -------
+    array
+        Encoded moves (see encode). Castling moves go to the rook's square. Promotions appear once per piece
+    """
+    us = 0 if color == Color.WHITE else BLACK_OFFSET
+    them = BLACK_OFFSET - us
+    if moves == None:
+        moves = move_buffer()
+    else:
+        del moves[:]
+    add = moves.append
+
+    if not pieces[us+KING]:
+        return moves
+
+    own = 0
+    for bb in pieces[us:us+6]:
+        own |= bb
+    enemy = 0
+    for bb in pieces[them:them+6]:
+        enemy |= bb
+    occupied = own | enemy
+    allowed = enemy if captures else ~own # Squares moves may end on
+
+    king = lsb(pieces[us+KING])
+    king_bit = 1 << king
+
+    # King moves. The king is taken off the board so it can't hide behind itself on a slider's line
+    danger = attacks_by(pieces, -color, occupied ^ king_bit)
+    targets = KING_ATTACKS[king] & allowed & ~danger
+    while targets:
+        low = targets & -targets
+        targets ^= low
+        add(king | (low.bit_length() - 1) << 6)
+
+    checkers = attackers_to(pieces, king, -color, occupied)
+    if checkers & (checkers - 1): # Double check, only the king can move
+        return moves
+
+    if checkers:
+        check_mask = checkers | BETWEEN[king][lsb(checkers)] # Capture the checker or block
+    else:
+        check_mask = FULL
+    pinned = pins(pieces, color, occupied)
+
+    # Knights, bishops, rooks and queens
+    for index in (KNIGHT, BISHOP, ROOK, QUEEN):
+        bb = pieces[us+index]
+        while bb:
+            low = bb & -bb
+            bb ^= low
+            sq = low.bit_length() - 1
+
+            if index == KNIGHT:
+                if sq in pinned:
+                    continue # A pinned knight can never move
+                targets = KNIGHT_ATTACKS[sq]
+            elif index == BISHOP:
+                targets = bishop_attacks_from(sq, occupied)
+            elif index == ROOK:
+                targets = rook_attacks_from(sq, occupied)
+            else:
+                targets = bishop_attacks_from(sq, occupied) | rook_attacks_from(sq, occupied)
+
+            targets &= allowed & check_mask
+            if sq in pinned:
+                targets &= pinned[sq]
+
+            while targets:
+                t = targets & -targets
+                targets ^= t
+                add(sq | (t.bit_length() - 1) << 6)
+
+    # Pawns
+    empty = ~occupied & FULL
+    if color == Color.WHITE:
+        start_rank, last_rank, step = RANK_2, RANK_8, 8
+    else:
+        start_rank, last_rank, step = RANK_7, RANK_1, -8
+
+    pawn_captures = PAWN_ATTACKS[color]
+    bb = pieces[us+PAWN]
+    while bb:
+        low = bb & -bb
+        bb ^= low
+        sq = low.bit_length() - 1
+
+        single = (low << 8 if step > 0 else low >> 8) & empty
+        if captures:
+            targets = single & last_rank
+        else:
+            targets = single
+            if single and low & start_rank:
+                targets |= (single << 8 if step > 0 else single >> 8) & empty
+        targets |= pawn_captures[sq] & enemy
+
+        targets &= check_mask
+        if sq in pinned:
+            targets &= pinned[sq]
+
+        while targets:
+            t = targets & -targets
+            targets ^= t
+            move = sq | (t.bit_length() - 1) << 6
+            if t & last_rank:
+                for bits in _PROMOTION_BITS:
+                    add(move | bits)
+            else:
+                add(move)
+
+    # En passant
+    if en_pass != None:
+        ep_bit = 1 << en_pass
+        captured = ep_bit >> 8 if step > 0 else ep_bit << 8
+
+        if captured & pieces[them+PAWN] and (check_mask & (ep_bit | captured)):
+            capturers = PAWN_ATTACKS[-color][en_pass] & pieces[us+PAWN]
+            while capturers:
+                low = capturers & -capturers
+                capturers ^= low
+
+                if not _en_passant_safe(pieces, color, king, occupied ^ low ^ captured | ep_bit, captured):
+                    continue
+
+                add((low.bit_length() - 1) | en_pass << 6 | EN_PASSANT)
+
+    # Castling
+    if not checkers and castling != "-" and not captures:
+        king_side, queen_side = ("K", "Q") if color == Color.WHITE else ("k", "q")
+        home = 4 if color == Color.WHITE else 60
+
+        if king == home:
+            if king_side in castling:
+                path = 0b11 << (home + 1) # f and g files
+                if not path & occupied and not path & danger:
+                    add(home | (home + 3) << 6 | CASTLING)
+            if queen_side in castling:
+                path = 0b111 << (home - 3) # b, c and d files
+                walk = 0b11 << (home - 2) # c and d files
+                if not path & occupied and not walk & danger:
+                    add(home | (home - 4) << 6 | CASTLING)
+
+    return moves
+
+
+def has_legal_move(pieces: list[int], color: Color, en_pass: int | None=None) -> bool:
+    """Find if a side has any legal move, stopping at the first one found.
+    King moves are tried first, then the other pieces one at a time, then en passant. Castling never needs to be
+    tried: when castling is legal, so is the king's step towards the rook.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards
+    color : Color
+        Side to check
+    en_pass : int | None, optional
+        En passant square index, by default None
+
+    Returns
+    -------
+    bool
+        True if there is at least one legal move
+    """
+    us = 0 if color == Color.WHITE else BLACK_OFFSET
+    them = BLACK_OFFSET - us
+
+    if not pieces[us+KING]:
+        return False
+
+    own = 0
+    for bb in pieces[us:us+6]:
+        own |= bb
+    enemy = 0
+    for bb in pieces[them:them+6]:
+        enemy |= bb
+    occupied = own | enemy
+
+    king = lsb(pieces[us+KING])
+    king_bit = 1 << king
+
+    if KING_ATTACKS[king] & ~own & ~attacks_by(pieces, -color, occupied ^ king_bit):
+        return True
+
+    checkers = attackers_to(pieces, king, -color, occupied)
+    if checkers & (checkers - 1): # Double check and the king can't move
+        return False
+
+    if checkers:
+        check_mask = checkers | BETWEEN[king][lsb(checkers)]
+    else:
+        check_mask = FULL
+    pinned = pins(pieces, color, occupied)
+
+    empty = ~occupied & FULL
+    if color == Color.WHITE:
+        start_rank, step = RANK_2, 8
+    else:
+        start_rank, step = RANK_7, -8
+    pawn_captures = PAWN_ATTACKS[color]
+
+    for index in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN):
+        bb = pieces[us+index]
+        while bb:
+            low = bb & -bb
+            bb ^= low
+            sq = low.bit_length() - 1
+
+            if index == PAWN:
+                single = (low << 8 if step > 0 else low >> 8) & empty
+                targets = single | pawn_captures[sq] & enemy
+                if single and low & start_rank:
+                    targets |= (single << 8 if step > 0 else single >> 8) & empty
+            elif index == KNIGHT:
+                targets = KNIGHT_ATTACKS[sq] & ~own
+            elif index == BISHOP:
+                targets = bishop_attacks_from(sq, occupied) & ~own
+            elif index == ROOK:
+                targets = rook_attacks_from(sq, occupied) & ~own
+            else:
+                targets = (bishop_attacks_from(sq, occupied) | rook_attacks_from(sq, occupied)) & ~own
+
+            targets &= check_mask
+            if sq in pinned:
+                targets &= pinned[sq]
+
+            if targets:
+                return True
+
+    if en_pass != None:
+        ep_bit = 1 << en_pass
+        captured = ep_bit >> 8 if step > 0 else ep_bit << 8
+
+        if captured & pieces[them+PAWN] and (check_mask & (ep_bit | captured)):
+            capturers = PAWN_ATTACKS[-color][en_pass] & pieces[us+PAWN]
+            while capturers:
+                low = capturers & -capturers
+                capturers ^= low
+                if _en_passant_safe(pieces, color, king, occupied ^ low ^ captured | ep_bit, captured):
+                    return True
+
+    return False
+
+
+def static_exchange(pieces: list[int], move: Move) -> int:
+    """Static exchange evaluation (SEE). Find how much material a move wins once both sides have made every
+    capture on its square that pays off, always capturing with the least valuable piece. Pieces behind a slider
+    (x-rays) join in as the pieces in front of them capture. Pins are ignored.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards
+    move : Move
+        Move of the side whose piece is on its from square
+
+    Returns
+    -------
+    int
+        Material won in centipawns (see SEE_VALUES), negative if the move loses material. 0 for castling
+    """
+    frm, to, flags = move & 63, move >> 6 & 63, move & FLAGS
+    if flags == CASTLING:
+        return 0
+
+    frm_bit, to_bit = 1 << frm, 1 << to
+    attacker = next(index for index in range(12) if pieces[index] & frm_bit)
+    color = Color.WHITE if attacker < BLACK_OFFSET else Color.BLACK
+    occupied = 0
+    for bb in pieces:
+        occupied |= bb
+
+    if flags == EN_PASSANT:
+        gains = [SEE_VALUES[PAWN]]
+        occupied ^= 1 << (to - 8*color) # The captured pawn isn't on the to square
+    else:
+        victim = next((index for index in range(12) if pieces[index] & to_bit), None)
+        gains = [SEE_VALUES[victim % BLACK_OFFSET] if victim != None else 0]
+
+    on_square = SEE_VALUES[attacker % BLACK_OFFSET] # Value of the piece that can be captured next
+    if flags == PROMOTION:
+        on_square = SEE_VALUES[(move >> 12 & 3) + KNIGHT]
+        gains[0] += on_square - SEE_VALUES[PAWN]
+
+    # Each side captures with its least valuable attacker. gains[d] is what the side making capture d has won
+    # if the exchange stops after it
+    occupied ^= frm_bit
+    side = -color
+    while True:
+        attackers = attackers_to(pieces, to, side, occupied) & occupied
+        if not attackers:
+            break
+
+        offset = 0 if side == Color.WHITE else BLACK_OFFSET
+        for index in range(6):
+            capturer = attackers & pieces[offset + index]
+            if capturer:
+                break
+
+        occupied ^= capturer & -capturer # Uncovers any x-ray attacker behind it
+        if index == KING and attackers_to(pieces, to, -side, occupied) & occupied:
+            break # The king can't capture a defended piece
+
+        gains.append(on_square - gains[-1])
+        on_square = SEE_VALUES[index]
+        side = -side
+
+    # Either side can stop capturing when continuing loses
+    for d in range(len(gains) - 1, 0, -1):
+        gains[d - 1] = -max(-gains[d - 1], gains[d])
+
+    return gains[0]
@@ -0,0 +1,438 @@
+# By Chris Parker
+# Perft (performance test) for the move generator. Counts the leaf nodes of the legal move tree to a fixed
+# depth and compares them with known results, which checks correctness and measures speed at the same time.
+#
+# Reference
+# ---------
+# https://www.chessprogramming.org/Perft_Results
+
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+# Chess Imports
+from array import array
+from chess import BitBoard, Chess, ChessBoard
+from movegen import move_buffer, move_to_uci
+
+# Standard test positions: (name, FEN, node counts for depth 1, 2, 3...)
+POSITIONS: list[tuple[str, str, list[int]]] = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("position4_mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+DEFAULT_DEPTH = 3
+BOARD_TYPES = {"bitboard": BitBoard, "mailbox": ChessBoard}
+
+
+def perft(game: Chess, depth: int, buffers: list[array] | None=None) -> int:
+    """Count the leaf nodes of the legal move tree.
+
+    Parameters
+    ----------
+    game : Chess
+        Position to search. It is back in the same state when this returns
+    depth : int
+        Number of plies
+    buffers : list[array] | None, optional
+        One move buffer per ply, reused at every node of that ply, by default new ones
+
+    Returns
+    -------
+    int
+        Number of leaf nodes
+    """
+    if buffers == None:
+        buffers = [move_buffer() for _ in range(depth + 1)]
+
+    moves = game.generate_legal(moves=buffers[depth])
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1 # Bulk counting at the last ply
+
+    nodes = 0
+    for move in moves:
+        record = game.make(move)
+        nodes += perft(game, depth - 1, buffers)
+        game.unmake_move(record)
+
+    return nodes
+
+
+def perft_hashed(game: Chess, depth: int, table: dict[tuple[int, int], int], max_entries: int=1 << 20,
+                 buffers: list[array] | None=None) -> int:
+    """Count the leaf nodes of the legal move tree, counting each transposed subtree only once.
+
+    Parameters
+    ----------
+    game : Chess
+        Position to search. It is back in the same state when this returns
+    depth : int
+        Number of plies
+    table : dict[tuple[int, int], int]
+        (Zobrist key, depth) -> node count. Can be reused between calls
+    max_entries : int, optional
+        Stop adding to the table once it is this big, by default 1 << 20
+    buffers : list[array] | None, optional
+        One move buffer per ply, by default new ones
+
+    Returns
+    -------
+    int
+        Number of leaf nodes
+    """
+    if buffers == None:
+        buffers = [move_buffer() for _ in range(depth + 1)]
+
+    if depth <= 1:
+        return len(game.generate_legal(moves=buffers[depth])) if depth == 1 else 1
+
+    entry = (game.zobrist, depth)
+    nodes = table.get(entry)
+    if nodes != None:
+        return nodes
+
+    nodes = 0
+    for move in game.generate_legal(moves=buffers[depth]):
+        record = game.make(move)
+        nodes += perft_hashed(game, depth - 1, table, max_entries, buffers)
+        game.unmake_move(record)
+
+    if len(table) < max_entries:
+        table[entry] = nodes
+
+    return nodes
+
+
+# PARALLEL PERFT
+# Every worker process keeps its own hash table between jobs
+_worker_table: dict[tuple[int, int], int] = dict()
+_worker_entries = 0
+_worker_board: type[ChessBoard] = BitBoard
+
+
+def _init_worker(hash_entries: int, board_name: str) -> None:
+    global _worker_entries, _worker_board
+    _worker_entries = hash_entries
+    _worker_board = BOARD_TYPES[board_name]
+    _worker_table.clear()
+
+
+def _count_subtree(fen: str, depth: int) -> int:
+    """Worker job. Count the leaf nodes below a position sent as a FEN string."""
+    game = Chess(False, _worker_board)
+    game.set_FEN(fen)
+
+    if _worker_entries > 0:
+        return perft_hashed(game, depth, _worker_table, _worker_entries)
+    return perft(game, depth)
+
+
+def split_positions(game: Chess, depth: int, root: str="", jobs: dict[int, list] | None=None) -> dict[int, list]:
+    """Play out every line to a fixed depth and collect the positions reached.
+    Lines that transpose into the same position share one entry.
+
+    Parameters
+    ----------
+    game : Chess
+        Position to start from
+    depth : int
+        Number of plies to play
+    root : str, optional
+        Root move (UCI notation) leading to `game`, by default ""
+    jobs : dict[int, list] | None, optional
+        Positions collected so far, by default a new dict
+
+    Returns
+    -------
+    dict[int, list]
+        Zobrist key -> [FEN, {root move: number of lines reaching the position}]
+    """
+    if jobs == None:
+        jobs = dict()
+        
+    if depth == 0:
+        job = jobs.setdefault(game.zobrist, [game.get_FEN(), dict()])
+        job[1][root] = job[1].get(root, 0) + 1
+        return jobs
+
+    for move in game.generate_legal():
+        record = game.make(move)
+        split_positions(game, depth - 1, root or move_to_uci(move), jobs)
+        game.unmake_move(record)
+
+    return jobs
+
+
+def parallel_perft(fen: str, depth: int, workers: int | None=None, hash_entries: int=0, split_depth: int=1,
+                   board: str="bitboard") -> dict[str, int]:
+    """Count leaf nodes with the subtrees spread over a pool of processes.
+
+    Parameters
+    ----------
+    fen : str
+        FEN string of the root position
+    depth : int
+        Number of plies
+    workers : int | None, optional
+        Number of processes, by default one per CPU
+    hash_entries : int, optional
+        Size of each worker's hash table in entries. 0 to turn hashing off, by default 0
+    split_depth : int, optional
+        Plies played in this process before handing subtrees to workers, by default 1
+    board : str, optional
+        Board representation (see BOARD_TYPES), by default "bitboard"
+
+    Returns
+    -------
+    dict[str, int]
+        Root move in UCI notation -> number of leaf nodes (see divide)
+    """
+    game = Chess(False, BOARD_TYPES[board])
+    game.set_FEN(fen)
+
+    split_depth = max(1, min(split_depth, depth))
+    jobs = split_positions(game, split_depth)
+
+    rtn: dict[str, int] = dict()
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(hash_entries, board)) as pool:
+        # Biggest jobs can't be known ahead of time, so just send them all and let the pool balance them
+        futures = [(pool.submit(_count_subtree, fen, depth - split_depth), roots) for fen, roots in jobs.values()]
+
+        for future, roots in futures:
+            nodes = future.result()
+            for root, lines in roots.items():
+                rtn[root] = rtn.get(root, 0) + nodes * lines
+
+    return rtn
+
+
+def divide(game: Chess, depth: int) -> dict[str, int]:
+    """Count the leaf nodes below each root move. Useful for finding where a move generator goes wrong.
+
+    Parameters
+    ----------
+    game : Chess
+        Position to search
+    depth : int
+        Number of plies (including the root move)
+
+    Returns
+    -------
+    dict[str, int]
+        Move in UCI notation -> number of leaf nodes
+    """
+    rtn: dict[str, int] = dict()
+
+    for move in game.generate_legal():
+        record = game.make(move)
+        rtn[move_to_uci(move)] = perft(game, depth - 1)
+        game.unmake_move(record)
+
+    return rtn
+
+
+def run_position(name: str, fen: str, depth: int, expected: int | None=None, board: str="bitboard",
+                 workers: int=0, hash_entries: int=0, split_depth: int=1) -> dict:
+    """Run perft on one position and time it.
+
+    Parameters
+    ----------
+    name : str
+        Name of the position
+    fen : str
+        FEN string of the position
+    depth : int
+        Number of plies
+    expected : int | None, optional
+        Known node count, by default None
+    board : str, optional
+        Board representation (see BOARD_TYPES), by default "bitboard"
+    workers : int, optional
+        Number of processes. 0 runs in this process, by default 0
+    hash_entries : int, optional
+        Size of the hash table (per process) in entries. 0 to turn hashing off, by default 0
+    split_depth : int, optional
+        Plies played before handing subtrees to workers, by default 1
+
+    Returns
+    -------
+    dict
+        Result with the name, FEN, depth, nodes, expected nodes, correctness, seconds and nodes per second
+    """
+    game = Chess(False, BOARD_TYPES[board])
+    game.set_FEN(fen)
+
+    start = perf_counter()
+    if workers > 0:
+        nodes = sum(parallel_perft(fen, depth, workers, hash_entries, split_depth, board).values())
+    elif hash_entries > 0:
+        nodes = perft_hashed(game, depth, dict(), hash_entries)
+    else:
+        nodes = perft(game, depth)
+    seconds = perf_counter() - start
+
+    return {
+        "name": name, "fen": fen, "depth": depth, "nodes": nodes, "expected": expected,
+        "correct": None if expected == None else nodes == expected,
+        "seconds": seconds, "nps": nodes / seconds if seconds > 0 else 0.0,
+        "workers": workers, "hash_entries": hash_entries,
+    }
+
+
+def run_suite(depth: int=DEFAULT_DEPTH, names: list[str] | None=None, board: str="bitboard", workers: int=0,
+              hash_entries: int=0, split_depth: int=1, output=sys.stdout) -> list[dict]:
+    """Run perft on the built in positions.
+
+    Parameters
+    ----------
+    depth : int, optional
+        Number of plies (limited to the deepest known count), by default DEFAULT_DEPTH
+    names : list[str] | None, optional
+        Names of the positions to run, by default all of them
+    board : str, optional
+        Board representation (see BOARD_TYPES), by default "bitboard"
+    workers : int, optional
+        Number of processes. 0 runs in this process, by default 0
+    hash_entries : int, optional
+        Size of the hash table (per process) in entries. 0 to turn hashing off, by default 0
+    split_depth : int, optional
+        Plies played before handing subtrees to workers, by default 1
+    output : optional
+        Stream to print progress to, None for silent, by default sys.stdout
+
+    Returns
+    -------
+    list[dict]
+        One result per position (see run_position)
+    """
+    results = list()
+
+    for name, fen, counts in POSITIONS:
+        if names and name not in names:
+            continue
+
+        d = min(depth, len(counts))
+        result = run_position(name, fen, d, counts[d-1], board, workers, hash_entries, split_depth)
+        results.append(result)
+
+        if output:
+            print(format_result(result), file=output)
+
+    return results
+
+
+def compare_baseline(results: list[dict], baseline: list[dict], tolerance: float=0.1) -> list[str]:
+    """Find positions whose speed dropped compared to a saved baseline.
+
+    Parameters
+    ----------
+    results : list[dict]
+        New results
+    baseline : list[dict]
+        Saved results
+    tolerance : float, optional
+        Allowed fractional drop in nodes per second, by default 0.1
+
+    Returns
+    -------
+    list[str]
+        A message for every regression
+    """
+    old = {(r["name"], r["depth"]): r for r in baseline}
+    regressions = list()
+
+    for result in results:
+        prev = old.get((result["name"], result["depth"]))
+        if prev and result["nps"] < prev["nps"] * (1 - tolerance):
+            regressions.append(f"{result['name']} depth {result['depth']}: {result['nps']:,.0f} nps "
+                               f"(baseline {prev['nps']:,.0f} nps, {result['nps'] / prev['nps'] - 1:+.1%})")
+
+    return regressions
+
+
+def format_result(result: dict) -> str:
+    status = {True: "OK", False: "FAIL", None: "--"}[result["correct"]]
+    return (f"{result['name']:<20} depth {result['depth']}  {result['nodes']:>12,} nodes  "
+            f"{result['seconds']:>8.3f}s  {result['nps']:>12,.0f} nps  {status}")
+
+
+def main():
+    """Perft command line interface."""
+    parser = argparse.ArgumentParser(description="Count and time the legal move tree of test positions.")
+    parser.add_argument("-d", "--depth", type=int, default=DEFAULT_DEPTH, help="number of plies")
+    parser.add_argument("-p", "--positions", nargs="+", metavar="NAME", help="built in positions to run")
+    parser.add_argument("--fen", help="run this position instead of the built in ones")
+    parser.add_argument("--divide", action="store_true", help="print the node count below each root move")
+    parser.add_argument("--board", choices=BOARD_TYPES, default="bitboard", help="board representation")
+    parser.add_argument("--json", metavar="PATH", help="write results to this file")
+    parser.add_argument("--baseline", metavar="PATH", help="compare nodes per second with saved results")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed nps drop vs. baseline (fraction)")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="number of processes (0 for none)")
+    parser.add_argument("--hash", type=int, default=0, metavar="ENTRIES", help="hash table size per process")
+    parser.add_argument("--split", type=int, default=1, metavar="PLIES", help="plies played before splitting")
+    parser.add_argument("--list", action="store_true", help="list the built in positions")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, fen, counts in POSITIONS:
+            print(f"{name:<20} {fen}  (known to depth {len(counts)})")
+        return
+
+    if args.divide:
+        fen = args.fen or POSITIONS[0][1]
+        if args.workers > 0:
+            counts = parallel_perft(fen, args.depth, args.workers, args.hash, args.split, args.board)
+        else:
+            game = Chess(False, BOARD_TYPES[args.board])
+            game.set_FEN(fen)
+            counts = divide(game, args.depth)
+        for move in sorted(counts):
+            print(f"{move}: {counts[move]}")
+        print(f"\nMoves: {len(counts)}\nNodes: {sum(counts.values())}")
+        return
+
+    if args.fen:
+        results = [run_position("fen", args.fen, args.depth, None, args.board, args.workers, args.hash, args.split)]
+        print(format_result(results[0]))
+    else:
+        results = run_suite(args.depth, args.positions, args.board, args.workers, args.hash, args.split)
+
+    nodes = sum(r["nodes"] for r in results)
+    seconds = sum(r["seconds"] for r in results)
+    print(f"\nTotal: {nodes:,} nodes in {seconds:.3f}s ({nodes / seconds if seconds else 0:,.0f} nps)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"board": args.board, "results": results}, f, indent=2)
+
+    failed = [r["name"] for r in results if r["correct"] == False]
+    if failed:
+        print("Incorrect node counts:", ", ".join(failed))
+
+    regressions = list()
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_baseline(results, json.load(f)["results"], args.tolerance)
+        for message in regressions:
+            print("Regression:", message)
+
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+# By Chris Parker
+# Alpha-beta search over Chess positions, so moves can be chosen without an external engine.
+# Iterative deepening calls a principal variation search (PVS) one ply deeper at a time, and every leaf is
+# settled by a quiescence search over captures. Results are kept in a transposition table, which cuts off
+# positions already searched deeply enough. Moves are ordered by the table's best move (or the last principal
+# variation), then captures (most valuable victim, least valuable attacker), killer moves and the history heuristic.
+# Captures that lose material by static exchange evaluation go last, and the quiescence search skips them.
+#
+# Reference
+# ---------
+# https://www.chessprogramming.org/Principal_Variation_Search
+# https://www.chessprogramming.org/Quiescence_Search
+
+import argparse
+from time import perf_counter
+from typing import Callable
+
+# Chess Imports
+from chess import BitBoard, Chess, ChessBoard
+from chess_enum import Color, Type
+from movegen import move_buffer, move_to_uci, Move, CASTLING, EN_PASSANT, FLAGS, NULL_MOVE, PROMOTION
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+INFINITE = 32000
+MATE = 30000 # Score of mate at the root. Mate in n plies scores MATE - n
+MAX_PLY = 64
+
+PROMOTION_VALUES = (320, 330, 500, 900) # By promotion code (see movegen.CODE_PROMOTIONS)
+TYPE_VALUES = {Type.PAWN: 100, Type.KNIGHT: 320, Type.BISHOP: 330, Type.ROOK: 500, Type.QUEEN: 900, Type.KING: 0}
+
+BOARD_TYPES = {"bitboard": BitBoard, "mailbox": ChessBoard}
+
+BENCH_FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+]
+
+# Move ordering scores
+_PV_SCORE = 1 << 30
+_CAPTURE_SCORE = 1 << 20
+_KILLER_SCORE = 1 << 19
+_LOSING_SCORE = -(1 << 20) # Plus the (negative) exchange value
+
+
+def score_to_tt(score: int, ply: int) -> int:
+    """Make a mate score relative to the position instead of the root, so it can be stored."""
+    if score >= MATE - MAX_PLY:
+        return score + ply
+    if score <= -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int) -> int:
+    """Make a stored mate score relative to the root again (the inverse of score_to_tt)."""
+    if score >= MATE - MAX_PLY:
+        return score - ply
+    if score <= -MATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+class SearchLimits:
+    """When to stop searching. Limits left as None are not used."""
+    def __init__(self, depth: int | None=None, nodes: int | None=None, movetime: float | None=None) -> None:
+        """Construct new limits.
+
+        Parameters
+        ----------
+        depth : int | None, optional
+            Deepest iteration in plies, by default None
+        nodes : int | None, optional
+            Most nodes to search, by default None
+        movetime : float | None, optional
+            Most seconds to search, by default None
+        """
+        self.depth = depth
+        self.nodes = nodes
+        self.movetime = movetime
+
+
+class SearchInfo:
+    """Progress of a search, reported after every finished iteration."""
+    def __init__(self, depth: int, score: int, nodes: int, seconds: float, pv: list[Move],
+                 hashfull: int | None=None) -> None:
+        self.depth = depth
+        self.score = score # Centipawns from the side to move's point of view
+        self.nodes = nodes
+        self.seconds = seconds
+        self.pv = pv # Principal variation
+        self.hashfull = hashfull # Permille of the transposition table in use
+
+    @property
+    def nps(self) -> int:
+        return int(self.nodes / self.seconds) if self.seconds > 0 else 0
+
+    @property
+    def mate(self) -> int | None:
+        """Moves until mate (negative if the side to move is being mated), or None."""
+        if abs(self.score) < MATE - MAX_PLY:
+            return None
+        plies = MATE - abs(self.score)
+        return (plies + 1) // 2 if self.score > 0 else -(plies // 2)
+
+    def __str__(self) -> str:
+        """UCI `info` line."""
+        score = f"mate {self.mate}" if self.mate != None else f"cp {self.score}"
+        hashfull = f" hashfull {self.hashfull}" if self.hashfull != None else ""
+        return (f"info depth {self.depth} score {score} nodes {self.nodes} nps {self.nps}{hashfull} "
+                f"time {int(self.seconds * 1000)} pv {' '.join(move_to_uci(move) for move in self.pv)}")
+
+
+class Searcher:
+    """Search a game's position for the best move. The game is back in the same position afterwards."""
+    CHECK_EVERY = 1024 # Nodes between limit checks
+
+    def __init__(self, game: Chess, report: Callable[[SearchInfo], None] | None=None,
+                 tt: TranspositionTable | None=None) -> None:
+        """Construct a new Searcher.
+
+        Parameters
+        ----------
+        game : Chess
+            Game to search. Its board should be a BitBoard for speed
+        report : Callable[[SearchInfo], None] | None, optional
+            Called after every finished iteration, by default None
+        tt : TranspositionTable | None, optional
+            Transposition table, kept between searches. By default a new 16 MB table
+        """
+        self.game = game
+        self.report = report
+        self.tt = tt if tt != None else TranspositionTable()
+
+        self.nodes = 0
+        self.stopped = False
+        self.limits = SearchLimits()
+        self._start = 0.0
+
+        self._buffers = [move_buffer() for _ in range(MAX_PLY + 1)] # Move list per ply
+        self._pv: list[list[Move]] = [[] for _ in range(MAX_PLY + 1)] # Principal variation from each ply
+        self._last_pv: list[Move] = list() # Principal variation of the last finished iteration
+        self._killers = [[NULL_MOVE, NULL_MOVE] for _ in range(MAX_PLY + 1)] # Quiet moves that caused cutoffs
+        self._history = [0] * 4096 # From/to square -> cutoff score of quiet moves
+        self._keys: list[int] = list() # Zobrist keys of the game and the current search line
+        self.history: list[int] | None = None # Keys of the positions played, if not from game.game_states
+
+    def stop(self) -> None:
+        """Stop the search as soon as possible (e.g., from another thread)."""
+        self.stopped = True
+
+    def search(self, limits: SearchLimits, start_depth: int=1) -> tuple[Move, int]:
+        """Search with iterative deepening until a limit is reached.
+
+        Parameters
+        ----------
+        limits : SearchLimits
+            When to stop. With no limits the search goes to MAX_PLY
+        start_depth : int, optional
+            Depth of the first iteration, by default 1
+
+        Returns
+        -------
+        tuple[Move, int]
+            Best move (NULL_MOVE if there are no legal moves) and its score
+        """
+        game = self.game
+        self.limits = limits
+        self.nodes = 0
+        self.stopped = False
+        self._start = perf_counter()
+        self._last_pv = list()
+        self._killers = [[NULL_MOVE, NULL_MOVE] for _ in range(MAX_PLY + 1)]
+        self._history = [0] * 4096
+        self.tt.new_search()
+
+        states = game.game_states
+        if self.history != None:
+            self._keys = list(self.history)
+        elif states != None: # Positions already played count for repetitions
+            self._keys = [states.keys[node] for node in states.path(states.current)]
+        else:
+            self._keys = [game.zobrist]
+
+        moves = game.generate_legal()
+        if not moves:
+            turn = Color.WHITE if game.white_turn else Color.BLACK
+            return NULL_MOVE, (-MATE if game.in_check(turn) else 0)
+
+        best, score = moves[0], 0
+        max_depth = min(limits.depth or MAX_PLY, MAX_PLY)
+        for depth in range(min(start_depth, max_depth), max_depth + 1):
+            self._pv[0] = list()
+            result = self._pvs(depth, -INFINITE, INFINITE, 0)
+
+            if self.stopped:
+                if self._pv[0]: # Moves finished in this iteration are still better than the last best
+                    best = self._pv[0][0]
+                break
+
+            best, score = self._pv[0][0], result
+            self._last_pv = self._pv[0]
+            if self.report:
+                self.report(SearchInfo(depth, score, self.nodes, perf_counter() - self._start, self._last_pv,
+                                       self.tt.hashfull()))
+
+            if abs(score) >= MATE - depth: # Found a forced mate, going deeper won't change it
+                break
+            if limits.movetime != None and perf_counter() - self._start > limits.movetime / 2:
+                break # The next iteration won't finish in time
+
+        return best, score
+
+    def _check_limits(self) -> None:
+        limits = self.limits
+        if limits.nodes != None and self.nodes >= limits.nodes:
+            self.stopped = True
+        elif limits.movetime != None and perf_counter() - self._start >= limits.movetime:
+            self.stopped = True
+
+    def _is_draw(self) -> bool:
+        """Fifty move rule or a position repeated since the last capture or pawn move."""
+        half_move = self.game.half_move
+        if half_move >= 100:
+            return True
+
+        keys = self._keys
+        return keys[-1] in keys[-half_move-1:-1]
+
+    def _pvs(self, depth: int, alpha: int, beta: int, ply: int) -> int:
+        """Principal variation search. Returns the score from the side to move's point of view."""
+        game = self.game
+        self._pv[ply] = list()
+
+        if ply and self._is_draw():
+            return 0
+
+        turn = Color.WHITE if game.white_turn else Color.BLACK
+        in_check = game.in_check(turn)
+        if in_check and ply < MAX_PLY: # Check extension
+            depth += 1
+
+        if depth <= 0 or ply >= MAX_PLY:
+            return self._quiesce(alpha, beta, ply)
+
+        self.nodes += 1
+        if self.nodes % self.CHECK_EVERY == 0:
+            self._check_limits()
+        if self.stopped:
+            return 0
+
+        key = game.zobrist
+        entry = self.tt.probe(key)
+        tt_move = NULL_MOVE
+        if entry != None:
+            tt_move, tt_score, tt_depth, bound = entry
+            if ply and beta - alpha == 1 and tt_depth >= depth: # Only cut off outside the principal variation
+                tt_score = score_from_tt(tt_score, ply)
+                if bound == EXACT or (bound == LOWER and tt_score >= beta) or (bound == UPPER and tt_score <= alpha):
+                    return tt_score
+
+        moves = game.generate_legal(moves=self._buffers[ply])
+        if not moves:
+            return -MATE + ply if in_check else 0
+
+        pv_move = tt_move
+        if ply < len(self._last_pv) and (not pv_move or ply == 0):
+            pv_move = self._last_pv[ply]
+        old_alpha = alpha
+        best = -INFINITE
+        best_move = NULL_MOVE
+        for i, move in enumerate(self._order(moves, ply, pv_move)):
+            board = game.board
+            quiet = move & FLAGS not in (PROMOTION, EN_PASSANT) and (move & FLAGS == CASTLING or
+                                                                    board.piece_at(move >> 6 & 63) == None)
+
+            record = game.make(move)
+            self._keys.append(game.zobrist)
+
+            if i == 0:
+                score = -self._pvs(depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Late quiet moves are searched less deeply first
+                reduction = 1 if i >= 3 and depth >= 3 and quiet and not in_check else 0
+                score = -self._pvs(depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                if alpha < score and not self.stopped: # Null window failed, search again fully
+                    score = -self._pvs(depth - 1, -beta, -alpha, ply + 1)
+
+            self._keys.pop()
+            game.unmake_move(record)
+            if self.stopped:
+                return 0
+
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    best_move = move
+                    self._pv[ply] = [move] + self._pv[ply + 1]
+                    if score >= beta:
+                        if quiet:
+                            killers = self._killers[ply]
+                            if killers[0] != move:
+                                killers[1], killers[0] = killers[0], move
+                            self._history[move & 4095] += depth * depth
+                        break
+
+        bound = LOWER if best >= beta else EXACT if best > old_alpha else UPPER
+        self.tt.store(key, depth, bound, score_to_tt(best, ply), best_move)
+        return best
+
+    def _quiesce(self, alpha: int, beta: int, ply: int) -> int:
+        """Search captures until the position is quiet. Returns the score from the side to move's point of view."""
+        game = self.game
+
+        self.nodes += 1
+        if self.nodes % self.CHECK_EVERY == 0:
+            self._check_limits()
+        if self.stopped:
+            return 0
+
+        best = game.evaluate() # Standing pat, the side to move doesn't have to capture
+        if best >= beta or ply >= MAX_PLY:
+            return best
+        if best > alpha:
+            alpha = best
+
+        moves = game.generate_legal(moves=self._buffers[ply], captures=True)
+        for move in self._order(moves, ply, NULL_MOVE, True):
+            record = game.make(move)
+            score = -self._quiesce(-beta, -alpha, ply + 1)
+            game.unmake_move(record)
+            if self.stopped:
+                return 0
+
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if score >= beta:
+                        break
+
+        return best
+
+    def _order(self, moves, ply: int, pv_move: Move, skip_losing: bool=False) -> list[Move]:
+        """Sort moves so the ones most likely to cause a cutoff come first. Captures that lose material go last,
+        or are left out with `skip_losing`."""
+        game = self.game
+        board = game.board
+        killers = self._killers[ply]
+        history = self._history
+
+        scores: list[int] = list()
+        kept: list[Move] = list()
+        for move in moves:
+            flags = move & FLAGS
+            if move == pv_move:
+                score = _PV_SCORE
+            elif flags == EN_PASSANT:
+                score = _CAPTURE_SCORE + 10 * 100 - 100
+            else:
+                victim = board.piece_at(move >> 6 & 63) if flags != CASTLING else None
+                if victim:
+                    attacker = board.piece_at(move & 63)
+                    score = _CAPTURE_SCORE + 10 * TYPE_VALUES[victim.type] - TYPE_VALUES[attacker.type]
+                    if flags == PROMOTION:
+                        score += PROMOTION_VALUES[move >> 12 & 3]
+                    elif TYPE_VALUES[attacker.type] > TYPE_VALUES[victim.type]: # Might lose material
+                        exchange = game.static_exchange(move)
+                        if exchange < 0:
+                            if skip_losing:
+                                continue
+                            score = _LOSING_SCORE + exchange
+                elif flags == PROMOTION:
+                    score = _CAPTURE_SCORE + PROMOTION_VALUES[move >> 12 & 3]
+                elif move == killers[0]:
+                    score = _KILLER_SCORE + 1
+                elif move == killers[1]:
+                    score = _KILLER_SCORE
+                else:
+                    score = history[move & 4095]
+            scores.append(score)
+            kept.append(move)
+
+        return [move for _, move in sorted(zip(scores, kept), reverse=True)]
+
+
+def search(game: Chess, depth: int | None=None, nodes: int | None=None, movetime: float | None=None,
+           report: Callable[[SearchInfo], None] | None=None, tt: TranspositionTable | None=None) -> tuple[Move, int]:
+    """Search a position and return the best move and its score (see Searcher.search)."""
+    return Searcher(game, report, tt).search(SearchLimits(depth, nodes, movetime))
+
+
+def bench_evaluation(board_type: type[ChessBoard], count: int=2000) -> None:
+    """Print the cost of evaluating each benchmark position, and of making and taking back its moves."""
+    for fen in BENCH_FENS:
+        game = Chess(False, board_type)
+        game.set_FEN(fen)
+        moves = list(game.generate_legal())
+
+        start = perf_counter()
+        for _ in range(count):
+            game.evaluate()
+        per_eval = (perf_counter() - start) / count
+
+        start = perf_counter()
+        for _ in range(count // len(moves) + 1):
+            for move in moves:
+                game.unmake_move(game.make(move))
+        per_move = (perf_counter() - start) / ((count // len(moves) + 1) * len(moves))
+
+        print(f"{per_eval * 1e6:7.1f} us/eval {per_move * 1e6:7.1f} us/make+unmake  {fen}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search a position with the built-in engine.")
+    parser.add_argument("--fen", help="FEN string of the position (default: start position)")
+    parser.add_argument("-d", "--depth", type=int, help="Deepest iteration in plies")
+    parser.add_argument("-n", "--nodes", type=int, help="Most nodes to search")
+    parser.add_argument("-t", "--movetime", type=float, help="Most seconds to search")
+    parser.add_argument("--hash", type=float, default=16, help="Transposition table size in MB (default: 16)")
+    parser.add_argument("--board", choices=BOARD_TYPES, default="bitboard", help="Board representation")
+    parser.add_argument("--bench-eval", action="store_true", help="Time the evaluation on the benchmark positions")
+    args = parser.parse_args()
+
+    if args.bench_eval:
+        bench_evaluation(BOARD_TYPES[args.board])
+        return
+
+    game = Chess(False, BOARD_TYPES[args.board])
+    if args.fen:
+        game.set_FEN(args.fen)
+
+    depth = args.depth
+    if depth == None and args.nodes == None and args.movetime == None:
+        depth = 5
+
+    tt = TranspositionTable(args.hash)
+    move, _ = search(game, depth, args.nodes, args.movetime, print, tt)
+    print("info string tt", " ".join(f"{name} {count}" for name, count in tt.stats().items()))
+    print("bestmove", move_to_uci(move) if move != NULL_MOVE else "(none)")
+
+
+if __name__ == "__main__":
+    main()
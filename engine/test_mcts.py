@@ -0,0 +1,31 @@
+# By Chris Parker
+# Tests for mcts.py. Run with `python -m pytest` from this folder.
+
+import pytest
+
+pytest.importorskip("numpy")
+
+# Chess Imports
+from chess import BitBoard, Chess, ChessBoard
+from mcts import MCTS
+from search import SearchLimits
+
+FENS = [None, "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"]
+
+
+def _root(board_type: type, fen: str | None) -> dict:
+    """Search a position and return the visits and value of each root move."""
+    game = Chess(False, board_type)
+    if fen:
+        game.set_FEN(fen)
+
+    mcts = MCTS(game, batch_size=16)
+    mcts.search(SearchLimits(nodes=300))
+    return {child.move: (child.visits, round(child.value, 9)) for child in mcts.root.children}
+
+
+@pytest.mark.parametrize("fen", FENS)
+def test_boards_give_same_values(fen):
+    bit = _root(BitBoard, fen)
+    assert bit == _root(ChessBoard, fen)
+    assert len({value / visits for visits, value in bit.values() if visits}) > 1
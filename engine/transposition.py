@@ -0,0 +1,162 @@
+# By Chris Parker
+# Transposition table. A fixed number of buckets stored in one preallocated array of 64 bit words, indexed by the
+# low bits of a position's Zobrist key. Each bucket has a depth-preferred slot, which keeps the deepest
+# result from the current search, and an always-replace slot, which takes everything else.
+#
+# A slot is two words: (key XOR data, data). A slot whose words were written by different processes at the
+# same time no longer XORs back to its key, so it just misses (lockless hashing). That lets the table live
+# in shared memory (see the `buffer` argument).
+#
+# Reference
+# ---------
+# https://www.chessprogramming.org/Transposition_Table
+# https://www.chessprogramming.org/Shared_Hash_Table#Lockless
+
+from array import array
+
+# Bound types
+EXACT = 1 # Score is exact
+LOWER = 2 # Score is at least this much (failed high)
+UPPER = 3 # Score is at most this much (failed low)
+
+ENTRY_BYTES = 16 # Two 64 bit words
+BUCKET_SIZE = 2 # Depth-preferred slot, then always-replace slot
+BUCKET_BYTES = ENTRY_BYTES * BUCKET_SIZE
+
+# Data word layout: move (bits 0-15), score + 32768 (bits 16-31), depth (bits 32-39), bound (bits 40-41),
+# age (bits 42-49)
+_SCORE_OFFSET = 1 << 15
+_KEY_MASK = 0xFFFFFFFFFFFFFFFF
+
+
+def table_bytes(mb: float) -> int:
+    """Return the number of bytes a table of `mb` megabytes really uses (a power of two number of buckets)."""
+    buckets = max(1, int(mb * (1 << 20)) // BUCKET_BYTES)
+    return (1 << (buckets.bit_length() - 1)) * BUCKET_BYTES
+
+
+class TranspositionTable:
+    """Fixed size hash table of search results keyed by 64 bit Zobrist keys."""
+    def __init__(self, mb: float=16, buffer=None) -> None:
+        """Construct a new, empty table.
+
+        Parameters
+        ----------
+        mb : float, optional
+            Size in megabytes, like the UCI `Hash` option. Rounded down to a power of two number of buckets,
+            by default 16
+        buffer : Any, optional
+            Writable buffer of at least table_bytes(mb) bytes to keep the table in (e.g., the `buf` of a
+            multiprocessing.shared_memory.SharedMemory). It is not cleared. By default a new array
+        """
+        self.mb = mb
+        self.nbytes = table_bytes(mb)
+        self.buckets = self.nbytes // BUCKET_BYTES
+        self._mask = self.buckets - 1
+
+        if buffer == None:
+            self.table = array('Q', bytes(self.nbytes))
+        else:
+            self.table = memoryview(buffer)[:self.nbytes].cast('Q')
+
+        self.age = 0 # Increased every search so old entries can be replaced first
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0 # Stores that replaced an entry for a different position
+
+    def probe(self, key: int) -> tuple[int, int, int, int] | None:
+        """Look a position up.
+
+        Parameters
+        ----------
+        key : int
+            Zobrist key
+
+        Returns
+        -------
+        tuple[int, int, int, int] | None
+            (best move, score, depth, bound) or None if the position isn't stored
+        """
+        table = self.table
+        i = (key & self._mask) * 4 # Word index of the bucket
+
+        for slot in (i, i + 2):
+            data = table[slot + 1]
+            if table[slot] ^ data == key and data:
+                self.hits += 1
+                return (data & 0xFFFF, (data >> 16 & 0xFFFF) - _SCORE_OFFSET, data >> 32 & 0xFF,
+                        data >> 40 & 3)
+
+        self.misses += 1
+        return None
+
+    def store(self, key: int, depth: int, bound: int, score: int, move: int) -> None:
+        """Save a search result.
+
+        Parameters
+        ----------
+        key : int
+            Zobrist key
+        depth : int
+            Remaining depth the position was searched to
+        bound : int
+            EXACT, LOWER or UPPER
+        score : int
+            Score from the side to move's point of view
+        move : int
+            Best move found (0 for none, which keeps a move already stored for the position)
+        """
+        table = self.table
+        i = (key & self._mask) * 4
+
+        # The depth-preferred slot takes the result if it is as deep, or the slot holds this position,
+        # an empty entry or an entry from an older search. Otherwise the always-replace slot does
+        data = table[i + 1]
+        old_key = table[i] ^ data
+        if data and old_key != key and data >> 32 & 0xFF > depth and data >> 42 & 0xFF == self.age:
+            i += 2
+            data = table[i + 1]
+            old_key = table[i] ^ data
+
+        if old_key == key and data:
+            if not move:
+                move = data & 0xFFFF
+        elif data:
+            self.overwrites += 1
+
+        data = (move | (score + _SCORE_OFFSET) << 16 | min(max(depth, 0), 0xFF) << 32 | bound << 40 |
+                self.age << 42)
+        table[i] = (key ^ data) & _KEY_MASK
+        table[i + 1] = data
+        self.stores += 1
+
+    def new_search(self) -> None:
+        """Start a new search. Entries from earlier searches are replaced first."""
+        self.age = (self.age + 1) & 0xFF
+
+    def clear(self) -> None:
+        """Remove every entry and reset the statistics."""
+        self.table[:] = array('Q', bytes(self.nbytes))
+
+        self.age = 0
+        self.hits = self.misses = self.stores = self.overwrites = 0
+
+    def release(self) -> None:
+        """Stop using an external buffer, so its owner can close it. The table can't be used afterwards."""
+        if isinstance(self.table, memoryview):
+            self.table.release()
+
+    def hashfull(self) -> int:
+        """Permille of the first 1000 slots holding an entry from the current search (UCI `hashfull`)."""
+        table = self.table
+        slots = min(1000, self.buckets * BUCKET_SIZE)
+        used = sum(1 for slot in range(slots) if table[slot*2 + 1] and table[slot*2 + 1] >> 42 & 0xFF == self.age)
+
+        return used * 1000 // slots
+
+    def stats(self) -> dict[str, int]:
+        """Return the hit, miss, store and overwrite counters."""
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores, "overwrites": self.overwrites}
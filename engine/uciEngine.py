@@ -5,7 +5,7 @@ from exceptions import InvalidEngineError
 
 # Subprocess
 from subprocess import PIPE, STDOUT, Popen
-from time import sleep
+from time import perf_counter
 
 # Type hinting
 from typing import Any, Iterable, List, Union
@@ -14,6 +14,12 @@ from os import PathLike
 # Reader
 from pythonutil.nbreader import NonBlockingStreamReader as NBSR
 
+# Parser
+from uciParser import UCIParser
+
+# Logging
+from uciLog import LogWriter, RECEIVED, SENT, SessionLog
+
 
 class UCIEngine:
     """Provides functions for interacting with a universal chess interface (UCI) compatible chess engine.
@@ -25,6 +31,12 @@ class UCIEngine:
     BrokenPipeError
         If there are problems with the programs stdin or stdout
     """
+    HANDSHAKE_TIMEOUT = 10.0 # Seconds to wait for `uciok`
+    READY_TIMEOUT = 10.0 # Seconds to wait for `readyok`
+    POLL_INTERVAL = 0.1 # Longest wait between checks that the engine is still running
+    LOG_LINES = 10_000 # Most lines kept in each of inLog and outLog, None for no limit
+    LOG_BYTES = None # Most characters kept in each of inLog and outLog, None for no limit
+
     def __init__(self, enginePath: Union[str, PathLike], *boolOpts: str, **options: Union[str, int]):
         """Construct new `UCIEngine`.
 
@@ -47,22 +59,22 @@ class UCIEngine:
         """
 
         self.path = enginePath
-        self.inLog = []
-        self.outLog = []
+        self.logWriter: Union[LogWriter, None] = None
+        self.inLog = SessionLog(SENT, self.LOG_LINES, self.LOG_BYTES) # Newest commands sent
+        self.outLog = SessionLog(RECEIVED, self.LOG_LINES, self.LOG_BYTES) # Newest lines received
         self.debugOn = False
+        self._pending = [] # Lines read while waiting for a line that hasn't arrived yet, see wait_for()
+        self._scoreAt = -1 # Index in _pending of the newest `info` line with a score, -1 if none
+        self.parser: Union[UCIParser, None] = None # Gets every line read, if set
 
         # Starting engine
         self.eng = Popen(self.path, stdout=PIPE, stdin=PIPE, text=True)
-        sleep(0.01)
 
         # Starting reader
         self.reader = NBSR(self.eng.stdout)
-        sleep(0.01)
 
         self.send_command("uci") # Telling engine to use uci protocol
-        sleep(0.5)
-
-        if self._read_lines()[-1] != "uciok\n":
+        if self.wait_for("uciok", self.HANDSHAKE_TIMEOUT) == None:
             raise InvalidEngineError(self.path)
             
         # Setting options
@@ -74,12 +86,8 @@ class UCIEngine:
 
         # Checking if engine is ready
         # NOTE: Required to start searches
-        self.is_ready()
-
-        sleep(0.1)
-
-        # self._print_lines()
-        self._flush_out()  # Clears stdout
+        if not self.is_ready():
+            raise InvalidEngineError(self.path, "Engine did not answer `isready`.")
 
 
     # Printing info
@@ -136,8 +144,14 @@ class UCIEngine:
         """Stop search by sending `stop` command."""
         self.send_command("stop")
 
-    def is_ready(self) -> bool:
-        """Send `isready` command and return a boolean
+    def is_ready(self, timeout: Union[float, None]=None) -> bool:
+        """Send `isready` command and wait for `readyok`. Unread output is discarded first, including the lines kept
+        by a wait_for() that timed out (they are still in outLog).
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Most seconds to wait, by default READY_TIMEOUT
 
         Returns
         -------
@@ -146,11 +160,73 @@ class UCIEngine:
         """
         self._read_lines()
         self.send_command("isready")
-        sleep(0.125)
-        if self._read_line() == "readyok":
-            return True
-        else: 
-            return False 
+
+        return self.wait_for("readyok", self.READY_TIMEOUT if timeout == None else timeout) != None
+
+    def wait_best_move(self, timeout: Union[float, None]=None) -> Union[str, None]:
+        """Wait for the `bestmove` line of a search started with `go`.
+
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Most seconds to wait. Waits until the engine answers or exits if None, by default None
+
+        Returns
+        -------
+        str | None
+            The best move (e.g. `e2e4`) or None if it didn't arrive in time
+        """
+        lines = self.wait_for("bestmove", timeout)
+        if lines == None:
+            return None
+
+        words = lines[-1].split()
+        return words[1] if len(words) > 1 else None
+
+    def wait_for(self, token: str, timeout: Union[float, None]=None) -> Union[List[str], None]:
+        """Read lines until one starts with `token`. Returns as soon as it arrives.
+
+        Parameters
+        ----------
+        token : str
+            First word of the line to wait for.
+            Ex. `readyok`
+        timeout : float | None, optional
+            Most seconds to wait. Waits until the line arrives or the engine exits if None, by default None
+
+        Returns
+        -------
+        List[str] | None
+            Every line read, the last being the one starting with `token`, or None if it didn't arrive in time.
+            Of the `info` lines only the newest one with a score is kept, the others are only in outLog and given to
+            the parser. After a timeout the lines are kept for the next wait_for() or _read_lines()
+        """
+        end = perf_counter() + timeout if timeout != None else None
+        while True:
+            wait = self.POLL_INTERVAL
+            if end != None:
+                wait = min(wait, end - perf_counter())
+                if wait <= 0:
+                    return None
+
+            x = self._read_line(wait)
+            if x:
+                words = x.split()
+                if words and words[0] == "info" and token != "info":
+                    if "score" not in words:
+                        continue
+                    if self._scoreAt >= 0: # Only the newest score is kept, so a long search doesn't pile up
+                        del self._pending[self._scoreAt]
+                    self._scoreAt = len(self._pending)
+
+                self._pending.append(x)
+                if words and words[0] == token:
+                    lines = self._pending
+                    self._pending = []
+                    self._scoreAt = -1
+                    return lines
+            elif self.eng.poll() != None: # Engine exited, nothing more is coming
+                return None
 
     def debug(self) -> bool:
         """Toggle debug mode by sending `debug on` or `debug off`.
@@ -256,13 +332,18 @@ class UCIEngine:
 
     # Reading from engine stdout
 
-    def _read_line(self) -> str:
+    def _read_line(self, timeout: Union[float, None]=None) -> str:
         """Read one line from the reader.
 
+        Parameters
+        ----------
+        timeout : float | None, optional
+            Most seconds to wait for a line. Doesn't wait if None, by default None
+
         Returns
         -------
         str
-            The line read
+            The line read (None if there wasn't one)
 
         Raises
         ------
@@ -272,9 +353,11 @@ class UCIEngine:
         if not self.eng.stdout:
             raise BrokenPipeError
 
-        x = self.reader.readline()
+        x = self.reader.readline(timeout)
         if x: 
             self.outLog.append(x)
+            if self.parser != None:
+                self.parser.feed(x)
         return x
 
     def _read_lines(self, buffer: int=-1) -> List[str]:
@@ -290,7 +373,9 @@ class UCIEngine:
         List[str]
             List of every line read
         """
-        rtn = []
+        rtn = self._pending # Lines a timed out wait_for() kept come first
+        self._pending = []
+        self._scoreAt = -1
         
         if buffer <= 0:
             x = self._read_line()
@@ -339,6 +424,8 @@ class UCIEngine:
         for item in seq:
             rtn += str(item) + " "
 
+        return rtn.strip()
+
     def _write_logs_to_file(self, logPath: Union[str, PathLike]) -> None:
         """Write input and output logs to a file.
 
@@ -364,6 +451,27 @@ class UCIEngine:
         f.close()
 
 
+    def log_to_file(self, logPath: Union[str, PathLike], maxBytes: int=1 << 20, backups: int=3) -> None:
+        """Stream every line sent and received to rotating log files from a background thread.
+        Lines are written with a timestamp and `>` (sent) or `<` (received).
+
+        Parameters
+        ----------
+        logPath : str | PathLike
+            Path of the log file. Appended to if it exists.
+        maxBytes : int, optional
+            Size a file is rotated at, by default 1 MB
+        backups : int, optional
+            Old files kept (`logPath.1`, `logPath.2`, ...), by default 3
+        """
+        if self.logWriter != None:
+            self.logWriter.close()
+
+        self.logWriter = LogWriter(logPath, maxBytes, backups)
+        self.inLog.writer = self.logWriter
+        self.outLog.writer = self.logWriter
+
+
     # Stoping engine
 
     def close(self, logPath: Union[str, PathLike]="") -> None:
@@ -382,6 +490,11 @@ class UCIEngine:
 
     def __del__(self) -> None:
         """Stop the engine fully and kill process"""
+        if self.logWriter != None:
+            self.inLog.writer = self.outLog.writer = None
+            self.logWriter.close()
+            self.logWriter = None
+
         self.send_command("quit")
         self.eng.kill()
 
@@ -398,8 +511,12 @@ class Stockfish(UCIEngine):
     def display_board(self) -> None:
         """Display the board using the `d` Stockfish command."""
         self.send_command("d")
-        sleep(0.1)
-        self.print_lines()
+        self.send_command("isready") # `readyok` comes after the whole board
+        lines = self.wait_for("readyok", self.READY_TIMEOUT) or self._read_lines()
+
+        for line in lines:
+            if line.strip() != "readyok":
+                print(line, end="")
 
 
 
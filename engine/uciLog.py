@@ -0,0 +1,169 @@
+# By Chris Parker
+# Bounded logging for UCI sessions. A SessionLog keeps only the newest lines sent or received (a ring buffer
+# limited by line count and/or size), so a long session doesn't use more and more memory. A LogWriter streams every
+# line to rotating files from a background thread, with a timestamp and a direction marker, so writing never
+# blocks talking to the engine.
+
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from os import PathLike
+from queue import Queue
+from time import time
+
+# Type hinting
+from typing import Iterator, Union
+
+SENT = ">" # Marker of lines sent to the engine
+RECEIVED = "<" # Marker of lines read from the engine
+
+
+class LogWriter:
+    """Writes log lines to a file from a background thread, rotating it when it gets too big.
+
+    The file `path` is written until it reaches `maxBytes`, then it becomes `path.1` (the older ones `path.2`, ...)
+    and a new `path` is started. Only `backups` old files are kept.
+    """
+    def __init__(self, path: Union[str, PathLike], maxBytes: int=1 << 20, backups: int=3) -> None:
+        """Construct new `LogWriter` and start its thread.
+
+        Parameters
+        ----------
+        path : str | PathLike
+            Path of the log file
+        maxBytes : int, optional
+            Size a file is rotated at, by default 1 MB
+        backups : int, optional
+            Old files kept, by default 3
+        """
+        self.path = os.fspath(path)
+        self.maxBytes = maxBytes
+        self.backups = backups
+
+        self._queue: Queue = Queue()
+        self._file = open(self.path, "a")
+        self._size = self._file.tell()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, direction: str, line: str, timestamp: Union[float, None]=None) -> None:
+        """Queue a line to be written. Doesn't wait for the file.
+
+        Parameters
+        ----------
+        direction : str
+            SENT or RECEIVED
+        line : str
+            The line (a trailing newline is removed)
+        timestamp : float | None, optional
+            Seconds since the epoch, by default now
+        """
+        self._queue.put((time() if timestamp == None else timestamp, direction, line))
+
+    def close(self) -> None:
+        """Write the queued lines and close the file."""
+        if self._thread == None:
+            return
+
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+
+    def _run(self) -> None:
+        """Writer thread. Writes everything queued, flushing when the queue is empty."""
+        while True:
+            entry = self._queue.get()
+            if entry == None:
+                break
+
+            timestamp, direction, line = entry
+            text = f"{datetime.fromtimestamp(timestamp).isoformat(timespec='milliseconds')} {direction} " \
+                   f"{line.rstrip(chr(10))}\n"
+            if self._size + len(text) > self.maxBytes and self._size > 0:
+                self._rotate()
+            self._file.write(text)
+            self._size += len(text)
+
+            if self._queue.empty():
+                self._file.flush()
+
+        self._file.flush()
+
+    def _rotate(self) -> None:
+        """Move path to path.1, path.1 to path.2, ... and start a new file."""
+        self._file.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+        self._file = open(self.path, "w")
+        self._size = 0
+
+
+class SessionLog:
+    """The newest lines sent or received, bounded by line count and/or size. Used like a list of lines."""
+    def __init__(self, direction: str, maxLines: Union[int, None]=10_000, maxBytes: Union[int, None]=None,
+                 writer: Union[LogWriter, None]=None) -> None:
+        """Construct new `SessionLog`.
+
+        Parameters
+        ----------
+        direction : str
+            SENT or RECEIVED, the marker given to the writer
+        maxLines : int | None, optional
+            Most lines kept, None for no limit, by default 10_000
+        maxBytes : int | None, optional
+            Most characters kept, None for no limit, by default None
+        writer : LogWriter | None, optional
+            Also gets every line, by default None
+        """
+        self.direction = direction
+        self.maxBytes = maxBytes
+        self.writer = writer
+        self.dropped = 0 # Lines removed to stay in bounds
+
+        self._lines: deque = deque(maxlen=maxLines)
+        self._bytes = 0
+
+    def append(self, line: str) -> None:
+        lines = self._lines
+        if len(lines) == lines.maxlen:
+            self._bytes -= len(lines[0])
+            self.dropped += 1
+        lines.append(line)
+        self._bytes += len(line)
+
+        if self.maxBytes != None:
+            while self._bytes > self.maxBytes and len(lines) > 1:
+                self._bytes -= len(lines.popleft())
+                self.dropped += 1
+
+        if self.writer != None:
+            self.writer.write(self.direction, line)
+
+    def clear(self) -> None:
+        self._lines.clear()
+        self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        """Characters kept."""
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._lines)
+
+    def __getitem__(self, index: int) -> str:
+        return self._lines[index]
+
+    def __repr__(self) -> str:
+        return repr(list(self._lines))
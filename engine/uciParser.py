@@ -0,0 +1,297 @@
+# By Chris Parker
+# Parser for the output of UCI engines. Turns `info`, `bestmove` and `option` lines into records as they are read
+# and hands them to subscribers, as callbacks or by iteration. In "latest only" mode `info` records are
+# coalesced (only the newest one per PV line is kept) until they are taken, so a slow consumer like the GUI
+# only ever sees the current state of the search instead of falling behind.
+#
+# Reference
+# ---------
+# https://backscattering.de/chess/uci/ (UCI protocol)
+
+import threading
+from collections import deque
+
+# Type hinting
+from typing import Callable, Iterator, List, Union
+
+# Integer fields of `info` lines
+_INFO_INTS = {"depth", "seldepth", "multipv", "nodes", "nps", "time", "hashfull", "tbhits", "cpuload",
+              "currmovenumber", "sbhits"}
+# Keywords of `option` lines
+_OPTION_WORDS = {"name", "type", "default", "min", "max", "var"}
+
+
+class InfoRecord:
+    """An `info` line. Fields the engine didn't send are None."""
+    def __init__(self) -> None:
+        self.depth: Union[int, None] = None
+        self.seldepth: Union[int, None] = None
+        self.multipv: Union[int, None] = None
+        self.cp: Union[int, None] = None # Score in centipawns from the engine's point of view
+        self.mate: Union[int, None] = None # Moves to mate, negative if the engine is being mated
+        self.bound: Union[str, None] = None # `lowerbound` or `upperbound` if the score is only a bound
+        self.nodes: Union[int, None] = None
+        self.nps: Union[int, None] = None
+        self.time: Union[int, None] = None # Milliseconds
+        self.hashfull: Union[int, None] = None
+        self.tbhits: Union[int, None] = None
+        self.cpuload: Union[int, None] = None
+        self.sbhits: Union[int, None] = None
+        self.currmove: Union[str, None] = None
+        self.currmovenumber: Union[int, None] = None
+        self.pv: List[str] = []
+        self.refutation: List[str] = []
+        self.currline: List[str] = []
+        self.string: Union[str, None] = None # Free text after `string`
+
+    @property
+    def has_score(self) -> bool:
+        return self.cp != None or self.mate != None
+
+    def __repr__(self) -> str:
+        fields = {name: value for name, value in vars(self).items() if value != None and value != []}
+        return f"InfoRecord({fields})"
+
+
+class BestMoveRecord:
+    """A `bestmove` line."""
+    def __init__(self, move: Union[str, None], ponder: Union[str, None]=None) -> None:
+        self.move = move # None for `(none)`, when there are no legal moves
+        self.ponder = ponder
+
+    def __repr__(self) -> str:
+        return f"BestMoveRecord(move={self.move}, ponder={self.ponder})"
+
+
+class OptionRecord:
+    """An `option` line."""
+    def __init__(self, name: str, type: str, default: Union[str, int, bool, None]=None,
+                 min: Union[int, None]=None, max: Union[int, None]=None, vars: Union[List[str], None]=None) -> None:
+        self.name = name
+        self.type = type # check, spin, combo, button or string
+        self.default = default # bool for check, int for spin, otherwise str
+        self.min = min
+        self.max = max
+        self.vars = vars if vars != None else [] # Choices of a combo
+
+    def __repr__(self) -> str:
+        return (f"OptionRecord(name={self.name}, type={self.type}, default={self.default}, min={self.min}, "
+                f"max={self.max}, vars={self.vars})")
+
+
+Record = Union[InfoRecord, BestMoveRecord, OptionRecord]
+
+
+def _int(word: str) -> Union[int, None]:
+    try:
+        return int(word)
+    except ValueError:
+        return None
+
+
+def parse_info(words: List[str]) -> InfoRecord:
+    """Parse the words of an `info` line (without `info`)."""
+    record = InfoRecord()
+    i = 0
+    while i < len(words):
+        word = words[i]
+        i += 1
+        if word in _INFO_INTS and i < len(words):
+            setattr(record, word, _int(words[i]))
+            i += 1
+        elif word == "score":
+            while i < len(words):
+                if words[i] in ("cp", "mate") and i + 1 < len(words):
+                    setattr(record, words[i], _int(words[i + 1]))
+                    i += 2
+                elif words[i] in ("lowerbound", "upperbound"):
+                    record.bound = words[i]
+                    i += 1
+                else:
+                    break
+        elif word == "currmove" and i < len(words):
+            record.currmove = words[i]
+            i += 1
+        elif word == "string":
+            record.string = " ".join(words[i:])
+            break
+        elif word in ("pv", "refutation", "currline"): # Moves run until the next keyword
+            moves = getattr(record, word)
+            while i < len(words) and words[i] not in _INFO_INTS and words[i] not in (
+                    "score", "currmove", "string", "pv", "refutation", "currline"):
+                moves.append(words[i])
+                i += 1
+
+    return record
+
+
+def parse_option(words: List[str]) -> Union[OptionRecord, None]:
+    """Parse the words of an `option` line (without `option`). Names and values may contain spaces."""
+    fields = {"name": [], "type": [], "default": [], "min": [], "max": []}
+    vars: List[str] = []
+    current: Union[List[str], None] = None
+    for word in words:
+        if word == "var":
+            vars.append("")
+            current = None
+        elif word in _OPTION_WORDS:
+            current = fields[word]
+        elif current != None:
+            current.append(word)
+        elif vars:
+            vars[-1] = f"{vars[-1]} {word}".strip()
+
+    name = " ".join(fields["name"])
+    type = " ".join(fields["type"])
+    if not name or not type:
+        return None
+
+    default: Union[str, int, bool, None] = " ".join(fields["default"]) if fields["default"] else None
+    if default != None and type == "check":
+        default = default == "true"
+    elif default != None and type == "spin":
+        default = _int(default)
+    if default == "<empty>":
+        default = ""
+
+    return OptionRecord(name, type, default, _int(" ".join(fields["min"])) if fields["min"] else None,
+                        _int(" ".join(fields["max"])) if fields["max"] else None, vars)
+
+
+def parse_line(line: str) -> Union[Record, None]:
+    """Parse one line of engine output.
+
+    Parameters
+    ----------
+    line : str
+        Line as read from the engine
+
+    Returns
+    -------
+    InfoRecord | BestMoveRecord | OptionRecord | None
+        The record, or None if it isn't an `info`, `bestmove` or `option` line
+    """
+    words = line.split()
+    if not words:
+        return None
+
+    if words[0] == "info":
+        return parse_info(words[1:])
+    if words[0] == "bestmove":
+        move = words[1] if len(words) > 1 and words[1] != "(none)" else None
+        ponder = words[3] if len(words) > 3 and words[2] == "ponder" else None
+        return BestMoveRecord(move, ponder)
+    if words[0] == "option":
+        return parse_option(words[1:])
+    return None
+
+
+class UCIParser:
+    """Streaming parser. Feed it engine output and take the records with callbacks, iteration or drain().
+
+    Safe to feed from a reader thread while another thread takes records.
+    """
+    def __init__(self, latestOnly: bool=False, maxPending: int=10_000) -> None:
+        """Construct new `UCIParser`.
+
+        Parameters
+        ----------
+        latestOnly : bool, optional
+            Coalesce `info` records: only the newest one per PV line (and the newest without a score) waits to be
+            taken. Callbacks then run on the thread taking the records, in order, when they are taken.
+            By default False
+        maxPending : int, optional
+            Most records waiting to be taken. The oldest are dropped, by default 10_000
+        """
+        self.latestOnly = latestOnly
+        self.coalesced = 0 # `info` records replaced by a newer one before being taken
+        self.dropped = 0 # Records dropped because too many were waiting
+
+        self._callbacks: List[Callable[[Record], None]] = []
+        self._pending: deque = deque(maxlen=maxPending)
+        self._latest: dict = {} # PV line (multipv, or 0 without a score) -> newest InfoRecord
+        self._main: Union[InfoRecord, None] = None # Newest `info` record with a score of the main line
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[Record], None]) -> None:
+        """Call `callback` with every record. It runs on the thread that fed the line, or in latest only mode on
+        the thread taking the records."""
+        self._callbacks.append(callback)
+
+    def unsubscribe(self, callback: Callable[[Record], None]) -> None:
+        self._callbacks.remove(callback)
+
+    def feed(self, line: str) -> Union[Record, None]:
+        """Parse a line and pass its record on.
+
+        Parameters
+        ----------
+        line : str
+            Line as read from the engine
+
+        Returns
+        -------
+        InfoRecord | BestMoveRecord | OptionRecord | None
+            The record, or None if the line has none
+        """
+        record = parse_line(line)
+        if record == None:
+            return None
+
+        if isinstance(record, InfoRecord) and record.has_score and (record.multipv or 1) == 1:
+            self._main = record
+
+        if self.latestOnly and isinstance(record, InfoRecord):
+            key = (record.multipv or 1) if record.has_score else 0
+            with self._lock:
+                if key in self._latest:
+                    self.coalesced += 1
+                self._latest[key] = record
+            return record
+
+        with self._lock:
+            if isinstance(record, BestMoveRecord): # The search is over, its last info records come first
+                self._flush_latest()
+            self._push(record)
+
+        if not self.latestOnly:
+            for callback in self._callbacks:
+                callback(record)
+        return record
+
+    def feed_lines(self, lines: List[str]) -> None:
+        for line in lines:
+            self.feed(line)
+
+    def drain(self) -> List[Record]:
+        """Take every waiting record, oldest first. In latest only mode this runs the callbacks."""
+        with self._lock:
+            self._flush_latest()
+            records = list(self._pending)
+            self._pending.clear()
+
+        if self.latestOnly:
+            for record in records:
+                for callback in self._callbacks:
+                    callback(record)
+
+        return records
+
+    def latest(self) -> Union[InfoRecord, None]:
+        """Newest `info` record with a score of the main line, taken or not."""
+        return self._main
+
+    def __iter__(self) -> Iterator[Record]:
+        """Iterate over the records waiting now (see drain)."""
+        return iter(self.drain())
+
+    def _push(self, record: Record) -> None:
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(record)
+
+    def _flush_latest(self) -> None:
+        """Move the coalesced `info` records to the pending records. The lock must be held."""
+        for key in sorted(self._latest):
+            self._push(self._latest[key])
+        self._latest.clear()
@@ -0,0 +1,64 @@
+# By Chris Parker
+# Zobrist hashing. A position's key is the XOR of one random 64 bit number per feature it has
+# (each piece on each square, side to move, each castling option and the en passant file), so a move
+# only needs to XOR out the features it removes and XOR in the ones it adds.
+#
+# Reference
+# ---------
+# https://www.chessprogramming.org/Zobrist_Hashing
+
+from random import Random
+
+# Chess Imports
+from chess_enum import Color
+from bitboard import squares
+
+_rng = Random(0x5EED) # Fixed seed so keys are the same every run (and in every process)
+
+PIECE_KEYS: tuple[tuple[int, ...], ...] = tuple(tuple(_rng.getrandbits(64) for _ in range(64)) for _ in range(12))
+BLACK_TO_MOVE = _rng.getrandbits(64)
+CASTLING_KEYS: dict[str, int] = {option: _rng.getrandbits(64) for option in "KQkq"}
+EN_PASSANT_KEYS: tuple[int, ...] = tuple(_rng.getrandbits(64) for _ in range(8)) # One per file
+
+
+def castling_key(options: str) -> int:
+    """Return the key for a castling options string (`KQkq` or `-`)."""
+    key = 0
+    for option in options:
+        key ^= CASTLING_KEYS.get(option, 0)
+
+    return key
+
+
+def position_key(pieces: list[int], turn: Color, castling: str, en_pass: int | None) -> int:
+    """Calculate a position's key from scratch.
+
+    Parameters
+    ----------
+    pieces : list[int]
+        The 12 piece bitboards (see bitboard.piece_index)
+    turn : Color
+        Side to move
+    castling : str
+        Castling options in the form `KQkq` or `-`
+    en_pass : int | None
+        En passant square index. Only its file is hashed
+
+    Returns
+    -------
+    int
+        64 bit key
+    """
+    key = 0
+    for index, bb in enumerate(pieces):
+        table = PIECE_KEYS[index]
+        for sq in squares(bb):
+            key ^= table[sq]
+
+    if turn == Color.BLACK:
+        key ^= BLACK_TO_MOVE
+    key ^= castling_key(castling)
+    if en_pass != None:
+        key ^= EN_PASSANT_KEYS[en_pass & 7]
+
+    return key